@@ -0,0 +1,29 @@
+"""Add is_interrupted flag to messages.
+
+Revision ID: 002_message_interrupted
+Revises: 001_initial
+Create Date: 2026-10-16 00:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '002_message_interrupted'
+down_revision: Union[str, None] = '001_initial'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+  op.add_column(
+    'messages',
+    sa.Column('is_interrupted', sa.Boolean(), nullable=False, server_default='false'),
+  )
+
+
+def downgrade() -> None:
+  op.drop_column('messages', 'is_interrupted')
@@ -0,0 +1,36 @@
+"""Add endpoint_formats table for the shared endpoint format cache.
+
+Revision ID: 003_endpoint_formats
+Revises: 002_message_interrupted
+Create Date: 2026-10-16 00:01:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '003_endpoint_formats'
+down_revision: Union[str, None] = '002_message_interrupted'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    'endpoint_formats',
+    sa.Column('endpoint_name', sa.String(255), primary_key=True),
+    sa.Column('format', sa.String(32), nullable=False),
+    sa.Column(
+      'detected_at',
+      sa.DateTime(timezone=True),
+      server_default=sa.func.now(),
+      nullable=False,
+    ),
+  )
+
+
+def downgrade() -> None:
+  op.drop_table('endpoint_formats')
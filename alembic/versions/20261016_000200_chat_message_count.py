@@ -0,0 +1,52 @@
+"""Add message_count and last_message_at to chats.
+
+Denormalised so adding a message no longer counts the chat's messages to
+decide whether to auto-title it, and list views can show both without a join.
+
+Revision ID: 004_chat_message_count
+Revises: 003_endpoint_formats
+Create Date: 2026-10-16 00:02:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '004_chat_message_count'
+down_revision: Union[str, None] = '003_endpoint_formats'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+  op.add_column(
+    'chats',
+    sa.Column('message_count', sa.Integer(), nullable=False, server_default='0'),
+  )
+  op.add_column(
+    'chats',
+    sa.Column('last_message_at', sa.DateTime(timezone=True), nullable=True),
+  )
+
+  # Backfill from existing messages
+  op.execute(
+    """
+    UPDATE chats
+    SET message_count = counts.message_count,
+        last_message_at = counts.last_message_at
+    FROM (
+      SELECT chat_id, COUNT(*) AS message_count, MAX(timestamp) AS last_message_at
+      FROM messages
+      GROUP BY chat_id
+    ) AS counts
+    WHERE chats.id = counts.chat_id
+    """
+  )
+
+
+def downgrade() -> None:
+  op.drop_column('chats', 'last_message_at')
+  op.drop_column('chats', 'message_count')
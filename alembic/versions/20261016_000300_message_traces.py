@@ -0,0 +1,77 @@
+"""Add message_traces table for compressed large traces.
+
+Traces above TRACE_COMPRESS_THRESHOLD_BYTES are stored compressed here and
+messages.trace_summary keeps only their preview. Existing rows are moved by
+scripts/backfill_traces.py (not here, so the upgrade stays fast on big tables).
+
+Revision ID: 005_message_traces
+Revises: 004_chat_message_count
+Create Date: 2026-10-16 00:03:00.000000
+
+"""
+
+import json
+import zlib
+from typing import Any, Dict, Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects.postgresql import JSONB
+
+# revision identifiers, used by Alembic.
+revision: str = '005_message_traces'
+down_revision: Union[str, None] = '004_chat_message_count'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+  op.create_table(
+    'message_traces',
+    sa.Column(
+      'message_id',
+      sa.String(50),
+      sa.ForeignKey('messages.id', ondelete='CASCADE'),
+      primary_key=True,
+    ),
+    sa.Column('codec', sa.String(16), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('raw_size', sa.Integer(), nullable=False),
+    sa.Column('stored_size', sa.Integer(), nullable=False),
+    sa.Column(
+      'created_at',
+      sa.DateTime(timezone=True),
+      server_default=sa.func.now(),
+      nullable=False,
+    ),
+  )
+
+
+def _unpack_trace(codec: str, payload: bytes) -> Dict[str, Any]:
+  # Copied from the trace codecs as of this revision, so the migration keeps
+  # working whatever happens to the application code
+  if codec == 'zlib':
+    raw = zlib.decompress(payload)
+  elif codec == 'zstd':
+    try:
+      import zstandard
+    except ImportError as e:
+      raise RuntimeError('Traces were stored with zstd: install zstandard to downgrade') from e
+    raw = zstandard.ZstdDecompressor().decompress(payload)
+  else:
+    raise RuntimeError(f'Trace was stored with unknown codec {codec}')
+  return json.loads(raw)
+
+
+def downgrade() -> None:
+  # Put the full traces back inline before dropping the table
+  bind = op.get_bind()
+  messages = sa.table('messages', sa.column('id', sa.String), sa.column('trace_summary', JSONB))
+  rows = bind.execute(sa.text('SELECT message_id, codec, payload FROM message_traces')).fetchall()
+  for message_id, codec, payload in rows:
+    bind.execute(
+      messages.update()
+      .where(messages.c.id == message_id)
+      .values(trace_summary=_unpack_trace(codec, bytes(payload)))
+    )
+  op.drop_table('message_traces')
@@ -13,6 +13,13 @@ import { useAgents } from "@/hooks/useAgents";
 import { detectAndGenerateVisualizations } from "@/lib/tableDetector";
 import { detectVisualizationsFromFunctionCalls } from "@/lib/functionOutputDetector";
 
+// Messages loaded when opening a chat, and per "Load earlier messages" click
+const HISTORY_PAGE_SIZE = 50;
+// Page size when fetching the rest of the history for the agent (server maximum)
+const CONTEXT_PAGE_SIZE = 200;
+
+type ContextMessage = { role: string; content: string };
+
 // Dev-only logger
 const devLog = (...args: any[]) => {
   if (import.meta.env.DEV) {
@@ -46,6 +53,9 @@ export function ChatCore({
   const [messages, setMessages] = useState<Message[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [isLoadingHistory, setIsLoadingHistory] = useState(false);
+  // Cursor of the oldest loaded message when older ones exist on the server
+  const [olderMessagesCursor, setOlderMessagesCursor] = useState<string | null>(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const { userInfo } = useUserInfo();
   const { agents } = useAgents();
 
@@ -102,6 +112,20 @@ export function ChatCore({
   const abortControllerRef = useRef<AbortController | null>(null);
   const activeStreamChatIdRef = useRef<string | undefined>(undefined);
   const abortReasonRef = useRef<"user_stopped" | "chat_switched" | null>(null);
+  // Set when older messages are prepended so the view does not jump to the bottom
+  const skipAutoScrollRef = useRef(false);
+  // Latest session id, for async loads that finish after the user switched chats
+  const sessionIdRef = useRef<string | undefined>(chatId);
+  // Messages before olderMessagesCursor, fetched once for the agent's context
+  const olderContextRef = useRef<{
+    chatId: string;
+    cursor: string;
+    messages: ContextMessage[];
+  } | null>(null);
+
+  useEffect(() => {
+    sessionIdRef.current = currentSessionId;
+  }, [currentSessionId]);
 
   // Load chat messages when chatId changes
   useEffect(() => {
@@ -127,6 +151,7 @@ export function ChatCore({
       } else {
         devLog("New chat - resetting all state");
         setMessages([]);
+        setOlderMessagesCursor(null);
         setIsLoading(false);
         setFeedbackModal({
           isOpen: false,
@@ -140,6 +165,10 @@ export function ChatCore({
 
   // Auto-scroll to bottom when new messages arrive
   useEffect(() => {
+    if (skipAutoScrollRef.current) {
+      skipAutoScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -162,11 +191,47 @@ export function ChatCore({
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
+  // Convert a stored message to the UI shape, regenerating its visualizations
+  const toLoadedMessage = (msg: any, chatAgent: typeof selectedAgent): Message => {
+    const baseMessage = {
+      ...msg,
+      timestamp: new Date(msg.timestamp),
+      traceId: msg.trace_id,
+      traceSummary: msg.trace_summary,
+      isError: msg.is_error,
+      isTracePreview: msg.has_trace,
+    };
+
+    // Regenerate visualizations for assistant messages
+    if (msg.role === "assistant" && msg.content && !msg.is_error) {
+      // Priority 1: Detect from function call outputs
+      let visualizations = detectVisualizationsFromFunctionCalls(
+        msg.trace_summary?.function_calls,
+        chatAgent,
+      );
+
+      // Priority 2: Fallback to markdown table detection
+      if (visualizations.length === 0) {
+        visualizations = detectAndGenerateVisualizations(msg.content);
+      }
+
+      if (visualizations.length > 0) {
+        return { ...baseMessage, visualizations };
+      }
+    }
+
+    return baseMessage;
+  };
+
   const loadChatHistory = async (id: string) => {
     setMessages([]); // Clear messages immediately to avoid showing old content
+    setOlderMessagesCursor(null);
     setIsLoadingHistory(true);
     try {
-      const response = await fetch(`/api/chats/${id}`);
+      // Only the latest messages; older ones are loaded on demand
+      const response = await fetch(
+        `/api/chats/${id}?messages_limit=${HISTORY_PAGE_SIZE}`,
+      );
 
       if (!response.ok) {
         console.error(
@@ -195,38 +260,13 @@ export function ChatCore({
         ? agents.find((a) => a.id === chat.agent_id)
         : selectedAgent;
 
-      const loadedMessages = chat.messages.map((msg: any) => {
-        const baseMessage = {
-          ...msg,
-          timestamp: new Date(msg.timestamp),
-          traceId: msg.trace_id,
-          traceSummary: msg.trace_summary,
-          isError: msg.is_error,
-        };
-
-        // Regenerate visualizations for assistant messages
-        if (msg.role === "assistant" && msg.content && !msg.is_error) {
-          // Priority 1: Detect from function call outputs
-          let visualizations = detectVisualizationsFromFunctionCalls(
-            msg.trace_summary?.function_calls,
-            chatAgent,
-          );
-
-          // Priority 2: Fallback to markdown table detection
-          if (visualizations.length === 0) {
-            visualizations = detectAndGenerateVisualizations(msg.content);
-          }
-
-          if (visualizations.length > 0) {
-            return { ...baseMessage, visualizations };
-          }
-        }
-
-        return baseMessage;
-      });
+      const loadedMessages = chat.messages.map((msg: any) =>
+        toLoadedMessage(msg, chatAgent),
+      );
 
       devLog("Loaded", loadedMessages.length, "messages from chat history");
       setMessages(loadedMessages);
+      setOlderMessagesCursor(chat.messages_cursor ?? null);
     } catch (error) {
       console.error("Failed to load chat history:", error);
       setMessages([]);
@@ -235,6 +275,69 @@ export function ChatCore({
     }
   };
 
+  const loadOlderMessages = async () => {
+    if (!currentSessionId || !olderMessagesCursor || isLoadingOlder) return;
+    const id = currentSessionId;
+    setIsLoadingOlder(true);
+    try {
+      const response = await fetch(
+        `/api/chats/${id}/messages?limit=${HISTORY_PAGE_SIZE}&before=${encodeURIComponent(olderMessagesCursor)}`,
+      );
+      if (!response.ok) {
+        console.error(
+          `Failed to load earlier messages: ${response.status} ${response.statusText}`,
+        );
+        return;
+      }
+      const page = await response.json();
+      // Ignore the result if the user switched chats meanwhile
+      if (sessionIdRef.current !== id) return;
+
+      const chatAgent = selectedAgent;
+      const olderMessages = page.messages.map((msg: any) =>
+        toLoadedMessage(msg, chatAgent),
+      );
+      skipAutoScrollRef.current = true;
+      setMessages((prev) => [...olderMessages, ...prev]);
+      setOlderMessagesCursor(page.next_cursor ?? null);
+    } catch (error) {
+      console.error("Failed to load earlier messages:", error);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
+  // Paging only limits what is displayed: the agent gets the whole conversation,
+  // so the messages not loaded yet are fetched (once per cursor) before sending
+  const loadOlderContext = async (
+    id: string,
+    cursor: string,
+  ): Promise<ContextMessage[]> => {
+    const cached = olderContextRef.current;
+    if (cached && cached.chatId === id && cached.cursor === cursor) {
+      return cached.messages;
+    }
+    const older: ContextMessage[] = [];
+    let before: string | null = cursor;
+    while (before) {
+      const response = await fetch(
+        `/api/chats/${id}/messages?limit=${CONTEXT_PAGE_SIZE}&before=${encodeURIComponent(before)}`,
+      );
+      if (!response.ok) {
+        throw new Error(
+          `Failed to load chat history: ${response.status} ${response.statusText}`,
+        );
+      }
+      const page = await response.json();
+      older.unshift(
+        ...page.messages.map((m: any) => ({ role: m.role, content: m.content })),
+      );
+      before = page.next_cursor ?? null;
+    }
+    olderContextRef.current = { chatId: id, cursor, messages: older };
+    return older;
+  };
+
   const sendMessage = async (content: string) => {
     if (!content.trim()) return;
 
@@ -261,6 +364,11 @@ export function ChatCore({
     let activeChatId = chatId;
 
     try {
+      const olderContext =
+        currentSessionId && olderMessagesCursor
+          ? await loadOlderContext(currentSessionId, olderMessagesCursor)
+          : [];
+
       // Call invoke_endpoint - backend handles chat creation if needed
       const backendUrl = import.meta.env.VITE_BACKEND_URL || "";
       const response = await fetch(`${backendUrl}/api/invoke_endpoint`, {
@@ -269,10 +377,13 @@ export function ChatCore({
         body: JSON.stringify({
           agent_id: selectedAgentId,
           chat_id: chatId, // Will be null for new chats - backend creates one
-          messages: [...messages, userMessage].map((m) => ({
-            role: m.role,
-            content: m.content,
-          })),
+          messages: [
+            ...olderContext,
+            ...[...messages, userMessage].map((m) => ({
+              role: m.role,
+              content: m.content,
+            })),
+          ],
         }),
         signal: abortController.signal,
       });
@@ -356,6 +467,33 @@ export function ChatCore({
                 continue;
               }
 
+              // Handle queue position - the agent is at its concurrency limit
+              if (event.type === "queue.position") {
+                const waitingContent = `Waiting for the agent (position ${event.position} in queue)...`;
+                if (!assistantMessageCreated) {
+                  assistantMessageCreated = true;
+                  setMessages((prev) => [
+                    ...prev,
+                    {
+                      id: assistantMessageId,
+                      role: "assistant",
+                      content: waitingContent,
+                      timestamp: new Date(),
+                      isStreaming: true,
+                    },
+                  ]);
+                } else {
+                  setMessages((prev) =>
+                    prev.map((msg) =>
+                      msg.id === assistantMessageId
+                        ? { ...msg, content: waitingContent }
+                        : msg,
+                    ),
+                  );
+                }
+                continue;
+              }
+
               // Handle stream completion - update message with trace data
               if (event.type === "stream.completed") {
                 devLog("Stream completed:", event);
@@ -594,12 +732,34 @@ export function ChatCore({
     }
   };
 
-  const handleTrace = (messageId: string) => {
-    const message = messages.find((m) => m.id === messageId);
-    if (!message) {
+  // Fetch the full trace summary of a message loaded from history (its listing only has a preview)
+  const loadFullTrace = async (message: Message): Promise<Message> => {
+    if (!message.isTracePreview || !currentSessionId) return message;
+    try {
+      const response = await fetch(
+        `/api/chats/${currentSessionId}/messages/${message.id}/trace`,
+      );
+      if (!response.ok) {
+        console.error(`Failed to load trace: ${response.status} ${response.statusText}`);
+        return message;
+      }
+      const { trace_summary } = await response.json();
+      const loaded = { ...message, traceSummary: trace_summary, isTracePreview: false };
+      setMessages((prev) => prev.map((m) => (m.id === message.id ? loaded : m)));
+      return loaded;
+    } catch (error) {
+      console.error("Failed to load trace:", error);
+      return message;
+    }
+  };
+
+  const handleTrace = async (messageId: string) => {
+    const found = messages.find((m) => m.id === messageId);
+    if (!found) {
       console.error("Message not found:", messageId);
       return;
     }
+    const message = await loadFullTrace(found);
 
     const messageIndex = messages.findIndex((m) => m.id === messageId);
     let userMessage = "";
@@ -694,6 +854,20 @@ export function ChatCore({
           </div>
         ) : (
           <>
+            {olderMessagesCursor && (
+              <div className="flex justify-center pt-4">
+                <button
+                  type="button"
+                  onClick={loadOlderMessages}
+                  disabled={isLoadingOlder}
+                  className="flex items-center gap-2 text-[0.75rem] text-[var(--color-text-muted)] hover:text-[var(--color-accent-primary)] tracking-wide transition-colors disabled:opacity-60"
+                  style={{ fontFamily: "var(--font-body)" }}
+                >
+                  {isLoadingOlder && <Loader2 className="h-3 w-3 animate-spin" />}
+                  Load earlier messages
+                </button>
+              </div>
+            )}
             <MessageList
               messages={messages}
               isLoading={isLoading}
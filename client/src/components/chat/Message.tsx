@@ -93,6 +93,9 @@ function CodeBlock({ language, value }: { language: string; value: string }) {
 export function Message({ message, onFeedback, onViewTrace, compact = false }: MessageProps) {
   const isUser = message.role === "user";
   const isError = message.isError === true;
+  // Loaded chats carry a trace preview without tools_called; function_calls has the same tools
+  const toolsCalled: Array<{ name: string }> =
+    message.traceSummary?.tools_called ?? message.traceSummary?.function_calls ?? [];
   const [visualizationsVisible, setVisualizationsVisible] = useState(true);
 
   return (
@@ -399,16 +402,16 @@ export function Message({ message, onFeedback, onViewTrace, compact = false }: M
                 </span>
               </div>
             )}
-            {message.traceSummary.tools_called?.length > 0 && (
+            {toolsCalled.length > 0 && (
               <button
                 onClick={() => onViewTrace(message.id)}
                 className="flex items-center gap-1 px-2 py-1 rounded-md bg-[var(--color-muted)] text-[var(--color-text-muted)] hover:bg-[var(--color-accent-primary)]/10 hover:text-[var(--color-accent-primary)] transition-colors cursor-pointer"
-                title={`Click to view details: ${message.traceSummary.tools_called.map((t) => t.name).join(", ")}`}
+                title={`Click to view details: ${toolsCalled.map((t) => t.name).join(", ")}`}
               >
                 <Wrench className="h-3 w-3" />
                 <span>
-                  {message.traceSummary.tools_called.length} tool
-                  {message.traceSummary.tools_called.length !== 1 ? "s" : ""}
+                  {toolsCalled.length} tool
+                  {toolsCalled.length !== 1 ? "s" : ""}
                 </span>
               </button>
             )}
@@ -457,7 +460,7 @@ export function Message({ message, onFeedback, onViewTrace, compact = false }: M
               </>
             )}
             {/* Trace view button - show if we have trace_id or tools were called */}
-            {(message.traceId || (message.traceSummary?.tools_called?.length ?? 0) > 0) && (
+            {(message.traceId || toolsCalled.length > 0) && (
               <Button
                 variant="ghost"
                 size="icon"
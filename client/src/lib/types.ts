@@ -56,7 +56,8 @@ export interface TraceSummary {
   duration_ms: number;
   status: string;
   deployment_type?: string; // Added to detect handler type
-  tools_called: Array<{
+  // Omitted from chat history responses (trace preview); present in full traces
+  tools_called?: Array<{
     name: string;
     duration_ms: number;
     inputs?: any;
@@ -98,6 +99,8 @@ export interface Message {
   isError?: boolean;
   isStreaming?: boolean;
   isInterrupted?: boolean;
+  /** Loaded from chat history: traceSummary is a preview, the full trace is fetched on demand */
+  isTracePreview?: boolean;
 }
 
 export interface Visualization {
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""Move large traces of existing messages into message_traces (compressed).
+
+New messages are written this way by the chat storage; this script converts
+messages saved before migration 005_message_traces. Messages whose trace JSON
+is larger than TRACE_COMPRESS_THRESHOLD_BYTES get their full trace_summary
+compressed into message_traces and keep only the preview inline. Each batch is
+its own transaction, so the script can be stopped and re-run at any time.
+
+Prints the table sizes before and after. Postgres only returns the freed space
+to the OS after VACUUM FULL (--vacuum-full, takes an exclusive lock on
+messages); until then a plain (auto)vacuum makes it reusable for new rows.
+
+Usage:
+  uv run python scripts/backfill_traces.py --dry-run
+  uv run python scripts/backfill_traces.py [--batch-size 200] [--vacuum-full]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+# Allow running from the repo root without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _mb(size: int) -> str:
+  return f'{size / 1024 / 1024:9.2f} MB'
+
+
+async def _report(label: str):
+  """Print the on-disk size of the tables and the size of the traces stored in them."""
+  from server.db import session_scope
+  from sqlalchemy import text
+
+  async with session_scope() as session:
+    messages_size, traces_size = (
+      await session.execute(
+        text("SELECT pg_total_relation_size('messages'), pg_total_relation_size('message_traces')")
+      )
+    ).one()
+    inline_count, inline_size = (
+      await session.execute(
+        text(
+          'SELECT COUNT(*), COALESCE(SUM(pg_column_size(trace_summary)), 0) '
+          'FROM messages WHERE trace_summary IS NOT NULL'
+        )
+      )
+    ).one()
+    packed_count, raw_size, stored_size = (
+      await session.execute(
+        text(
+          'SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) '
+          'FROM message_traces'
+        )
+      )
+    ).one()
+
+  print(f'--- {label}')
+  print(f'messages table:          {_mb(messages_size)}')
+  print(f'message_traces table:    {_mb(traces_size)}')
+  print(f'inline trace_summary:    {_mb(inline_size)} in {inline_count} messages')
+  print(
+    f'compressed traces:       {_mb(stored_size)} in {packed_count} messages '
+    f'({_mb(raw_size).strip()} as JSON)'
+  )
+
+
+async def _backfill(batch_size: int, dry_run: bool) -> int:
+  """Compress the large traces batch by batch (keyset on message id). Returns messages moved."""
+  from server.db import MessageModel, MessageTraceModel, session_scope
+  from server.services.chat.traces import CODEC, TRACE_COMPRESS_THRESHOLD_BYTES, pack_trace
+  from sqlalchemy import Text, cast, func, select, update
+
+  print(f'Compressing traces over {TRACE_COMPRESS_THRESHOLD_BYTES} bytes with {CODEC}')
+  moved = raw_total = stored_total = 0
+  last_id = ''
+  while True:
+    async with session_scope() as session:
+      already_packed = select(MessageTraceModel.message_id).where(
+        MessageTraceModel.message_id == MessageModel.id
+      )
+      stmt = (
+        select(MessageModel.id, MessageModel.trace_summary)
+        .where(
+          MessageModel.id > last_id,
+          MessageModel.trace_summary.is_not(None),
+          func.octet_length(cast(MessageModel.trace_summary, Text))
+          > TRACE_COMPRESS_THRESHOLD_BYTES,
+          ~already_packed.exists(),
+        )
+        .order_by(MessageModel.id)
+        .limit(batch_size)
+      )
+      rows = (await session.execute(stmt)).all()
+      if not rows:
+        break
+      last_id = rows[-1].id
+
+      for message_id, trace_summary in rows:
+        inline, packed = pack_trace(trace_summary)
+        if packed is None:
+          continue
+        moved += 1
+        raw_total += packed.raw_size
+        stored_total += packed.stored_size
+        if dry_run:
+          continue
+        session.add(MessageTraceModel(message_id=message_id, **packed._asdict()))
+        await session.execute(
+          update(MessageModel)
+          .where(MessageModel.id == message_id)
+          .values(trace_summary=inline)
+          .execution_options(synchronize_session=False)
+        )
+    print(f'{"Would move" if dry_run else "Moved"} {moved} traces so far')
+
+  if moved:
+    print(
+      f'{moved} traces: {_mb(raw_total).strip()} of JSON -> {_mb(stored_total).strip()} compressed '
+      f'({raw_total / max(stored_total, 1):.1f}x)'
+    )
+  return moved
+
+
+async def _vacuum_full():
+  from server.db import get_engine
+  from sqlalchemy import text
+
+  async with get_engine().connect() as conn:
+    conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+    await conn.execute(text('VACUUM FULL messages'))
+
+
+async def _run(args: argparse.Namespace):
+  from server.db import get_engine, init_database
+
+  init_database()
+  try:
+    await _report('before')
+    moved = await _backfill(args.batch_size, args.dry_run)
+    if args.dry_run:
+      return
+    if args.vacuum_full:
+      print('Running VACUUM FULL messages...')
+      await _vacuum_full()
+    await _report('after')
+    if moved and not args.vacuum_full:
+      print('messages keeps its size on disk until VACUUM FULL (rerun with --vacuum-full)')
+  finally:
+    await get_engine().dispose()
+
+
+def main():
+  """Parse arguments and run the backfill."""
+  from dotenv import load_dotenv
+
+  parser = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+  )
+  parser.add_argument('--batch-size', type=int, default=200, help='messages per transaction')
+  parser.add_argument(
+    '--dry-run', action='store_true', help='report what would be moved, write nothing'
+  )
+  parser.add_argument(
+    '--vacuum-full', action='store_true', help='VACUUM FULL messages afterwards (exclusive lock)'
+  )
+  args = parser.parse_args()
+
+  load_dotenv(dotenv_path='.env.local')
+  if not os.environ.get('LAKEBASE_PG_URL'):
+    sys.exit('backfill needs LAKEBASE_PG_URL (in the environment or .env.local)')
+  asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""Microbenchmarks for backend hot paths.
+
+Runs synthetic workloads in-process (no Databricks or database access needed,
+except `storage`, which writes to the database in LAKEBASE_PG_URL).
+
+Usage:
+  uv run python scripts/benchmark.py stream [--deltas 5000]
+  uv run python scripts/benchmark.py serializer [--deltas 10000]
+  uv run python scripts/benchmark.py mojibake [--deltas 20000]
+  uv run python scripts/benchmark.py storage [--turns 50]
+  uv run python scripts/benchmark.py traces [--spans 200]
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Allow running from the repo root without installing the package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def _synthetic_agent_events(
+  deltas: int, tool_calls: int = 10, trace_spans: int = 200
+) -> List[Dict[str, Any]]:
+  """Build an agent-format event sequence: tool calls, text deltas, final message with trace."""
+  events: List[Dict[str, Any]] = []
+  for i in range(tool_calls):
+    events.append({
+      'type': 'response.output_item.done',
+      'item': {
+        'type': 'function_call',
+        'call_id': f'call_{i}',
+        'name': 'lookup',
+        'arguments': '{"q": "x"}',
+      },
+    })
+    events.append({
+      'type': 'response.output_item.done',
+      'item': {
+        'type': 'function_call_output',
+        'call_id': f'call_{i}',
+        'output': '{"rows": [1, 2, 3]}',
+      },
+    })
+  for i in range(deltas):
+    events.append(
+      {'type': 'response.output_text.delta', 'item_id': 'msg_1', 'delta': f'tok{i % 10} '}
+    )
+  spans = [
+    {
+      'span_id': f's{i}',
+      'name': f'span_{i}',
+      'attributes': {'input': 'x' * 200, 'output': 'y' * 200},
+    }
+    for i in range(trace_spans)
+  ]
+  events.append({
+    'type': 'response.output_item.done',
+    'item': {
+      'type': 'message',
+      'content': [{'type': 'output_text', 'text': 'final answer'}],
+      'databricks_output': {'trace': {'info': {'trace_id': 'tr-1'}, 'data': {'spans': spans}}},
+    },
+  })
+  return events
+
+
+def _timeit(fn: Callable[[], Any], repeat: int = 5) -> float:
+  """Return the best wall time of several runs, in seconds."""
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    fn()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def bench_stream(args: argparse.Namespace):
+  """Per-event CPU of handler encoding + router collection (legacy vs structured events)."""
+  from server.services.agents.events import make_event
+  from server.services.agents.stream_collector import StreamCollector
+
+  events = _synthetic_agent_events(args.deltas)
+
+  def legacy():
+    # Handler: json.dumps into an SSE string; router: strip, json.loads, str(event)
+    collector = StreamCollector()
+    for data in events:
+      chunk = f'data: {json.dumps(data)}\n\n'
+      event = json.loads(chunk[6:].strip())
+      'databricks_output' in str(event)
+      collector.add(event)
+
+  def structured():
+    # Handler: encode once; router: read the payload directly
+    collector = StreamCollector()
+    for data in events:
+      event = make_event(data)
+      collector.add(event.data)
+
+  n = len(events)
+  legacy_s = _timeit(legacy)
+  structured_s = _timeit(structured)
+  print(f'events: {n}')
+  print(f'legacy (dumps + loads + repr): {legacy_s * 1e6 / n:8.2f} us/event')
+  print(f'structured events:             {structured_s * 1e6 / n:8.2f} us/event')
+  print(f'speedup: {legacy_s / structured_s:.2f}x')
+
+
+def bench_serializer(args: argparse.Namespace):
+  """SSE frames per second for each installed JSON backend on a synthetic delta stream."""
+  from server.serialization import BACKEND, available_backends
+
+  events = _synthetic_agent_events(args.deltas)
+  print(f'events: {len(events)} (active backend: {BACKEND})')
+
+  for name, encode in available_backends().items():
+
+    def run():
+      for data in events:
+        b'data: ' + encode(data) + b'\n\n'
+
+    seconds = _timeit(run)
+    print(f'{name:>8}: {len(events) / seconds:12,.0f} frames/s')
+
+
+def _mojibake_corpus(deltas: int) -> List[str]:
+  """Build chat completion deltas: mostly ASCII, some emoji, some UTF-8 read as Latin-1."""
+  samples = [
+    'The quick ',
+    'brown fox ',
+    'jumps over ',
+    'the lazy dog. ',
+    'Party time 🎉 ',
+    'café — naïve résumé ',
+    'smart “quotes” ',
+  ]
+  corpus = []
+  for i in range(deltas):
+    text = samples[i % len(samples)]
+    if i % 7 >= 5:
+      # Mojibake: UTF-8 bytes surfaced as Latin-1 chars
+      text = text.encode('utf-8').decode('latin-1')
+    corpus.append(text)
+  return corpus
+
+
+def _legacy_fix_mojibake(text: str) -> str:
+  """fix_mojibake before precompilation and the ASCII short-circuit."""
+  if not text:
+    return text
+  try:
+    return text.encode('latin-1').decode('utf-8')
+  except (UnicodeDecodeError, UnicodeEncodeError):
+    pass
+  import re
+
+  def fix_segment(match: re.Match) -> str:
+    segment = match.group(0)
+    try:
+      return segment.encode('latin-1').decode('utf-8')
+    except (UnicodeDecodeError, UnicodeEncodeError):
+      return segment
+
+  return re.sub(r'[\u0080-\u00ff]+', fix_segment, text)
+
+
+def bench_mojibake(args: argparse.Namespace):
+  """Deltas per second for mojibake repair, plus correctness on split characters."""
+  from server.services.agents.mojibake import MojibakeDecoder, fix_mojibake
+
+  corpus = _mojibake_corpus(args.deltas)
+
+  def stream_decoder():
+    decoder = MojibakeDecoder()
+    for text in corpus:
+      decoder.decode(text)
+    decoder.flush()
+
+  print(f'deltas: {len(corpus)} ({sum(not t.isascii() for t in corpus)} non-ASCII)')
+  for name, run in (
+    ('legacy fix_mojibake', lambda: [_legacy_fix_mojibake(t) for t in corpus]),
+    ('fix_mojibake', lambda: [fix_mojibake(t) for t in corpus]),
+    ('MojibakeDecoder', stream_decoder),
+  ):
+    seconds = _timeit(run)
+    print(f'{name:>20}: {len(corpus) / seconds:12,.0f} deltas/s')
+
+  # Re-split the mojibake text every 2 chars so multi-byte characters straddle deltas
+  expected = ''.join(text.encode('latin-1').decode('utf-8') for text in corpus[5:7])
+  joined = ''.join(corpus[5:7])
+  pieces = [joined[i : i + 2] for i in range(0, len(joined), 2)]
+  decoder = MojibakeDecoder()
+  streamed = ''.join(decoder.decode(p) for p in pieces) + decoder.flush()
+  per_chunk = ''.join(_legacy_fix_mojibake(p) for p in pieces)
+  print(
+    f'split characters repaired: per-chunk={per_chunk == expected} '
+    f'streaming={streamed == expected}'
+  )
+
+
+def _turn_messages(turn: int) -> List[Any]:
+  """User question and assistant answer of one chat turn."""
+  import uuid
+  from datetime import datetime
+
+  from server.db.models import MessageModel
+
+  return [
+    MessageModel(
+      id=f'msg_{uuid.uuid4().hex[:12]}',
+      role='user',
+      content=f'Question {turn}',
+      timestamp=datetime.now(),
+    ),
+    MessageModel(
+      id=f'msg_{uuid.uuid4().hex[:12]}',
+      role='assistant',
+      content='answer ' * 100,
+      timestamp=datetime.now(),
+      trace_summary={'function_calls': [{'name': 'lookup', 'output': 'x' * 500}]},
+      is_error=False,
+      is_interrupted=False,
+    ),
+  ]
+
+
+async def _bench_storage(turns: int):
+  from server.db import get_engine, init_database
+  from server.services.chat.postgres import PostgresChatStorage
+  from sqlalchemy import event
+
+  init_database()
+  statements = 0
+
+  def count(*_args):
+    nonlocal statements
+    statements += 1
+
+  event.listen(get_engine().sync_engine, 'before_cursor_execute', count)
+  user_storage = PostgresChatStorage(user_email='benchmark@example.com', max_chats=1000)
+
+  async def add_pair(chat_id: str, messages: List[Any]):
+    for msg in messages:
+      await user_storage.add_message(chat_id, msg)
+
+  for name, write in (('add_message x2', add_pair), ('add_messages', user_storage.add_messages)):
+    chat = await user_storage.create(title='benchmark')
+    statements = 0
+    start = time.perf_counter()
+    for turn in range(turns):
+      await write(chat.id, _turn_messages(turn))
+    seconds = time.perf_counter() - start
+    print(
+      f'{name:>15}: {statements / turns:5.1f} statements/turn, '
+      f'{seconds / turns * 1000:7.1f} ms/turn'
+    )
+    await user_storage.delete(chat.id)
+
+  await get_engine().dispose()
+
+
+def bench_storage(args: argparse.Namespace):
+  """Database statements and latency per chat turn: add_message pairs vs add_messages."""
+  import os
+
+  from dotenv import load_dotenv
+
+  load_dotenv(dotenv_path='.env.local')
+  if not os.environ.get('LAKEBASE_PG_URL'):
+    sys.exit('storage benchmark needs LAKEBASE_PG_URL (in the environment or .env.local)')
+  asyncio.run(_bench_storage(args.turns))
+
+
+def bench_traces(args: argparse.Namespace):
+  """Size and (de)compression time of a large trace_summary with each installed codec."""
+  from server.serialization import dumps
+  from server.services.chat.traces import available_codecs, compress_trace, pack_trace, unpack_trace
+
+  final = _synthetic_agent_events(0, tool_calls=0, trace_spans=args.spans)[-1]['item']
+  function_calls = [
+    {
+      'call_id': f'call_{i}',
+      'name': 'lookup',
+      'arguments': '{"q": "x"}',
+      'output': '{"rows": [1, 2, 3]}',
+    }
+    for i in range(10)
+  ]
+  trace_summary = {
+    'trace_id': 'tr-1',
+    'duration_ms': 1234,
+    'status': 'completed',
+    'tools_called': [{'name': 'lookup', 'success': True}] * 10,
+    'retrieval_calls': [],
+    'llm_calls': [],
+    'total_tokens': 0,
+    'spans_count': len(function_calls),
+    'function_calls': function_calls,
+    'databricks_output': final['databricks_output'],
+  }
+  raw = dumps(trace_summary)
+  inline, _ = pack_trace(trace_summary)
+  print(f'trace JSON: {len(raw) / 1024:.1f} KB, inline preview: {len(dumps(inline)) / 1024:.1f} KB')
+  for codec in available_codecs():
+    packed = compress_trace(raw, codec)
+    compress = _timeit(lambda: compress_trace(raw, codec))
+    decompress = _timeit(lambda: unpack_trace(codec, packed.payload))
+    ratio = packed.raw_size / packed.stored_size
+    print(
+      f'{codec:>5}: {packed.stored_size / 1024:7.1f} KB ({ratio:5.1f}x), '
+      f'compress {compress * 1000:6.2f} ms, decompress+parse {decompress * 1000:6.2f} ms'
+    )
+
+
+def main():
+  """Parse arguments and run the selected benchmark."""
+  parser = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+  )
+  sub = parser.add_subparsers(dest='benchmark', required=True)
+
+  stream = sub.add_parser('stream', help='SSE stream processing in invoke_endpoint')
+  stream.add_argument('--deltas', type=int, default=5000)
+  stream.set_defaults(func=bench_stream)
+
+  serializer = sub.add_parser('serializer', help='JSON backends for SSE frames')
+  serializer.add_argument('--deltas', type=int, default=10000)
+  serializer.set_defaults(func=bench_serializer)
+
+  mojibake = sub.add_parser('mojibake', help='Mojibake repair of chat completion deltas')
+  mojibake.add_argument('--deltas', type=int, default=20000)
+  mojibake.set_defaults(func=bench_mojibake)
+
+  storage = sub.add_parser(
+    'storage', help='Chat turn persistence round trips (needs LAKEBASE_PG_URL)'
+  )
+  storage.add_argument('--turns', type=int, default=50)
+  storage.set_defaults(func=bench_storage)
+
+  traces = sub.add_parser('traces', help='Compression of large message traces')
+  traces.add_argument('--spans', type=int, default=200)
+  traces.set_defaults(func=bench_traces)
+
+  args = parser.parse_args()
+  args.func(args)
+
+
+if __name__ == '__main__':
+  main()
@@ -18,8 +18,11 @@ from .config_loader import config_loader
 
 # Routers for organizing endpoints
 from .db import run_migrations
-from .routers import agent, chat, config, health
+from .metrics import RequestMetricsMiddleware
+from .routers import agent, chat, config, health, metrics
 from .services.chat import init_storage
+from .services.chat.persistence import persistence
+from .services.clients import clients
 
 # Configure logging for Databricks Apps monitoring
 # Logs written to stdout/stderr will be available in Databricks Apps UI and /logz endpoint
@@ -57,12 +60,20 @@ async def lifespan(app: FastAPI):
   run_migrations()
 
   await init_storage()
+  persistence.start()
   logger.info('✅ Chat storage initialized')
 
+  # Build shared Databricks/HTTP clients once instead of on each request
+  await clients.start()
+  logger.info(f'✅ Clients initialized: {clients.stats()["construction_ms"]}')
+
   yield
 
   # Shutdown: Cleanup if needed
   logger.info('👋 Shutting down application...')
+  # Save chat turns still in the write-behind queue before the database goes away
+  await persistence.close()
+  await clients.close()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -83,6 +94,9 @@ app.add_middleware(
   allow_headers=['*'],
 )
 
+# Request counts/latency and SSE frames/bytes, exposed at /api/metrics
+app.add_middleware(RequestMetricsMiddleware)
+
 # Add usage tracker (optional, based on config)
 # See https://pypi.org/project/dbdemos-tracker/ for details
 tracker_config = config_loader.app_config
@@ -111,6 +125,7 @@ app.include_router(health.router, prefix=API_PREFIX, tags=['health'])
 app.include_router(config.router, prefix=API_PREFIX, tags=['configuration'])
 app.include_router(agent.router, prefix=API_PREFIX, tags=['agents'])
 app.include_router(chat.router, prefix=API_PREFIX, tags=['chat'])
+app.include_router(metrics.router, prefix=API_PREFIX, tags=['metrics'])
 
 # Production: Serve Vite static build
 # Vite builds to 'out' directory (configured in vite.config.ts)
@@ -36,6 +36,8 @@ class ConfigLoader:
 
     self.config_dir = config_dir
     self._app_config: Optional[Dict[str, Any]] = None
+    # Incremented on every (re)load so caches built from the config can reset
+    self.version = 0
 
     # Load config at initialization
     self._load_all()
@@ -72,6 +74,7 @@ class ConfigLoader:
     logger.info('Loading application configuration...')
 
     self._app_config = self._load_json_file('app.json')
+    self.version += 1
 
     # Resolve mas_id to endpoint_name for agents that use it
     self._resolve_mas_ids()
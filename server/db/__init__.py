@@ -13,12 +13,22 @@ from .database import (
   session_scope,
   test_database_connection,
 )
-from .models import Base, ChatModel, MessageModel
+from .models import (
+  TRACE_PREVIEW,
+  Base,
+  ChatModel,
+  EndpointFormatModel,
+  MessageModel,
+  MessageTraceModel,
+)
 
 __all__ = [
+  'TRACE_PREVIEW',
   'Base',
   'ChatModel',
+  'EndpointFormatModel',
   'MessageModel',
+  'MessageTraceModel',
   'create_tables',
   'get_database_url',
   'get_engine',
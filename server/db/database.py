@@ -6,8 +6,9 @@ Uses asyncpg driver for non-blocking database operations.
 
 import os
 import ssl
+import time
 from contextlib import asynccontextmanager
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Dict, Optional, Tuple
 from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
 
 from sqlalchemy.ext.asyncio import (
@@ -17,12 +18,36 @@ from sqlalchemy.ext.asyncio import (
   create_async_engine,
 )
 
+from ..metrics import registry
 from .models import Base
 
 # Global engine and session factory
 _engine: Optional[AsyncEngine] = None
 _async_session_maker: Optional[async_sessionmaker[AsyncSession]] = None
 
+POOL_CHECKOUT_SECONDS = registry.histogram(
+  'db_pool_checkout_seconds',
+  'Time session_scope waited for a pooled connection (includes connect and pre-ping)',
+  buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+def _pool_connections() -> Dict[Tuple[str, ...], float]:
+  """Connection counts of the engine's pool, read when /api/metrics is scraped."""
+  if _engine is None:
+    return {}
+  pool = _engine.pool
+  return {
+    ('checked_out',): pool.checkedout(),
+    ('idle',): pool.checkedin(),
+    ('size',): pool.size(),
+  }
+
+
+registry.gauge(
+  'db_pool_connections', 'Database pool connections by state', ['state'], _pool_connections
+)
+
 
 def get_database_url() -> Optional[str]:
   """Get database URL from environment.
@@ -176,6 +201,10 @@ async def session_scope() -> AsyncGenerator[AsyncSession, None]:
   """
   session = await get_session()
   try:
+    # Check out the connection up front so the pool wait is measured on its own
+    checkout_start = time.perf_counter()
+    await session.connection()
+    POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - checkout_start)
     yield session
     await session.commit()
   except Exception:
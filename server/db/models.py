@@ -4,11 +4,34 @@ This module defines the database schema for persistent chat storage.
 """
 
 from datetime import datetime
-from typing import Optional
-
-from sqlalchemy import Boolean, DateTime, ForeignKey, Index, String, Text, func
+from typing import Any, Dict, Optional
+
+from sqlalchemy import (
+  Boolean,
+  DateTime,
+  ForeignKey,
+  Index,
+  Integer,
+  LargeBinary,
+  String,
+  Text,
+  func,
+  inspect,
+  literal,
+)
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, query_expression, relationship
+
+# Bulky trace_summary keys left out of message listings; the full summary is
+# served by GET /api/chats/{chat_id}/messages/{message_id}/trace
+TRACE_DETAIL_KEYS = ('databricks_output', 'tools_called')
+
+
+def trace_preview(trace_summary: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+  """trace_summary without TRACE_DETAIL_KEYS (None if there is no trace)."""
+  if trace_summary is None:
+    return None
+  return {key: value for key, value in trace_summary.items() if key not in TRACE_DETAIL_KEYS}
 
 
 class Base(DeclarativeBase):
@@ -32,6 +55,13 @@ class ChatModel(Base):
   updated_at: Mapped[datetime] = mapped_column(
     DateTime(timezone=True), default=func.now(), onupdate=func.now(), nullable=False
   )
+  # Denormalised from messages, updated in the same statement that adds messages
+  message_count: Mapped[int] = mapped_column(
+    Integer, default=0, server_default='0', nullable=False
+  )
+  last_message_at: Mapped[Optional[datetime]] = mapped_column(
+    DateTime(timezone=True), nullable=True
+  )
 
   # Relationship to messages
   messages: Mapped[list['MessageModel']] = relationship(
@@ -54,6 +84,8 @@ class ChatModel(Base):
       'agent_id': self.agent_id,
       'created_at': self.created_at.isoformat() if self.created_at else None,
       'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+      'message_count': self.message_count or 0,
+      'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
       'messages': [msg.to_dict() for msg in self.messages] if self.messages else [],
     }
 
@@ -66,6 +98,8 @@ class ChatModel(Base):
       'agent_id': self.agent_id,
       'created_at': self.created_at.isoformat() if self.created_at else None,
       'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+      'message_count': self.message_count or 0,
+      'last_message_at': self.last_message_at.isoformat() if self.last_message_at else None,
     }
 
 
@@ -84,8 +118,15 @@ class MessageModel(Base):
     DateTime(timezone=True), default=func.now(), nullable=False
   )
   trace_id: Mapped[Optional[str]] = mapped_column(String(100), nullable=True)
-  trace_summary: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+  # Deferred: can be large (the whole agent trace). Listings select TRACE_PREVIEW
+  # into trace_preview instead; get_trace() loads the full summary on demand.
+  trace_summary: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True, deferred=True)
+  trace_preview: Mapped[Optional[dict]] = query_expression()
   is_error: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+  # True when the client disconnected before the answer completed (content is partial)
+  is_interrupted: Mapped[bool] = mapped_column(
+    Boolean, default=False, server_default='false', nullable=False
+  )
 
   # Relationship back to chat
   chat: Mapped['ChatModel'] = relationship('ChatModel', back_populates='messages')
@@ -94,8 +135,19 @@ class MessageModel(Base):
     Index('ix_messages_chat_timestamp', 'chat_id', 'timestamp'),
   )
 
+  def _trace_preview(self) -> Optional[dict]:
+    """Preview from the SQL expression if trace_summary was deferred, else from the summary."""
+    if 'trace_summary' in inspect(self).unloaded:
+      return self.trace_preview
+    return trace_preview(self.trace_summary)
+
   def to_dict(self) -> dict:
-    """Convert to dictionary for JSON serialization."""
+    """Convert to dictionary for JSON serialization.
+
+    trace_summary is the preview without TRACE_DETAIL_KEYS; has_trace tells
+    whether the full summary can be fetched from the trace endpoint.
+    """
+    preview = self._trace_preview()
     return {
       'id': self.id,
       'chat_id': self.chat_id,
@@ -103,6 +155,57 @@ class MessageModel(Base):
       'content': self.content,
       'timestamp': self.timestamp.isoformat() if self.timestamp else None,
       'trace_id': self.trace_id,
-      'trace_summary': self.trace_summary,
+      'has_trace': preview is not None,
+      'trace_summary': preview,
       'is_error': self.is_error,
+      'is_interrupted': bool(self.is_interrupted),
     }
+
+
+def _without_detail_keys(column):
+  """SQL expression removing TRACE_DETAIL_KEYS from a JSONB column (jsonb - text)."""
+  for key in TRACE_DETAIL_KEYS:
+    column = column.op('-', return_type=JSONB)(literal(key, Text))
+  return column
+
+
+# Selected into MessageModel.trace_preview with with_expression() by message listings
+TRACE_PREVIEW = _without_detail_keys(MessageModel.trace_summary)
+
+
+class MessageTraceModel(Base):
+  """SQLAlchemy model for compressed full traces of messages.
+
+  Written for traces above TRACE_COMPRESS_THRESHOLD_BYTES (see
+  server/services/chat/traces.py); the message's trace_summary then only holds
+  the preview. Deleted with the message.
+  """
+
+  __tablename__ = 'message_traces'
+
+  message_id: Mapped[str] = mapped_column(
+    String(50), ForeignKey('messages.id', ondelete='CASCADE'), primary_key=True
+  )
+  codec: Mapped[str] = mapped_column(String(16), nullable=False)
+  payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+  # Sizes of the JSON before and after compression, for storage reporting
+  raw_size: Mapped[int] = mapped_column(Integer, nullable=False)
+  stored_size: Mapped[int] = mapped_column(Integer, nullable=False)
+  created_at: Mapped[datetime] = mapped_column(
+    DateTime(timezone=True), default=func.now(), nullable=False
+  )
+
+
+class EndpointFormatModel(Base):
+  """SQLAlchemy model for detected serving endpoint input formats.
+
+  Shared by all app workers so each endpoint's format is probed only once.
+  """
+
+  __tablename__ = 'endpoint_formats'
+
+  endpoint_name: Mapped[str] = mapped_column(String(255), primary_key=True)
+  format: Mapped[str] = mapped_column(String(32), nullable=False)
+  detected_at: Mapped[datetime] = mapped_column(
+    DateTime(timezone=True), default=func.now(), nullable=False
+  )
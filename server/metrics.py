@@ -0,0 +1,314 @@
+"""Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms are plain dicts keyed by label values, so recording is
+a few dict operations and nothing is formatted until /api/metrics is scraped.
+Gauges read their values from a callback at scrape time. Values are per worker
+process (like any Prometheus client without multiprocess mode); scrape each
+worker or aggregate with sum().
+
+RequestMetricsMiddleware (added in app.py) counts every HTTP request and the
+SSE frames/bytes of streaming responses.
+
+Usage:
+    from server.metrics import registry
+
+    REQUESTS = registry.counter('requests_total', 'Requests received', ['route'])
+    LATENCY = registry.histogram('request_seconds', 'Request latency', ['route'])
+
+    REQUESTS.inc(route='/api/chats')
+    with LATENCY.time(route='/api/chats'):
+        ...
+"""
+
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from fast DB calls to long agent answers
+DEFAULT_BUCKETS = (
+  0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+
+def _escape(value: str) -> str:
+  """Escape a label value for the Prometheus text format."""
+  return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+  """Render {name="value",...} (empty string if there are no labels)."""
+  parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+  if extra:
+    parts.append(extra)
+  return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+  """Render a sample value, without a trailing .0 for whole numbers."""
+  return str(int(value)) if value == int(value) else repr(value)
+
+
+class _Metric(ABC):
+  """Common parts of counters, histograms and gauges."""
+
+  type = ''
+
+  def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+    self.name = name
+    self.help = help
+    self.labelnames = tuple(labelnames)
+    self._lock = threading.Lock()
+
+  def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+  @abstractmethod
+  def _samples(self) -> List[str]:
+    """Render the sample lines (without HELP and TYPE)."""
+    pass
+
+  def render(self) -> str:
+    """Render HELP, TYPE and all samples."""
+    lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+    lines.extend(self._samples())
+    return '\n'.join(lines)
+
+
+class Counter(_Metric):
+  """Monotonically increasing count per label set."""
+
+  type = 'counter'
+
+  def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+    super().__init__(name, help, labelnames)
+    self._values: Dict[Tuple[str, ...], float] = {}
+
+  def inc(self, amount: float = 1, **labels: str):
+    """Add to the counter for the given labels."""
+    key = self._key(labels)
+    with self._lock:
+      self._values[key] = self._values.get(key, 0) + amount
+
+  def value(self, **labels: str) -> float:
+    """Current value for the given labels."""
+    return self._values.get(self._key(labels), 0)
+
+  def _samples(self) -> List[str]:
+    with self._lock:
+      items = list(self._values.items())
+    return [
+      f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}' for key, v in items
+    ]
+
+
+class Histogram(_Metric):
+  """Bucketed distribution of observed values per label set."""
+
+  type = 'histogram'
+
+  def __init__(
+    self,
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Sequence[float] = DEFAULT_BUCKETS,
+  ):
+    super().__init__(name, help, labelnames)
+    self.buckets = tuple(sorted(buckets))
+    # label values -> (per-bucket counts with a last slot for +Inf, [sum])
+    self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+  def observe(self, value: float, **labels: str):
+    """Record one observation."""
+    key = self._key(labels)
+    index = bisect.bisect_left(self.buckets, value)
+    with self._lock:
+      entry = self._values.get(key)
+      if entry is None:
+        entry = ([0] * (len(self.buckets) + 1), [0.0])
+        self._values[key] = entry
+      entry[0][index] += 1
+      entry[1][0] += value
+
+  @contextmanager
+  def time(self, **labels: str) -> Iterator[None]:
+    """Observe the wall time of a block, in seconds."""
+    start = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start, **labels)
+
+  def count(self, **labels: str) -> int:
+    """Number of observations for the given labels."""
+    entry = self._values.get(self._key(labels))
+    return sum(entry[0]) if entry else 0
+
+  def _samples(self) -> List[str]:
+    with self._lock:
+      items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+    lines = []
+    for key, counts, total in items:
+      cumulative = 0
+      for bound, count in zip(self.buckets, counts):
+        cumulative += count
+        le = _format_labels(self.labelnames, key, f'le="{bound}"')
+        lines.append(f'{self.name}_bucket{le} {cumulative}')
+      cumulative += counts[-1]
+      le = _format_labels(self.labelnames, key, 'le="+Inf"')
+      lines.append(f'{self.name}_bucket{le} {cumulative}')
+      labels = _format_labels(self.labelnames, key)
+      lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+      lines.append(f'{self.name}_count{labels} {cumulative}')
+    return lines
+
+
+class Gauge(_Metric):
+  """Current value per label set, read from a callback when scraped.
+
+  The callback returns {label values tuple: value}, so state that is already
+  tracked elsewhere (e.g. pool sizes) costs nothing until /api/metrics is read.
+  """
+
+  type = 'gauge'
+
+  def __init__(
+    self,
+    name: str,
+    help: str,
+    labelnames: Sequence[str],
+    collect: Callable[[], Dict[Tuple[str, ...], float]],
+  ):
+    super().__init__(name, help, labelnames)
+    self._collect = collect
+
+  def _samples(self) -> List[str]:
+    try:
+      items = list(self._collect().items())
+    except Exception:
+      # A broken collector must not break the whole scrape
+      return []
+    return [
+      f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}' for key, v in items
+    ]
+
+
+class MetricsRegistry:
+  """All metrics of the process, rendered together for scraping."""
+
+  def __init__(self):
+    self._metrics: Dict[str, _Metric] = {}
+
+  def _register(self, metric: _Metric) -> _Metric:
+    existing = self._metrics.get(metric.name)
+    if existing is not None:
+      # Re-registering (e.g. module reload) returns the metric that holds the data
+      return existing
+    self._metrics[metric.name] = metric
+    return metric
+
+  def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Create (or get) a counter."""
+    return self._register(Counter(name, help, labelnames))
+
+  def histogram(
+    self,
+    name: str,
+    help: str,
+    labelnames: Sequence[str] = (),
+    buckets: Optional[Sequence[float]] = None,
+  ) -> Histogram:
+    """Create (or get) a histogram."""
+    return self._register(Histogram(name, help, labelnames, buckets or DEFAULT_BUCKETS))
+
+  def gauge(
+    self,
+    name: str,
+    help: str,
+    labelnames: Sequence[str],
+    collect: Callable[[], Dict[Tuple[str, ...], float]],
+  ) -> Gauge:
+    """Create (or get) a gauge whose values are read from collect() at scrape time."""
+    return self._register(Gauge(name, help, labelnames, collect))
+
+  def render(self) -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    return '\n'.join(metric.render() for metric in self._metrics.values()) + '\n'
+
+
+# Global registry
+registry = MetricsRegistry()
+
+# Shared by the in-process caches (agents list, Agent Bricks details):
+# result is "hit", "stale" (served while refreshing) or "miss"
+CACHE_LOOKUPS = registry.counter(
+  'cache_lookups_total', 'Cache lookups by cache and result', ['cache', 'result']
+)
+
+HTTP_REQUESTS = registry.counter(
+  'http_requests_total', 'HTTP requests by method, route and status', ['method', 'route', 'status']
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+  'http_request_seconds', 'HTTP request duration until the response body ends', ['method', 'route']
+)
+SSE_FRAMES = registry.counter('sse_frames_total', 'Server-sent event frames written', ['route'])
+SSE_BYTES = registry.counter('sse_bytes_total', 'Server-sent event bytes written', ['route'])
+
+
+def _route_template(scope: Dict[str, Any]) -> str:
+  """Path template of the matched route (bounded label values), e.g. /api/chats/{chat_id}."""
+  route = scope.get('route')
+  return getattr(route, 'path', None) or 'unmatched'
+
+
+class RequestMetricsMiddleware:
+  """ASGI middleware counting requests, their duration, and SSE frames/bytes.
+
+  Pure ASGI (not BaseHTTPMiddleware) so streaming responses are passed through
+  untouched. Per-request counts are kept in locals and recorded once when the
+  response ends.
+  """
+
+  def __init__(self, app):
+    self.app = app
+
+  async def __call__(self, scope, receive, send):
+    """Pass the request through, recording its metrics when the response ends."""
+    if scope['type'] != 'http':
+      await self.app(scope, receive, send)
+      return
+
+    start = time.perf_counter()
+    status = 500
+    is_sse = False
+    frames = 0
+    size = 0
+
+    async def send_wrapper(message):
+      nonlocal status, is_sse, frames, size
+      if message['type'] == 'http.response.start':
+        status = message['status']
+        for name, value in message.get('headers', ()):
+          if name == b'content-type':
+            is_sse = value.startswith(b'text/event-stream')
+            break
+      elif is_sse and message['type'] == 'http.response.body':
+        body = message.get('body', b'')
+        if body:
+          frames += 1
+          size += len(body)
+      await send(message)
+
+    try:
+      await self.app(scope, receive, send_wrapper)
+    finally:
+      route = _route_template(scope)
+      method = scope.get('method', '')
+      HTTP_REQUESTS.inc(method=method, route=route, status=str(status))
+      HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=method, route=route)
+      if is_sse:
+        SSE_FRAMES.inc(frames, route=route)
+        SSE_BYTES.inc(size, route=route)
@@ -1,11 +1,11 @@
 """Agent invocation and feedback endpoints."""
 
 import asyncio
-import json
 import logging
+import time
 import uuid
 from datetime import datetime
-from typing import Any, AsyncGenerator, Dict, List, Optional, Union
+from typing import Any, AsyncGenerator, Awaitable, Dict, List, Optional, Set, Tuple, Union
 
 import mlflow
 from fastapi import APIRouter, HTTPException, Request
@@ -14,20 +14,48 @@ from pydantic import BaseModel
 
 from ..chat_storage import MessageModel, storage
 from ..config_loader import config_loader
-from ..services.agents.handlers import DatabricksEndpointHandler, DatabricksGenieHandler
+from ..metrics import registry
+from ..services.agents.events import DONE_EVENT, make_error_event, make_event
+from ..services.agents.handlers import DatabricksGenieHandler, handler_registry
+from ..services.agents.limiter import Ticket
+from ..services.agents.resilience import is_output_event
+from ..services.agents.stream_collector import StreamCollector
+from ..services.agents.streaming import DisconnectAwareStream
+from ..services.chat.persistence import persistence
 from ..services.user import get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# How often a queued request re-checks its position and the client connection
+QUEUE_POSITION_POLL_SECONDS = 1.0
+
+# Where time goes in /api/invoke_endpoint:
+# user_lookup, handler_setup, chat_setup, queue_wait, first_event (agent call to
+# first output), stream (whole agent call), persistence (building and queueing
+# the messages to store), total
+INVOKE_PHASE_SECONDS = registry.histogram(
+  'invoke_phase_seconds', 'Time spent in each phase of /api/invoke_endpoint', ['phase']
+)
+
+
+# Saves of turns whose response was cancelled, referenced until they finish
+_background_saves: Set[asyncio.Task] = set()
+
+
+def _save_in_background(save: Awaitable[None]):
+  """Run a save outside the (cancelled) response task."""
+  task = asyncio.create_task(save)
+  _background_saves.add(task)
+  task.add_done_callback(_background_saves.discard)
+
 
 def create_error_stream(error: str, message: str = '') -> StreamingResponse:
   """Create an SSE-compatible error response."""
 
   async def error_generator():
-    error_event = {'type': 'error', 'error': error, 'message': message}
-    yield f'data: {json.dumps(error_event)}\n\n'
-    yield 'data: [DONE]\n\n'
+    yield make_event({'type': 'error', 'error': error, 'message': message}).frame
+    yield DONE_EVENT.frame
 
   return StreamingResponse(
     error_generator(),
@@ -109,35 +137,43 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
   Handles chat creation and message storage automatically:
   - If chat_id is None, creates a new chat
   - Collects all streaming events (function calls, outputs, trace data)
-  - Saves user message and assistant response to chat storage after stream completes
+  - Queues user message and assistant response for write-behind storage after the
+    stream completes, so stream.completed is sent without waiting for the database
+  - Cancels the upstream stream if the client disconnects, saving the partial
+    answer marked as interrupted
   - Sends chat_id as first SSE event so frontend knows which chat to fetch
   """
   logger.info(f'🎯 Invoking agent: {options.agent_id}, chat_id: {options.chat_id}')
+  request_start = time.perf_counter()
 
   # Get current user for storage
   user_email = await get_current_user(request)
   user_storage = storage.get_storage_for_user(user_email)
+  phase_start = time.perf_counter()
+  INVOKE_PHASE_SECONDS.observe(phase_start - request_start, phase='user_lookup')
 
-  agent = config_loader.get_agent_by_id(options.agent_id)
+  try:
+    handler = handler_registry.get(options.agent_id)
+  except ValueError as e:
+    logger.error(str(e))
+    return create_error_stream(
+      error='No endpoint configured - check your app.json configuration',
+      message=str(e),
+    )
 
-  if not agent:
+  if handler is None:
     logger.error(f'Agent not found: {options.agent_id}')
     return create_error_stream(
       error=f'Agent not found: {options.agent_id}',
       message='Please check your agent configuration',
     )
 
-  # Check if this is a Genie space agent
-  genie_space_id = agent.get('genie_space_id')
-  is_genie_agent = bool(genie_space_id)
-
-  endpoint_name = agent.get('endpoint_name')
-  if not endpoint_name and not is_genie_agent:
-    logger.error(f'Agent {options.agent_id} has no endpoint_name configured')
-    return create_error_stream(
-      error='No endpoint configured - check your app.json configuration',
-      message=f'Agent {options.agent_id} has no endpoint_name',
-    )
+  # Genie agents track conversations per chat; endpoints are called by name
+  is_genie_agent = isinstance(handler, DatabricksGenieHandler)
+  endpoint_name = handler.agent_config.get('endpoint_name')
+  now = time.perf_counter()
+  INVOKE_PHASE_SECONDS.observe(now - phase_start, phase='handler_setup')
+  phase_start = now
 
   # Create or get chat
   chat_id = options.chat_id
@@ -150,144 +186,46 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
     chat_id = chat.id
     logger.info(f'✅ Created new chat: {chat_id} for user: {user_email}')
   else:
-    # Verify chat exists
-    chat = await user_storage.get(chat_id)
+    # Verify chat exists (without loading its messages)
+    chat = await user_storage.get(chat_id, include_messages=False)
     if not chat:
       logger.error(f'Chat not found: {chat_id}')
       return create_error_stream(error=f'Chat not found: {chat_id}')
+  INVOKE_PHASE_SECONDS.observe(time.perf_counter() - phase_start, phase='chat_setup')
 
   try:
-    # Select the appropriate handler based on agent type
-    if is_genie_agent:
-      handler = DatabricksGenieHandler(agent)
-    else:
-      handler = DatabricksEndpointHandler(agent)
-
     # Create wrapper that collects data and saves to storage
-    async def stream_and_store() -> AsyncGenerator[str, None]:
+    async def stream_and_store() -> AsyncGenerator[bytes, None]:
       """Wrap the handler stream to collect data and save messages after completion."""
       # First, emit the chat_id so frontend knows which chat this belongs to
-      yield f'data: {json.dumps({"type": "chat.created", "chat_id": chat_id})}\n\n'
-
-      # Collect streaming data
-      final_text = ''
-      function_calls: List[Dict[str, Any]] = []
-      trace_id: Optional[str] = None
-      databricks_output: Optional[Dict[str, Any]] = None
-      error_message: Optional[str] = None
-
-      try:
-        # For Genie agents, pass chat_id so the handler can track conversations
-        stream_endpoint = chat_id if is_genie_agent else endpoint_name
-        stream = handler.predict_stream(
-          messages=options.messages, endpoint_name=stream_endpoint
-        )
-        async for chunk in stream:
-          # Forward the chunk to frontend
-          yield chunk
-
-          # Parse the chunk to collect data (skip non-data lines)
-          if not chunk.startswith('data: '):
-            continue
-
-          data_str = chunk[6:].strip()
-          if not data_str or data_str == '[DONE]':
-            continue
-
-          try:
-            event = json.loads(data_str)
-            event_type = event.get('type', '')
-
-            # Log event types for debugging trace_id extraction
-            if 'databricks_output' in str(event) or event_type in ['response.done', 'response.output_item.done']:
-              logger.debug(f'📦 Event type: {event_type}, has databricks_output: {"databricks_output" in event}')
-
-            # Capture error events from handler (e.g., endpoint errors, streaming not supported)
-            if event_type == 'error':
-              error_message = event.get('error', 'Unknown error')
-              logger.error(f'❌ Error event received: {error_message}')
-
-            # Accumulate text from delta events (used by chat completion format endpoints)
-            elif event_type == 'response.output_text.delta':
-              delta_text = event.get('delta', '')
-              if delta_text:
-                final_text += delta_text
-
-            # Check for databricks_output at event level (for response.done events)
-            event_db_output = event.get('databricks_output', {})
-            if event_db_output and not trace_id:
-              databricks_output = event_db_output
-              trace_info = event_db_output.get('trace', {}).get('info', {})
-              if trace_info.get('trace_id'):
-                trace_id = trace_info['trace_id']
-                logger.info(f'📋 Extracted trace_id from event level: {trace_id}')
-
-            # Process response.output_item.done events
-            if event_type == 'response.output_item.done':
-              item = event.get('item', {})
-              item_type = item.get('type', '')
-
-              # Extract final text from message item
-              if item_type == 'message':
-                content_list = item.get('content', [])
-                for content_item in content_list:
-                  if content_item.get('type') == 'output_text':
-                    final_text = content_item.get('text', '')
-                    break
-
-              # Collect function calls
-              elif item_type == 'function_call':
-                function_calls.append({
-                  'call_id': item.get('call_id', ''),
-                  'name': item.get('name', ''),
-                  'arguments': _parse_json_field(item.get('arguments', {})),
-                })
-
-              elif item_type == 'function_call_output':
-                # Find matching function call and add output
-                call_id = item.get('call_id', '')
-                for fc in function_calls:
-                  if fc['call_id'] == call_id:
-                    fc['output'] = _parse_json_field(item.get('output', {}))
-                    break
-
-              # Extract trace_id from databricks_output inside item (present in final message)
-              db_output = item.get('databricks_output', {})
-              if db_output and not trace_id:
-                databricks_output = db_output
-                trace_info = db_output.get('trace', {}).get('info', {})
-                if trace_info.get('trace_id'):
-                  trace_id = trace_info['trace_id']
-                  logger.info(f'📋 Extracted trace_id from item: {trace_id}')
-
-            # Also handle response.done events which may contain final trace data
-            elif event_type == 'response.done':
-              response_data = event.get('response', {})
-              # Check for databricks_output in response
-              resp_db_output = response_data.get('databricks_output', {})
-              if resp_db_output and not trace_id:
-                databricks_output = resp_db_output
-                trace_info = resp_db_output.get('trace', {}).get('info', {})
-                if trace_info.get('trace_id'):
-                  trace_id = trace_info['trace_id']
-                  logger.info(f'📋 Extracted trace_id from response.done: {trace_id}')
-
-          except json.JSONDecodeError:
-            # Skip non-JSON lines
-            pass
-
-      except Exception as e:
-        logger.error(f'Error during streaming: {e}')
-        error_message = str(e)
-        yield f'data: {json.dumps({"type": "error", "error": str(e)})}\n\n'
-
-      # Log final extraction results for debugging
-      logger.info(f'🔍 Stream completed - trace_id: {trace_id}, has_databricks_output: {databricks_output is not None}, error: {error_message}')
-
-      # After stream completes, save messages to storage
-      trace_summary = None
-      try:
-        # Save user message (the last one in the input)
+      yield make_event({'type': 'chat.created', 'chat_id': chat_id}).frame
+
+      # Collect streaming data straight from the structured events
+      collector = StreamCollector()
+      stream: Optional[DisconnectAwareStream] = None
+      ticket: Optional[Ticket] = None
+      left_queue = False
+      stream_start: Optional[float] = None
+      first_event_seen = False
+      # Set once the turn has been handed to (or failed to reach) the write-behind queue
+      turn_handled = False
+
+      def build_turn(interrupted: bool) -> Tuple[List[MessageModel], Optional[Dict[str, Any]]]:
+        """Build the turn's messages to store and the trace summary from what was collected."""
+        # Measured duration of the agent call (0 if it never started)
+        duration_ms = 0
+        if stream_start is not None:
+          stream_seconds = time.perf_counter() - stream_start
+          INVOKE_PHASE_SECONDS.observe(stream_seconds, phase='stream')
+          duration_ms = round(stream_seconds * 1000)
+
+        final_text = collector.final_text
+        function_calls = collector.function_calls
+        trace_id = collector.trace_id
+        error_message = collector.error_message
+        turn_messages = []
+
+        # User message (the last one in the input)
         if options.messages:
           last_user_msg = options.messages[-1]
           user_message = MessageModel(
@@ -296,9 +234,10 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
             content=last_user_msg.get('content', ''),
             timestamp=datetime.now(),
           )
-          await user_storage.add_message(chat_id, user_message)
+          turn_messages.append(user_message)
 
         # Build trace summary matching frontend TraceSummary type
+        trace_summary = None
         if function_calls or trace_id:
           # Convert function_calls to tools_called format expected by frontend
           tools_called = [
@@ -311,22 +250,33 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
             }
             for fc in function_calls
           ]
+          if error_message:
+            status = 'ERROR'
+          elif interrupted:
+            status = 'INTERRUPTED'
+          else:
+            status = 'OK'
           trace_summary = {
             'trace_id': trace_id,
-            'duration_ms': 0,
-            'status': 'ERROR' if error_message else 'OK',
+            'duration_ms': duration_ms,
+            'status': status,
             'tools_called': tools_called,
             'retrieval_calls': [],
             'llm_calls': [],
             'total_tokens': 0,
             'spans_count': len(function_calls),
             'function_calls': function_calls,  # Keep original for TraceModal
-            'databricks_output': databricks_output,
+            'databricks_output': collector.databricks_output,
           }
 
-        # Save assistant message with trace data (including error messages)
-        if final_text or function_calls or error_message:
-          content = final_text if final_text else f'Sorry, I encountered an error: {error_message}'
+        # Assistant message with trace data (including error and partial messages)
+        if final_text or function_calls or error_message or interrupted:
+          if final_text:
+            content = final_text
+          elif error_message:
+            content = f'Sorry, I encountered an error: {error_message}'
+          else:
+            content = 'The response was interrupted before the agent replied.'
           assistant_message = MessageModel(
             id=f'msg_{uuid.uuid4().hex[:12]}',
             role='assistant',
@@ -335,29 +285,109 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
             trace_id=trace_id,
             trace_summary=trace_summary,
             is_error=error_message is not None,
+            is_interrupted=interrupted,
           )
-          await user_storage.add_message(chat_id, assistant_message)
+          turn_messages.append(assistant_message)
 
         logger.info(
-          f'💾 Saved messages to chat {chat_id}: '
+          f'💾 Queueing messages for chat {chat_id}: '
           f'text={len(final_text)} chars, '
           f'tools={len(function_calls)}, '
           f'trace_id={trace_id}, '
-          f'error={error_message is not None}'
+          f'error={error_message is not None}, '
+          f'interrupted={interrupted}'
         )
+        return turn_messages, trace_summary
 
-      except Exception as e:
-        logger.error(f'Failed to save messages to storage: {e}')
+      try:
+        try:
+          # Wait for a slot if the agent has concurrency limits, reporting queue position
+          if handler.limiter is not None:
+            queue_start = time.perf_counter()
+            ticket = handler.limiter.enqueue(user_email)
+            position = 0
+            while not ticket.granted:
+              if ticket.position != position:
+                position = ticket.position
+                yield make_event({'type': 'queue.position', 'position': position}).frame
+              if await request.is_disconnected():
+                left_queue = True
+                break
+              await ticket.wait(timeout=QUEUE_POSITION_POLL_SECONDS)
+            INVOKE_PHASE_SECONDS.observe(time.perf_counter() - queue_start, phase='queue_wait')
+
+          if not left_queue:
+            stream_start = time.perf_counter()
+            # For Genie agents, pass chat_id so the handler can track conversations
+            stream_endpoint = chat_id if is_genie_agent else endpoint_name
+            # Cancels the upstream stream if the client goes away mid-answer
+            stream = DisconnectAwareStream(
+              handler.stream(messages=options.messages, endpoint_name=stream_endpoint),
+              request.is_disconnected,
+            )
+            async for event in stream:
+              if not first_event_seen and is_output_event(event.data):
+                first_event_seen = True
+                INVOKE_PHASE_SECONDS.observe(
+                  time.perf_counter() - stream_start, phase='first_event'
+                )
+              # Forward the pre-encoded frame to frontend
+              yield event.frame
+              if event.data is not None:
+                collector.add(event.data)
+
+        except Exception as e:
+          logger.error(f'Error during streaming: {e}')
+          collector.error_message = str(e)
+          yield make_error_event(str(e)).frame
+
+        finally:
+          if ticket is not None:
+            handler.limiter.release(ticket)
+
+        # The client went away mid-answer: the upstream stream was cancelled, so
+        # whatever was collected so far is saved as a partial (interrupted) answer
+        interrupted = left_queue or (stream is not None and stream.disconnected)
+        logger.info(
+          f'🔍 Stream completed - trace_id: {collector.trace_id}, '
+          f'has_databricks_output: {collector.databricks_output is not None}, '
+          f'error: {collector.error_message}, interrupted: {interrupted}'
+        )
 
-      # Send completion event with trace info so frontend doesn't need to reload
-      completion_event = {
-        'type': 'stream.completed',
-        'trace_id': trace_id,
-        'trace_summary': trace_summary,
-        'is_error': error_message is not None,
-      }
-      yield f'data: {json.dumps(completion_event)}\n\n'
-      yield 'data: [DONE]\n\n'
+        # After stream completes, hand the turn's messages to the write-behind queue
+        trace_summary = None
+        persist_start = time.perf_counter()
+        turn_handled = True
+        try:
+          turn_messages, trace_summary = build_turn(interrupted)
+          # Written in the background so stream.completed is not held up by the database
+          await persistence.enqueue(user_email, chat_id, turn_messages)
+        except Exception as e:
+          logger.error(f'Failed to queue messages for storage: {e}')
+        INVOKE_PHASE_SECONDS.observe(time.perf_counter() - persist_start, phase='persistence')
+
+        # Send completion event with trace info so frontend doesn't need to reload
+        completion_event = {
+          'type': 'stream.completed',
+          'trace_id': collector.trace_id,
+          'trace_summary': trace_summary,
+          'is_error': collector.error_message is not None,
+          'is_interrupted': interrupted,
+        }
+        yield make_event(completion_event).frame
+        yield DONE_EVENT.frame
+        INVOKE_PHASE_SECONDS.observe(time.perf_counter() - request_start, phase='total')
+
+      finally:
+        if not turn_handled:
+          # Starlette cancels the response as soon as the client disconnects, often
+          # before DisconnectAwareStream notices, so the code above never runs. Save
+          # the partial answer from a separate task: this one can no longer await.
+          try:
+            turn_messages, _ = build_turn(interrupted=True)
+            _save_in_background(persistence.enqueue(user_email, chat_id, turn_messages))
+          except Exception as e:
+            logger.error(f'Failed to queue interrupted messages for storage: {e}')
 
     return StreamingResponse(
       stream_and_store(),
@@ -373,14 +403,3 @@ async def invoke_endpoint(request: Request, options: InvokeEndpointRequest):
     logger.error(f'❌ Error invoking agent {options.agent_id}: {str(e)}')
     raise
 
-
-def _parse_json_field(value: Any) -> Any:
-  """Parse a field that might be a JSON string or already an object."""
-  if isinstance(value, str):
-    trimmed = value.strip()
-    if trimmed.startswith('{') or trimmed.startswith('['):
-      try:
-        return json.loads(value)
-      except json.JSONDecodeError:
-        pass
-  return value
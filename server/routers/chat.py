@@ -2,53 +2,177 @@
 
 All endpoints are scoped to the current authenticated user.
 Chat creation and message storage is handled by /invoke_endpoint.
+
+Chats and messages can be paged with opaque keyset cursors:
+- GET /chats?limit=N returns the newest N chats; the X-Next-Cursor response
+  header (absent on the last page) is passed back as ?before= for the next page
+- GET /chats/{chat_id}?messages_limit=N returns the chat with its latest N
+  messages and a messages_cursor for GET /chats/{chat_id}/messages?before=
 """
 
 import logging
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import APIRouter, Request
-from fastapi.responses import Response
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import JSONResponse, Response
 
 from ..chat_storage import storage
+from ..services.chat.base import Cursor, decode_cursor, encode_cursor
+from ..services.chat.persistence import persistence
 from ..services.user import get_current_user
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+MAX_PAGE_SIZE = 200
+
+
+def _parse_cursor(before: Optional[str]) -> Tuple[Optional[Cursor], Optional[Response]]:
+  """Decode the before= query parameter, or build a 400 response if it is invalid."""
+  if before is None:
+    return None, None
+  try:
+    return decode_cursor(before), None
+  except ValueError as e:
+    return None, Response(content=str(e), status_code=400)
+
+
+def _messages_page(messages: List[Any], limit: int) -> Dict[str, Any]:
+  """Serialise a page fetched with limit + 1 messages, oldest first, with the cursor to go back."""
+  has_more = len(messages) > limit
+  if has_more:
+    messages = messages[1:]
+  oldest = messages[0] if messages else None
+  return {
+    'messages': [msg.to_dict() for msg in messages],
+    'next_cursor': encode_cursor((oldest.timestamp, oldest.id)) if has_more else None,
+  }
+
 
 @router.get('/chats')
-async def get_all_chats(request: Request):
-  """Get all chats for the current user sorted by updated_at (newest first).
+async def get_all_chats(
+  request: Request,
+  limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+  before: Optional[str] = None,
+):
+  """Get chats for the current user sorted by updated_at (newest first).
 
   Returns list of chat summary objects (without messages for performance).
   Use GET /chats/{chat_id} to fetch full chat with messages.
+  Without limit, returns every chat; with limit, one page and an X-Next-Cursor
+  header when more chats follow.
   """
   user_email = await get_current_user(request)
   user_storage = storage.get_storage_for_user(user_email)
 
-  logger.info(f'Fetching all chats for user: {user_email}')
-  chats = await user_storage.get_all()
-  logger.info(f'Retrieved {len(chats)} chats for user: {user_email}')
-
-  # Return summary (without messages) for list view performance
-  return [chat.to_dict_summary() for chat in chats]
+  logger.info(f'Fetching chats for user: {user_email}')
+  # Include turns still in the write-behind queue
+  await persistence.wait_for(user_email)
+
+  if limit is None and before is None:
+    chats = await user_storage.get_all()
+    logger.info(f'Retrieved {len(chats)} chats for user: {user_email}')
+    # Return summary (without messages) for list view performance
+    return [chat.to_dict_summary() for chat in chats]
+
+  cursor, error = _parse_cursor(before)
+  if error is not None:
+    return error
+  limit = limit or MAX_PAGE_SIZE
+  chats = await user_storage.list_chats(limit + 1, before=cursor)
+  headers = {}
+  if len(chats) > limit:
+    chats = chats[:limit]
+    headers['X-Next-Cursor'] = encode_cursor((chats[-1].updated_at, chats[-1].id))
+  logger.info(f'Retrieved page of {len(chats)} chats for user: {user_email}')
+  return JSONResponse([chat.to_dict_summary() for chat in chats], headers=headers)
 
 
 @router.get('/chats/{chat_id}')
-async def get_chat_by_id(request: Request, chat_id: str):
-  """Get specific chat by ID for the current user."""
+async def get_chat_by_id(
+  request: Request,
+  chat_id: str,
+  messages_limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+):
+  """Get specific chat by ID for the current user.
+
+  With messages_limit, only the latest messages are included, plus a
+  messages_cursor (None if there are no older messages) for
+  GET /chats/{chat_id}/messages.
+  """
   user_email = await get_current_user(request)
   user_storage = storage.get_storage_for_user(user_email)
 
   logger.info(f'Fetching chat {chat_id} for user: {user_email}')
 
-  chat = await user_storage.get(chat_id)
+  await persistence.wait_for(user_email, chat_id)
+  chat = await user_storage.get(chat_id, include_messages=messages_limit is None)
   if not chat:
     logger.warning(f'Chat not found: {chat_id} for user: {user_email}')
     return Response(content=f'Chat {chat_id} not found', status_code=404)
 
-  logger.info(f'Retrieved chat {chat_id} with {len(chat.messages)} messages for user: {user_email}')
-  return chat.to_dict()
+  if messages_limit is None:
+    logger.info(
+      f'Retrieved chat {chat_id} with {len(chat.messages)} messages for user: {user_email}'
+    )
+    return chat.to_dict()
+
+  messages = await user_storage.get_messages(chat_id, messages_limit + 1) or []
+  page = _messages_page(messages, messages_limit)
+  logger.info(
+    f'Retrieved chat {chat_id} with latest {len(page["messages"])} messages '
+    f'for user: {user_email}'
+  )
+  return {
+    **chat.to_dict_summary(),
+    'messages': page['messages'],
+    'messages_cursor': page['next_cursor'],
+  }
+
+
+@router.get('/chats/{chat_id}/messages')
+async def get_chat_messages(
+  request: Request,
+  chat_id: str,
+  limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+  before: Optional[str] = None,
+):
+  """Get a window of a chat's messages, oldest first, ending before the cursor.
+
+  Returns {"messages": [...], "next_cursor": ...}; pass next_cursor as before=
+  to scroll further back (None when the start of the chat is reached).
+  """
+  user_email = await get_current_user(request)
+  user_storage = storage.get_storage_for_user(user_email)
+
+  cursor, error = _parse_cursor(before)
+  if error is not None:
+    return error
+
+  await persistence.wait_for(user_email, chat_id)
+  messages = await user_storage.get_messages(chat_id, limit + 1, before=cursor)
+  if messages is None:
+    logger.warning(f'Chat not found: {chat_id} for user: {user_email}')
+    return Response(content=f'Chat {chat_id} not found', status_code=404)
+
+  return _messages_page(messages, limit)
+
+
+@router.get('/chats/{chat_id}/messages/{message_id}/trace')
+async def get_message_trace(request: Request, chat_id: str, message_id: str):
+  """Get the full trace summary of a message.
+
+  Chat and message responses only carry a preview of trace_summary (and a
+  has_trace flag); the trace modal loads the rest from here when opened.
+  """
+  user_email = await get_current_user(request)
+  user_storage = storage.get_storage_for_user(user_email)
+
+  await persistence.wait_for(user_email, chat_id)
+  trace_summary = await user_storage.get_trace(chat_id, message_id)
+  if trace_summary is None:
+    return Response(content=f'No trace for message {message_id}', status_code=404)
+  return {'message_id': message_id, 'trace_summary': trace_summary}
 
 
 @router.delete('/chats/{chat_id}')
@@ -5,12 +5,14 @@ import logging
 import time
 from typing import Any, Dict, List, Optional, Tuple
 
-from databricks.sdk import WorkspaceClient
 from databricks.sdk.errors import ResourceDoesNotExist
 from fastapi import APIRouter, Request
 
 from ..config_loader import config_loader
+from ..metrics import CACHE_LOOKUPS
 from ..services.agents.agent_bricks_service import get_agent_bricks_service
+from ..services.clients import clients
+from ..services.readiness import readiness
 from ..services.user import get_current_user, get_workspace_url
 
 logger = logging.getLogger(__name__)
@@ -87,7 +89,7 @@ def validate_agent_config(agent_config, index: int) -> Optional[dict]:
 def _validate_serving_endpoint_sync(endpoint_name: str) -> Tuple[bool, Optional[str], Optional[str]]:
   """Synchronous helper to validate serving endpoint."""
   try:
-    client = WorkspaceClient()
+    client = clients.workspace_client()
     endpoint = client.serving_endpoints.get(endpoint_name)
     state = endpoint.state.ready if endpoint.state else 'UNKNOWN'
     return True, state, None
@@ -131,9 +133,12 @@ async def get_agents():
   # Check cache first
   cache_age = time.time() - _agents_cache_timestamp
   if _agents_cache is not None and cache_age < AGENTS_CACHE_TTL_SECONDS:
+    CACHE_LOOKUPS.inc(cache='agents', result='hit')
     logger.info(f'Returning cached agents (age: {cache_age:.1f}s)')
     return _agents_cache
 
+  CACHE_LOOKUPS.inc(cache='agents', result='miss')
+
   logger.info('Fetching available agents (cache miss or expired)')
 
   try:
@@ -299,9 +304,10 @@ async def get_me(request: Request):
   - workspace_url: Databricks workspace URL for building resource links
   - lakebase_configured: Whether Lakebase PostgreSQL is configured
   - lakebase_project_id: Lakebase project ID (if configured)
-  - lakebase_error: Connection error message (empty if working)
+  - lakebase_error: Connection error message (empty if working), from the
+    readiness status cached for a few seconds rather than a new connection per visit
   """
-  from ..db import get_lakebase_project_id, is_postgres_configured, test_database_connection
+  from ..db import get_lakebase_project_id, is_postgres_configured
 
   try:
     user = await get_current_user(request)
@@ -310,7 +316,10 @@ async def get_me(request: Request):
     # Get Lakebase status
     lakebase_configured = is_postgres_configured()
     lakebase_project_id = get_lakebase_project_id()
-    lakebase_error = await test_database_connection() if lakebase_configured else None
+    lakebase_error = None
+    if lakebase_configured:
+      status = await readiness.status()
+      lakebase_error = status['checks']['database']['error']
 
     return {
       'user': user,
@@ -4,6 +4,11 @@ import logging
 import time
 
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from ..services.agents.resilience import breaker_status
+from ..services.clients import clients
+from ..services.readiness import readiness
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -13,16 +18,19 @@ router = APIRouter()
 async def health_check(is_dev: bool = False):
   """Health check endpoint for monitoring app status.
 
-  Returns application health status.
+  Returns application health status, including how long each shared client
+  took to build (the cost each request used to pay before the client registry).
   """
   try:
     health_status = {
       'status': 'healthy',
       'timestamp': int(time.time() * 1000),
       'environment': 'development' if is_dev else 'production',
+      'clients': clients.stats(),
     }
 
-    logger.info('Health check passed - all systems operational')
+    # Probed every few seconds by the platform: keep it out of the INFO log
+    logger.debug('Health check passed - all systems operational')
     return health_status
 
   except Exception as e:
@@ -32,3 +40,27 @@ async def health_check(is_dev: bool = False):
       'error': str(e),
       'timestamp': int(time.time() * 1000),
     }
+
+
+@router.get('/ready')
+async def readiness_check():
+  """Readiness probe: database pool, Databricks auth and agent status.
+
+  Results are cached for a few seconds, so frequent probes do not pile up on
+  the database or the workspace. Returns 503 when the database or Databricks
+  auth check fails; agent problems are reported without failing the probe.
+  """
+  status = await readiness.status()
+  return JSONResponse(status, status_code=200 if status['ready'] else 503)
+
+
+@router.get('/health/endpoints')
+async def endpoint_health():
+  """Circuit breaker state of each agent endpoint / Genie space called so far.
+
+  "open" means requests currently fail fast without calling the endpoint.
+  """
+  return {
+    'timestamp': int(time.time() * 1000),
+    'circuit_breakers': breaker_status(),
+  }
@@ -0,0 +1,17 @@
+"""Prometheus metrics endpoint."""
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from ..metrics import registry
+
+router = APIRouter()
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+  """Expose the process metrics for Prometheus scraping."""
+  return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
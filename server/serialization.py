@@ -0,0 +1,95 @@
+"""JSON serialization for the SSE hot path.
+
+Uses the fastest available backend, in order of preference:
+1. orjson (optional dependency)
+2. msgspec (optional dependency)
+3. stdlib json (always available)
+
+Set JSON_SERIALIZER=orjson|msgspec|json to force a specific backend.
+Encoders return bytes so frames can go straight into the StreamingResponse.
+Values a fast backend cannot encode (e.g. ints over 64 bits) fall back to stdlib json.
+
+Usage:
+    from server.serialization import sse_frame, loads
+
+    frame = sse_frame({'type': 'response.output_text.delta', 'delta': 'Hi'})
+"""
+
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+Encoder = Callable[[Any], bytes]
+Decoder = Callable[[Union[bytes, str]], Any]
+
+
+def _json_dumps(obj: Any) -> bytes:
+  """Encode with stdlib json (matches the historical json.dumps output)."""
+  return json.dumps(obj).encode()
+
+
+def _load_backends() -> Dict[str, tuple[Encoder, Decoder]]:
+  """Discover installed serializer backends, fastest first."""
+  backends: Dict[str, tuple[Encoder, Decoder]] = {}
+
+  try:
+    import orjson
+
+    backends['orjson'] = (orjson.dumps, orjson.loads)
+  except ImportError:
+    pass
+
+  try:
+    import msgspec
+
+    backends['msgspec'] = (msgspec.json.encode, msgspec.json.decode)
+  except ImportError:
+    pass
+
+  backends['json'] = (_json_dumps, json.loads)
+  return backends
+
+
+_BACKENDS = _load_backends()
+
+
+def _select_backend() -> str:
+  """Pick the backend from JSON_SERIALIZER or the fastest installed one."""
+  requested = os.environ.get('JSON_SERIALIZER', '').strip().lower()
+  if requested:
+    if requested in _BACKENDS:
+      return requested
+    logger.warning(f'JSON_SERIALIZER={requested} is not installed, using the fastest available')
+  return next(iter(_BACKENDS))
+
+
+BACKEND = _select_backend()
+_encode, _decode = _BACKENDS[BACKEND]
+logger.info(f'JSON serializer backend: {BACKEND}')
+
+
+def available_backends() -> Dict[str, Encoder]:
+  """Get the encoder of every installed backend (used by benchmarks)."""
+  return {name: encoder for name, (encoder, _) in _BACKENDS.items()}
+
+
+def dumps(obj: Any) -> bytes:
+  """Serialize an object to JSON bytes."""
+  try:
+    return _encode(obj)
+  except TypeError:
+    # Fast backends reject some values stdlib json accepts (big ints, non-str keys)
+    return _json_dumps(obj)
+
+
+def loads(data: Union[bytes, str]) -> Any:
+  """Parse JSON from bytes or str."""
+  return _decode(data)
+
+
+def sse_frame(obj: Any) -> bytes:
+  """Encode an object as a complete SSE 'data:' frame."""
+  return b'data: ' + dumps(obj) + b'\n\n'
@@ -17,6 +17,9 @@ from typing import Any, Dict, List, Optional, TypedDict
 import httpx
 from databricks.sdk import WorkspaceClient
 
+from ...metrics import CACHE_LOOKUPS
+from ..clients import clients
+
 logger = logging.getLogger(__name__)
 
 # Cache TTL in seconds (5 minutes)
@@ -127,9 +130,9 @@ class AgentBricksService:
     """Initialize service with optional WorkspaceClient.
 
     Args:
-      w: WorkspaceClient instance. If None, creates one using env vars.
+      w: WorkspaceClient instance. If None, uses the shared client.
     """
-    self.w = w or WorkspaceClient()
+    self.w = w or clients.workspace_client()
     self._ka_tiles_cache: Optional[List[Dict[str, Any]]] = None
     # Cache for MAS agent details: endpoint_name -> CacheEntry
     self._agent_cache: Dict[str, CacheEntry] = {}
@@ -163,16 +166,19 @@ class AgentBricksService:
     with self._cache_lock:
       entry = self._agent_cache.get(endpoint_name)
       if entry is None:
+        CACHE_LOOKUPS.inc(cache='agent_bricks', result='miss')
         return None
 
       age = time.time() - entry['timestamp']
 
       if age < CACHE_TTL_SECONDS:
         # Fresh data, return it
+        CACHE_LOOKUPS.inc(cache='agent_bricks', result='hit')
         logger.debug(f'Cache hit for {endpoint_name} (age: {age:.1f}s)')
         return entry['data']
       else:
         # Stale data - trigger background refresh if not already refreshing
+        CACHE_LOOKUPS.inc(cache='agent_bricks', result='stale')
         if not entry['refreshing']:
           logger.info(f'Cache stale for {endpoint_name} (age: {age:.1f}s), triggering background refresh')
           entry['refreshing'] = True
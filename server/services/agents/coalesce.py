@@ -0,0 +1,147 @@
+"""Coalescing of consecutive text deltas into fewer SSE frames.
+
+Fast foundation models emit one delta per token, and every frame costs a write
+and a proxy flush. When enabled for an agent, consecutive
+response.output_text.delta events for the same item are merged until either the
+time window or the byte budget is reached. Any other event (tool calls, done
+events, errors) flushes the buffer and passes through immediately.
+
+Enabled per agent in config/app.json:
+    "stream_coalescing": {"window_ms": 20, "max_bytes": 1024}
+or "stream_coalescing": true for the defaults.
+"""
+
+import asyncio
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from .events import StreamEvent, make_event
+
+DEFAULT_WINDOW_MS = 20.0
+DEFAULT_MAX_BYTES = 1024
+
+_DELTA_TYPE = 'response.output_text.delta'
+
+
+def get_coalescing_settings(agent_config: Dict[str, Any]) -> Optional[Dict[str, float]]:
+  """Read coalescing settings from an agent config, or None if disabled."""
+  settings = agent_config.get('stream_coalescing')
+  if not settings:
+    return None
+  if not isinstance(settings, dict):
+    settings = {}
+  return {
+    'window_ms': float(settings.get('window_ms', DEFAULT_WINDOW_MS)),
+    'max_bytes': int(settings.get('max_bytes', DEFAULT_MAX_BYTES)),
+  }
+
+
+def _is_text_delta(data: Optional[Dict[str, Any]]) -> bool:
+  """Check if an event payload is a mergeable text delta."""
+  return data is not None and data.get('type') == _DELTA_TYPE and isinstance(data.get('delta'), str)
+
+
+class _DeltaBuffer:
+  """Text deltas waiting to be sent as one event."""
+
+  def __init__(self):
+    self.first: Optional[StreamEvent] = None
+    self.parts: List[str] = []
+    self.size = 0
+    self.deadline = 0.0
+
+  def accepts(self, data: Dict[str, Any]) -> bool:
+    """Check if a delta belongs to the same output item as the buffered ones."""
+    return self.first is None or self.first.data.get('item_id') == data.get('item_id')
+
+  def add(self, event: StreamEvent, deadline: float):
+    """Buffer a delta event, starting the time window on the first one."""
+    if self.first is None:
+      self.first = event
+      self.deadline = deadline
+    delta = event.data['delta']
+    self.parts.append(delta)
+    self.size += len(delta)
+
+  def flush(self) -> Optional[StreamEvent]:
+    """Return the merged event (None if empty) and reset the buffer."""
+    if self.first is None:
+      return None
+    if len(self.parts) == 1:
+      # Single delta: reuse its already-encoded frame
+      event = self.first
+    else:
+      event = make_event({**self.first.data, 'delta': ''.join(self.parts)})
+    self.first = None
+    self.parts = []
+    self.size = 0
+    return event
+
+
+async def coalesce_deltas(
+  stream: AsyncGenerator[StreamEvent, None],
+  window_ms: float = DEFAULT_WINDOW_MS,
+  max_bytes: int = DEFAULT_MAX_BYTES,
+) -> AsyncGenerator[StreamEvent, None]:
+  """Merge consecutive text deltas within a time window or byte budget.
+
+  Args:
+    stream: Handler event stream
+    window_ms: Max time a delta waits for more deltas before being sent
+    max_bytes: Send as soon as this many characters are buffered
+
+  Yields:
+    The same events, with runs of text deltas merged
+  """
+  loop = asyncio.get_running_loop()
+  window = window_ms / 1000
+  buffer = _DeltaBuffer()
+  # Read of the next upstream event that outlived the current window
+  pending: Optional[asyncio.Future] = None
+
+  try:
+    while True:
+      if buffer.first is None and pending is None:
+        # Nothing buffered: wait for the next event without a timer
+        try:
+          event = await stream.__anext__()
+        except StopAsyncIteration:
+          break
+      else:
+        if pending is None:
+          pending = asyncio.ensure_future(stream.__anext__())
+        # Empty buffer (flushed on timeout) means no deadline: just wait for the read
+        timeout = None if buffer.first is None else max(buffer.deadline - loop.time(), 0)
+        done, _ = await asyncio.wait({pending}, timeout=timeout)
+        if not done:
+          # Window elapsed while upstream is quiet: send what we have, keep reading
+          yield buffer.flush()
+          continue
+        future, pending = pending, None
+        try:
+          event = future.result()
+        except StopAsyncIteration:
+          break
+
+      if _is_text_delta(event.data):
+        if not buffer.accepts(event.data):
+          yield buffer.flush()
+        buffer.add(event, loop.time() + window)
+        if buffer.size >= max_bytes:
+          yield buffer.flush()
+        continue
+
+      # Tool calls, done events and errors go out immediately, after buffered text
+      flushed = buffer.flush()
+      if flushed is not None:
+        yield flushed
+      yield event
+
+    flushed = buffer.flush()
+    if flushed is not None:
+      yield flushed
+
+  finally:
+    if pending is not None:
+      pending.cancel()
+      await asyncio.wait({pending})
+    await stream.aclose()
@@ -0,0 +1,231 @@
+"""Shared cache of detected serving endpoint input formats.
+
+Endpoints accept either the agent format ({"input": [...]}) or the chat
+completion format ({"messages": [...]}). Detecting it costs a failed request,
+so the result is persisted and shared by every worker and across restarts:
+- PostgreSQL (endpoint_formats table) if LAKEBASE_PG_URL is set
+- Otherwise a local JSON file (ENDPOINT_FORMAT_CACHE_FILE, default .cache/endpoint_formats.json)
+
+Entries expire after FORMAT_CACHE_TTL_SECONDS and are invalidated when a request
+with the cached format fails with a format mismatch. Each worker also keeps an
+in-process copy that is re-read from the shared store every LOCAL_REFRESH_SECONDS.
+
+Agents can skip detection entirely with a "format" hint in config/app.json.
+Otherwise the format is first read from the endpoint's declared task (see
+format_from_endpoint_metadata) before falling back to trial requests.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from server.db import EndpointFormatModel, is_postgres_configured, session_scope
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT_FORMATS = ('agent', 'chat_completion')
+
+# Re-detect formats once a day in case an endpoint is redeployed with another model
+FORMAT_CACHE_TTL_SECONDS = 24 * 3600
+# How long a worker trusts its in-process copy before re-reading the shared store
+LOCAL_REFRESH_SECONDS = 300
+
+DEFAULT_CACHE_FILE = '.cache/endpoint_formats.json'
+
+# Serving endpoint task -> input format
+_TASK_FORMATS = {
+  'agent/v1/responses': 'agent',
+  'llm/v1/chat': 'chat_completion',
+}
+
+
+def format_from_endpoint_metadata(metadata: Dict[str, Any]) -> Optional[str]:
+  """Infer the input format from a serving endpoint's metadata.
+
+  Uses the endpoint's declared task (from GET /api/2.0/serving-endpoints/{name}),
+  or chat completion for endpoints that only serve foundation or external models.
+
+  Returns:
+    "agent", "chat_completion" or None if it cannot be told from the metadata
+  """
+  task = metadata.get('task')
+  if task:
+    return _TASK_FORMATS.get(task)
+
+  config = metadata.get('config') or metadata.get('pending_config') or {}
+  entities = config.get('served_entities') or []
+  if entities and all(e.get('foundation_model') or e.get('external_model') for e in entities):
+    return 'chat_completion'
+  return None
+
+
+class _FormatStore(ABC):
+  """Persistent backend for detected formats."""
+
+  @abstractmethod
+  async def get(self, endpoint_name: str) -> Optional[Tuple[str, float]]:
+    """Get (format, detected_at epoch seconds) or None."""
+    pass
+
+  @abstractmethod
+  async def set(self, endpoint_name: str, fmt: str) -> None:
+    """Store a detected format."""
+    pass
+
+  @abstractmethod
+  async def delete(self, endpoint_name: str) -> None:
+    """Remove a stored format."""
+    pass
+
+
+class _PostgresFormatStore(_FormatStore):
+  """Formats stored in the chat database, shared by all workers and instances."""
+
+  async def get(self, endpoint_name: str) -> Optional[Tuple[str, float]]:
+    async with session_scope() as session:
+      result = await session.execute(
+        select(EndpointFormatModel).where(EndpointFormatModel.endpoint_name == endpoint_name)
+      )
+      row = result.scalar_one_or_none()
+      if row is None:
+        return None
+      return row.format, row.detected_at.timestamp()
+
+  async def set(self, endpoint_name: str, fmt: str) -> None:
+    now = datetime.now(timezone.utc)
+    stmt = insert(EndpointFormatModel).values(
+      endpoint_name=endpoint_name, format=fmt, detected_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+      index_elements=[EndpointFormatModel.endpoint_name],
+      set_={'format': fmt, 'detected_at': now},
+    )
+    async with session_scope() as session:
+      await session.execute(stmt)
+
+  async def delete(self, endpoint_name: str) -> None:
+    async with session_scope() as session:
+      await session.execute(
+        delete(EndpointFormatModel).where(EndpointFormatModel.endpoint_name == endpoint_name)
+      )
+
+
+class _FileFormatStore(_FormatStore):
+  """Formats stored in a local JSON file, shared by the workers of one instance."""
+
+  def __init__(self, path: Path):
+    self.path = path
+
+  def _read(self) -> Dict[str, Dict[str, object]]:
+    try:
+      with open(self.path, 'r') as f:
+        return json.load(f)
+    except FileNotFoundError:
+      return {}
+    except (OSError, json.JSONDecodeError) as e:
+      logger.warning(f'Could not read endpoint format cache {self.path}: {e}')
+      return {}
+
+  def _write(self, data: Dict[str, Dict[str, object]]):
+    # Write to a temp file and rename so concurrent readers never see a partial file
+    self.path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'w') as f:
+      json.dump(data, f)
+    os.replace(tmp_path, self.path)
+
+  def _update(self, endpoint_name: str, entry: Optional[Dict[str, object]]):
+    data = self._read()
+    if entry is None:
+      data.pop(endpoint_name, None)
+    else:
+      data[endpoint_name] = entry
+    self._write(data)
+
+  async def get(self, endpoint_name: str) -> Optional[Tuple[str, float]]:
+    entry = (await asyncio.to_thread(self._read)).get(endpoint_name)
+    if not entry:
+      return None
+    return entry['format'], float(entry['detected_at'])
+
+  async def set(self, endpoint_name: str, fmt: str) -> None:
+    entry = {'format': fmt, 'detected_at': time.time()}
+    await asyncio.to_thread(self._update, endpoint_name, entry)
+
+  async def delete(self, endpoint_name: str) -> None:
+    await asyncio.to_thread(self._update, endpoint_name, None)
+
+
+class EndpointFormatCache:
+  """Detected endpoint formats: in-process copy in front of a shared persistent store."""
+
+  def __init__(self, store: Optional[_FormatStore] = None):
+    self._store = store
+    # endpoint_name -> (format, detected_at, read_at)
+    self._local: Dict[str, Tuple[str, float, float]] = {}
+
+  def _get_store(self) -> _FormatStore:
+    """Select the persistent backend on first use."""
+    if self._store is None:
+      if is_postgres_configured():
+        self._store = _PostgresFormatStore()
+      else:
+        path = Path(os.environ.get('ENDPOINT_FORMAT_CACHE_FILE', DEFAULT_CACHE_FILE))
+        self._store = _FileFormatStore(path)
+      logger.info(f'Endpoint format cache backend: {type(self._store).__name__}')
+    return self._store
+
+  async def get(self, endpoint_name: str) -> Optional[str]:
+    """Get the cached format for an endpoint, or None if unknown or expired."""
+    now = time.time()
+    local = self._local.get(endpoint_name)
+    if local and now - local[2] < LOCAL_REFRESH_SECONDS:
+      fmt, detected_at, _ = local
+    else:
+      try:
+        stored = await self._get_store().get(endpoint_name)
+      except Exception as e:
+        logger.warning(f'Could not read endpoint format for {endpoint_name}: {e}')
+        stored = None
+      if stored is None:
+        self._local.pop(endpoint_name, None)
+        return None
+      fmt, detected_at = stored
+      self._local[endpoint_name] = (fmt, detected_at, now)
+
+    if now - detected_at >= FORMAT_CACHE_TTL_SECONDS or fmt not in ENDPOINT_FORMATS:
+      logger.info(f'Cached format for {endpoint_name} expired, it will be re-detected')
+      return None
+    return fmt
+
+  async def set(self, endpoint_name: str, fmt: str) -> None:
+    """Record the detected format for an endpoint."""
+    now = time.time()
+    self._local[endpoint_name] = (fmt, now, now)
+    try:
+      await self._get_store().set(endpoint_name, fmt)
+      logger.info(f'Cached endpoint format for {endpoint_name}: {fmt}')
+    except Exception as e:
+      logger.warning(f'Could not persist endpoint format for {endpoint_name}: {e}')
+
+  async def invalidate(self, endpoint_name: str) -> None:
+    """Forget the format of an endpoint (e.g. after it started failing)."""
+    self._local.pop(endpoint_name, None)
+    try:
+      await self._get_store().delete(endpoint_name)
+      logger.info(f'Invalidated cached endpoint format for {endpoint_name}')
+    except Exception as e:
+      logger.warning(f'Could not invalidate endpoint format for {endpoint_name}: {e}')
+
+
+# Global format cache shared by all endpoint handlers in this process
+endpoint_formats = EndpointFormatCache()
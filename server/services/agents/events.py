@@ -0,0 +1,36 @@
+"""Structured SSE events produced by deployment handlers.
+
+Handlers yield StreamEvent objects that carry both the parsed event payload and
+its encoded SSE frame. The router forwards the frame to the client unchanged and
+reads the payload directly, so no event is serialized or parsed twice.
+"""
+
+from typing import Any, Dict, NamedTuple, Optional
+
+from ...serialization import sse_frame
+
+
+class StreamEvent(NamedTuple):
+  """A single SSE event.
+
+  Attributes:
+    data: Parsed event payload, or None for the [DONE] terminator
+    frame: The encoded 'data: ...' SSE frame sent to the client
+  """
+
+  data: Optional[Dict[str, Any]]
+  frame: bytes
+
+
+def make_event(data: Dict[str, Any]) -> StreamEvent:
+  """Build a StreamEvent from a payload, encoding its SSE frame once."""
+  return StreamEvent(data, sse_frame(data))
+
+
+def make_error_event(error: str) -> StreamEvent:
+  """Build an SSE error event."""
+  return make_event({'type': 'error', 'error': error})
+
+
+# Terminator sent at the end of every stream
+DONE_EVENT = StreamEvent(None, b'data: [DONE]\n\n')
@@ -3,5 +3,13 @@
 from .base import BaseDeploymentHandler
 from .databricks_endpoint import DatabricksEndpointHandler
 from .databricks_genie import DatabricksGenieHandler
+from .registry import HandlerRegistry, create_handler, handler_registry
 
-__all__ = ['BaseDeploymentHandler', 'DatabricksEndpointHandler', 'DatabricksGenieHandler']
+__all__ = [
+  'BaseDeploymentHandler',
+  'DatabricksEndpointHandler',
+  'DatabricksGenieHandler',
+  'HandlerRegistry',
+  'create_handler',
+  'handler_registry',
+]
@@ -3,6 +3,19 @@
 from abc import ABC, abstractmethod
 from typing import Any, AsyncGenerator, Dict, List
 
+from ....metrics import registry
+from ..coalesce import coalesce_deltas, get_coalescing_settings
+from ..events import StreamEvent
+from ..limiter import create_limiter
+from ..resilience import get_breaker, get_retry_policy, resilient_stream
+
+# Time from calling the upstream service until it starts answering
+UPSTREAM_FIRST_BYTE_SECONDS = registry.histogram(
+  'upstream_first_byte_seconds',
+  'Time from calling an agent endpoint or Genie space until it starts answering',
+  ['endpoint', 'transport'],
+)
+
 
 class BaseDeploymentHandler(ABC):
   """Abstract base class for deployment handlers.
@@ -18,11 +31,34 @@ class BaseDeploymentHandler(ABC):
       agent_config: The agent configuration dict from agents.json
     """
     self.agent_config = agent_config
+    self.coalescing = get_coalescing_settings(agent_config)
+    # Optional per-agent concurrency limits, shared by all requests to this agent
+    self.limiter = create_limiter(agent_config)
+    # Retries before the first token, and a breaker shared by agents on the same endpoint
+    self.retry_policy = get_retry_policy(agent_config)
+    breaker_name = agent_config.get('genie_space_id') or agent_config.get('endpoint_name') or ''
+    self.breaker = get_breaker(breaker_name, agent_config)
+
+  def stream(
+    self, messages: List[Dict[str, str]], endpoint_name: str
+  ) -> AsyncGenerator[StreamEvent, None]:
+    """Stream events through the agent's configured pipeline.
+
+    Wraps predict_stream with retries and the endpoint's circuit breaker, then
+    the optional per-agent stages from app.json (delta coalescing). Callers
+    should use this rather than predict_stream.
+    """
+    events = resilient_stream(
+      lambda: self.predict_stream(messages, endpoint_name), self.breaker, self.retry_policy
+    )
+    if self.coalescing:
+      events = coalesce_deltas(events, **self.coalescing)
+    return events
 
   @abstractmethod
   async def predict_stream(
     self, messages: List[Dict[str, str]], endpoint_name: str
-  ) -> AsyncGenerator[str, None]:
+  ) -> AsyncGenerator[StreamEvent, None]:
     """Stream response from the endpoint.
 
     Args:
@@ -30,6 +66,7 @@ class BaseDeploymentHandler(ABC):
       endpoint_name: Name of the endpoint to call
 
     Yields:
-      Server-Sent Events (SSE) formatted strings with JSON data
+      StreamEvent objects (parsed payload plus its encoded SSE frame),
+      ending with DONE_EVENT
     """
     pass
@@ -1,69 +1,98 @@
 """Handler for Databricks model serving endpoints.
 
-Uses the MLflow deployments client to call endpoints with return_trace=True
-to get full trace data from Databricks.
+Streams from the serving-endpoint invocations API with a shared httpx.AsyncClient,
+so an open chat stream holds a socket rather than a thread. Falls back to the
+MLflow deployments client (run in a worker thread) when the workspace config
+cannot be resolved or the agent sets "transport": "mlflow".
+Requests are sent with return_trace=True to get full trace data from Databricks.
 
 Supports two endpoint formats:
 1. Agent format: {"input": messages} - for MAS and Agent Framework endpoints
 2. Chat completion format: {"messages": [...]} - for foundation model endpoints
 
-The format is auto-detected on first call and cached per endpoint.
+The format comes from the agent's "format" hint in config/app.json, or is
+auto-detected on first call and persisted per endpoint (see endpoint_formats.py).
+Detection reads the endpoint's declared task from the serving-endpoints API and,
+if that is inconclusive, races both formats and keeps the one the endpoint accepts.
 Chat completion responses are converted to agent format for unified frontend handling.
 """
 
 import asyncio
-import json
+import concurrent.futures
 import logging
-from typing import Any, AsyncGenerator, Dict, List, Optional
+import threading
+import time
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
 
-from mlflow.deployments import get_deploy_client
+from databricks.sdk.core import Config
 
-from .base import BaseDeploymentHandler
+from ....serialization import dumps, loads
+from ...clients import clients
+from ..endpoint_formats import ENDPOINT_FORMATS, endpoint_formats, format_from_endpoint_metadata
+from ..events import DONE_EVENT, StreamEvent, make_error_event, make_event
+from ..mojibake import MojibakeDecoder, fix_mojibake
+from .base import UPSTREAM_FIRST_BYTE_SECONDS, BaseDeploymentHandler
 
 logger = logging.getLogger(__name__)
 
-# Cache endpoint format: endpoint_name -> "agent" | "chat_completion"
-_endpoint_format_cache: Dict[str, str] = {}
+# Endpoint metadata lookups must not delay the first token for long
+METADATA_TIMEOUT_SECONDS = 5.0
 
+# Max chunks buffered between the MLflow worker thread and the event loop.
+# When full, the worker blocks until the SSE consumer catches up.
+STREAM_QUEUE_MAXSIZE = 64
+# How often a blocked worker re-checks whether the consumer has gone away
+QUEUE_PUT_POLL_SECONDS = 0.5
 
-# =============================================================================
-# Response Format Converters
-# =============================================================================
 
+class EndpointStreamError(Exception):
+  """Raised when the serving endpoint rejects or fails a streaming request."""
 
-def fix_mojibake(text: str) -> str:
-  """Fix UTF-8 content that was incorrectly decoded as Latin-1.
+  def __init__(self, message: str, status_code: Optional[int] = None):
+    super().__init__(message)
+    self.status_code = status_code
 
-  Some endpoints return UTF-8 bytes interpreted as Latin-1 characters.
-  Example: "â€"" (3 Latin-1 chars) should be "—" (em dash in UTF-8).
 
-  Handles mixed content (mojibake + emojis) by fixing only the broken parts.
+def _needs_chat_completion_format(error_str: str) -> bool:
+  """Check if an endpoint error means the endpoint expects chat completion input.
+
+  Multiple error formats exist depending on the endpoint type.
   """
-  if not text:
-    return text
+  return (
+    "Missing required Chat parameter: 'messages'" in error_str
+    or "Model is missing inputs ['messages']" in error_str
+    or ("extra inputs: ['input']" in error_str and 'messages' in error_str)
+  )
 
-  # Try the simple approach first (works if no high Unicode chars like emojis)
-  try:
-    return text.encode('latin-1').decode('utf-8')
-  except (UnicodeDecodeError, UnicodeEncodeError):
-    pass
 
-  # Fallback: fix mojibake patterns while preserving high Unicode chars (emojis etc)
-  # Mojibake chars are in the 0x80-0xFF range (Latin-1 extended)
-  import re
+def _needs_agent_format(error_str: str) -> bool:
+  """Check if an endpoint error means the endpoint expects agent input."""
+  return (
+    "Model is missing inputs ['input']" in error_str
+    or ("extra inputs: ['messages']" in error_str and 'input' in error_str)
+  )
+
+
+def _format_rejected(error_str: str, fmt: str) -> bool:
+  """Check if an endpoint error means it does not accept the given format."""
+  if fmt == 'chat_completion':
+    return _needs_agent_format(error_str)
+  return _needs_chat_completion_format(error_str)
+
+
+def _other_format(fmt: str) -> str:
+  """Get the format to fall back to when an endpoint rejects the given one."""
+  return 'agent' if fmt == 'chat_completion' else 'chat_completion'
 
-  def fix_segment(match: re.Match) -> str:
-    segment = match.group(0)
-    try:
-      return segment.encode('latin-1').decode('utf-8')
-    except (UnicodeDecodeError, UnicodeEncodeError):
-      return segment
 
-  # Match sequences of chars in Latin-1 extended range (likely mojibake)
-  return re.sub(r'[\u0080-\u00ff]+', fix_segment, text)
+# =============================================================================
+# Response Format Converters
+# =============================================================================
 
 
-def convert_chat_completion_chunk(chunk: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+def convert_chat_completion_chunk(
+  chunk: Dict[str, Any], decoder: Optional[MojibakeDecoder] = None
+) -> Optional[Dict[str, Any]]:
   """Convert OpenAI chat completion chunk to agent format.
 
   OpenAI format:
@@ -76,6 +105,7 @@ def convert_chat_completion_chunk(chunk: Dict[str, Any]) -> Optional[Dict[str, A
   Agent format:
     {"type": "response.output_text.delta", "delta": "text"}
 
+  Pass the stream's MojibakeDecoder so characters split across chunks are repaired.
   Returns None if chunk should be skipped (no content).
   """
   # Skip non-chunk objects (e.g., final usage stats)
@@ -104,33 +134,45 @@ def convert_chat_completion_chunk(chunk: Dict[str, Any]) -> Optional[Dict[str, A
         text_parts.append(item)
     content = ''.join(text_parts)
 
+  content = decoder.decode(content) if decoder else fix_mojibake(content)
   if not content:
     return None
 
   return {
     'type': 'response.output_text.delta',
-    'delta': fix_mojibake(content),
+    'delta': content,
   }
 
 
-def format_chunk_for_sse(chunk: Dict[str, Any], endpoint_format: str) -> Optional[str]:
+def format_chunk_for_sse(
+  chunk: Dict[str, Any], endpoint_format: str, decoder: Optional[MojibakeDecoder] = None
+) -> Optional[StreamEvent]:
   """Format a chunk for SSE output, converting if needed.
 
   Args:
     chunk: Raw chunk from endpoint
     endpoint_format: "agent" or "chat_completion"
+    decoder: Per-stream mojibake decoder for chat completion text
 
   Returns:
-    SSE-formatted string or None if chunk should be skipped
+    StreamEvent or None if chunk should be skipped
   """
   if endpoint_format == 'chat_completion':
-    converted = convert_chat_completion_chunk(chunk)
+    converted = convert_chat_completion_chunk(chunk, decoder)
     if converted is None:
       return None
-    return f'data: {json.dumps(converted)}\n\n'
+    return make_event(converted)
   else:
     # Agent format: passthrough
-    return f'data: {json.dumps(chunk)}\n\n'
+    return make_event(chunk)
+
+
+def flush_decoder_event(decoder: MojibakeDecoder) -> Optional[StreamEvent]:
+  """Emit text the decoder held back for a next chunk that never came."""
+  tail = decoder.flush()
+  if not tail:
+    return None
+  return make_event({'type': 'response.output_text.delta', 'delta': tail})
 
 
 # =============================================================================
@@ -141,7 +183,8 @@ def format_chunk_for_sse(chunk: Dict[str, Any], endpoint_format: str) -> Optiona
 class DatabricksEndpointHandler(BaseDeploymentHandler):
   """Handler for Databricks model serving endpoints.
 
-  Uses MLflow deployments client with return_trace=True for full trace support.
+  Streams natively over httpx by default, with the MLflow deployments client
+  as a fallback. Both transports request return_trace=True for full trace support.
   """
 
   def __init__(self, agent_config: Dict[str, Any]):
@@ -152,6 +195,18 @@ class DatabricksEndpointHandler(BaseDeploymentHandler):
     if not self.endpoint_name:
       raise ValueError(f'Agent {agent_config.get("id")} has no endpoint_name configured')
 
+    # Optional "format" hint in app.json skips auto-detection
+    self.format_hint = agent_config.get('format')
+    if self.format_hint not in (None, *ENDPOINT_FORMATS):
+      logger.warning(
+        f'Agent {agent_config.get("id")} has unknown format "{self.format_hint}", '
+        'auto-detecting instead'
+      )
+      self.format_hint = None
+
+    # "race" sends both formats when detection is needed, "sequential" tries one after the other
+    self.format_probe = agent_config.get('format_probe', 'race')
+
   def _build_agent_inputs(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
     """Build payload for agent endpoints (MAS, Agent Framework)."""
     return {
@@ -168,105 +223,360 @@ class DatabricksEndpointHandler(BaseDeploymentHandler):
       'stream': True,
     }
 
-  def _get_inputs(self, messages: List[Dict[str, str]], endpoint_name: str) -> Dict[str, Any]:
-    """Get the appropriate input payload based on cached endpoint format."""
-    if _endpoint_format_cache.get(endpoint_name) == 'chat_completion':
+  def _build_inputs(self, messages: List[Dict[str, str]], fmt: str) -> Dict[str, Any]:
+    """Build the input payload for the given endpoint format."""
+    if fmt == 'chat_completion':
       return self._build_chat_completion_inputs(messages)
     return self._build_agent_inputs(messages)
 
+  async def _known_format(self, endpoint_name: str) -> Optional[str]:
+    """Get the configured or cached format of an endpoint, or None if unknown."""
+    if self.format_hint:
+      return self.format_hint
+    return await endpoint_formats.get(endpoint_name)
+
+  async def _record_format(self, endpoint_name: str, known: Optional[str], fmt: str):
+    """Persist the format that worked, unless it came from the hint or cache."""
+    if self.format_hint or fmt == known:
+      return
+    await endpoint_formats.set(endpoint_name, fmt)
+
+  def _resolve_native_config(self) -> Optional[Config]:
+    """Get the workspace config for native streaming, or None to use MLflow."""
+    if self.agent_config.get('transport') == 'mlflow':
+      return None
+    try:
+      return clients.workspace_config()
+    except Exception as e:
+      logger.warning(f'Could not resolve workspace config, falling back to MLflow client: {e}')
+      return None
+
   async def predict_stream(
     self, messages: List[Dict[str, str]], endpoint_name: str
-  ) -> AsyncGenerator[str, None]:
+  ) -> AsyncGenerator[StreamEvent, None]:
     """Stream response from Databricks endpoint.
 
-    Auto-detects endpoint format on first call:
-    - Tries agent format first
-    - Falls back to chat_completion if agent format fails
+    Uses the agent's format hint or the cached format, otherwise auto-detects:
+    - Reads the endpoint's declared task from the serving-endpoints API
+    - If inconclusive, races both formats (native transport) or tries agent
+      format first and falls back to chat_completion (MLflow transport)
     - Caches the result for subsequent calls
+    A cached format the endpoint starts rejecting is invalidated and the other
+    format is tried in the same request.
 
     Chat completion responses are converted to agent format for unified handling.
     """
     logger.debug(f'Calling endpoint: {endpoint_name}')
 
-    client = get_deploy_client('databricks')
-    queue: asyncio.Queue = asyncio.Queue()
-    loop = asyncio.get_event_loop()
+    config = self._resolve_native_config()
+    if config is None:
+      stream = self._predict_stream_mlflow(messages, endpoint_name)
+    else:
+      stream = self._predict_stream_native(config, messages, endpoint_name)
+
+    async for event in stream:
+      yield event
+
+  # ---------- Native async transport (httpx) ----------
+
+  @staticmethod
+  async def _auth_headers(config: Config) -> Dict[str, str]:
+    """Authentication headers, built off the event loop.
+
+    config.authenticate() is synchronous and makes an HTTP request when the
+    OAuth token needs refreshing, which would stall every in-flight stream.
+    """
+    return await asyncio.to_thread(config.authenticate)
+
+  async def _iter_chunks_native(
+    self, config: Config, endpoint_name: str, inputs: Dict[str, Any]
+  ) -> AsyncGenerator[Dict[str, Any], None]:
+    """Stream parsed JSON chunks from the invocations API.
+
+    Mirrors MLflow's Databricks predict_stream: posts the inputs with stream=True
+    and yields the JSON payload of each 'data:' line until 'data: [DONE]'.
+    """
+    url = f'{config.host.rstrip("/")}/serving-endpoints/{endpoint_name}/invocations'
+    headers = {**await self._auth_headers(config), 'Content-Type': 'application/json'}
+    body = dumps({**inputs, 'stream': True})
+
+    client = clients.http_client()
+    start = time.perf_counter()
+    async with client.stream('POST', url, content=body, headers=headers) as response:
+      UPSTREAM_FIRST_BYTE_SECONDS.observe(
+        time.perf_counter() - start, endpoint=endpoint_name, transport='httpx'
+      )
+      if response.status_code >= 400:
+        body = (await response.aread()).decode('utf-8', errors='replace')
+        raise EndpointStreamError(
+          f'{response.status_code} error from endpoint {endpoint_name}. Response text: {body}',
+          status_code=response.status_code,
+        )
+
+      async for line in response.aiter_lines():
+        if not line.startswith('data:'):
+          # Blank separators and SSE comments carry no payload
+          continue
+        value = line[5:].strip()
+        if value == '[DONE]':
+          return
+        if value:
+          yield loads(value)
+
+  async def _probe_format_native(self, config: Config, endpoint_name: str) -> Optional[str]:
+    """Read the endpoint format from the serving-endpoints API, or None if unknown."""
+    url = f'{config.host.rstrip("/")}/api/2.0/serving-endpoints/{endpoint_name}'
+    try:
+      headers = await self._auth_headers(config)
+      response = await clients.http_client().get(
+        url, headers=headers, timeout=METADATA_TIMEOUT_SECONDS
+      )
+      response.raise_for_status()
+      fmt = format_from_endpoint_metadata(response.json())
+    except Exception as e:
+      logger.warning(f'Could not read metadata of endpoint {endpoint_name}: {e}')
+      return None
+    if fmt:
+      logger.info(f'Endpoint {endpoint_name} declares {fmt} format')
+    return fmt
+
+  async def _race_formats_native(
+    self, config: Config, messages: List[Dict[str, str]], endpoint_name: str
+  ) -> Tuple[str, AsyncGenerator[Dict[str, Any], None]]:
+    """Send the request in both formats and keep the first one that streams.
+
+    The endpoint rejects the wrong format up front, so the winner is usually the
+    only request that does any work. The loser is cancelled and its connection closed.
+
+    Returns:
+      Tuple of (format, chunk stream starting with the winner's first chunk)
+    """
+    streams = {
+      fmt: self._iter_chunks_native(config, endpoint_name, self._build_inputs(messages, fmt))
+      for fmt in ENDPOINT_FORMATS
+    }
+    reads = {asyncio.ensure_future(stream.__anext__()): fmt for fmt, stream in streams.items()}
+    errors: Dict[str, Exception] = {}
+    winner: Optional[str] = None
+    first: Optional[Dict[str, Any]] = None
+
+    try:
+      while reads and winner is None:
+        done, _ = await asyncio.wait(reads, return_when=asyncio.FIRST_COMPLETED)
+        for read in done:
+          fmt = reads.pop(read)
+          try:
+            first = read.result()
+          except StopAsyncIteration:
+            first = None
+          except Exception as e:
+            errors[fmt] = e
+            continue
+          winner = fmt
+          break
+    finally:
+      for read in reads:
+        read.cancel()
+      if reads:
+        await asyncio.wait(reads)
+      for fmt, stream in streams.items():
+        if fmt != winner:
+          await stream.aclose()
+
+    if winner is None:
+      # Prefer a real failure over the expected format rejection
+      for fmt, error in errors.items():
+        if not _format_rejected(str(error), fmt):
+          raise error
+      raise errors['agent']
+
+    logger.info(f'Endpoint {endpoint_name} accepted {winner} format')
+    stream = streams[winner]
+
+    async def chunks() -> AsyncGenerator[Dict[str, Any], None]:
+      try:
+        if first is not None:
+          yield first
+          async for chunk in stream:
+            yield chunk
+      finally:
+        await stream.aclose()
+
+    return winner, chunks()
+
+  async def _predict_stream_native(
+    self, config: Config, messages: List[Dict[str, str]], endpoint_name: str
+  ) -> AsyncGenerator[StreamEvent, None]:
+    """Stream SSE events using the shared httpx client."""
+    known = await self._known_format(endpoint_name)
+    decoder = MojibakeDecoder()
+    started = False
+    try:
+      fmt = known or await self._probe_format_native(config, endpoint_name)
+      if fmt is None and self.format_probe == 'race':
+        fmt, chunks = await self._race_formats_native(config, messages, endpoint_name)
+      else:
+        # Format unknown: try agent format first
+        fmt = fmt or 'agent'
+        chunks = self._iter_chunks_native(config, endpoint_name, self._build_inputs(messages, fmt))
+
+      try:
+        async for chunk in chunks:
+          started = True
+          event = format_chunk_for_sse(chunk, fmt, decoder)
+          if event is not None:
+            yield event
+      except Exception as e:
+        # Format errors come back before any chunk; later errors are real failures
+        if started or not _format_rejected(str(e), fmt):
+          raise
+        if known and not self.format_hint:
+          await endpoint_formats.invalidate(endpoint_name)
+        fmt = _other_format(fmt)
+        logger.info(f'Endpoint {endpoint_name} requires {fmt} format, retrying...')
+        async for chunk in self._iter_chunks_native(
+          config, endpoint_name, self._build_inputs(messages, fmt)
+        ):
+          event = format_chunk_for_sse(chunk, fmt, decoder)
+          if event is not None:
+            yield event
+
+      event = flush_decoder_event(decoder)
+      if event is not None:
+        yield event
+      await self._record_format(endpoint_name, known, fmt)
+      yield DONE_EVENT
+
+    except Exception as e:
+      logger.error(f'Error calling {endpoint_name}: {e}')
+      yield make_error_event(str(e))
+      yield DONE_EVENT
+
+  # ---------- MLflow fallback transport (worker thread) ----------
+
+  async def _probe_format_mlflow(self, client: Any, endpoint_name: str) -> Optional[str]:
+    """Read the endpoint format through the MLflow client, or None if unknown."""
+    try:
+      metadata = await asyncio.to_thread(client.get_endpoint, endpoint_name)
+      fmt = format_from_endpoint_metadata(dict(metadata))
+    except Exception as e:
+      logger.warning(f'Could not read metadata of endpoint {endpoint_name}: {e}')
+      return None
+    if fmt:
+      logger.info(f'Endpoint {endpoint_name} declares {fmt} format')
+    return fmt
+
+  async def _predict_stream_mlflow(
+    self, messages: List[Dict[str, str]], endpoint_name: str
+  ) -> AsyncGenerator[StreamEvent, None]:
+    """Stream SSE events using the blocking MLflow client in a thread."""
+    client = clients.deploy_client()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=STREAM_QUEUE_MAXSIZE)
+    loop = asyncio.get_running_loop()
+    # Set when the consumer stops reading (finished, failed or cancelled)
+    stopped = threading.Event()
+    # Set once the endpoint has sent its first chunk
+    started = threading.Event()
+
+    def put(item: tuple) -> bool:
+      """Put an item in the queue, blocking the worker while it is full.
+
+      Returns False once the consumer has stopped, so the worker can bail out.
+      """
+      if stopped.is_set():
+        return False
+      future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+      while True:
+        try:
+          future.result(timeout=QUEUE_PUT_POLL_SECONDS)
+          return True
+        except concurrent.futures.TimeoutError:
+          if stopped.is_set():
+            future.cancel()
+            return False
 
     def stream_with_format(inputs: Dict[str, Any], fmt: str):
       """Stream chunks from endpoint and put them in queue."""
+      start = time.perf_counter()
       response = client.predict_stream(endpoint=endpoint_name, inputs=inputs)
-      for chunk in response:
-        logger.debug(f'Chunk ({fmt}): {chunk}')
-        loop.call_soon_threadsafe(queue.put_nowait, ('chunk', chunk, fmt))
-      loop.call_soon_threadsafe(queue.put_nowait, ('done', None, fmt))
-
-    def consume_sync_generator():
-      """Try agent format first, fall back to chat_completion if needed."""
-      cached_format = _endpoint_format_cache.get(endpoint_name)
-
-      # If format is known, use it directly
-      if cached_format:
-        inputs = self._get_inputs(messages, endpoint_name)
-        try:
-          stream_with_format(inputs, cached_format)
-        except Exception as e:
-          logger.error(f'Error calling {endpoint_name}: {e}')
-          loop.call_soon_threadsafe(queue.put_nowait, ('error', str(e), cached_format))
-        return
-
-      # Format unknown: try agent format first
       try:
-        inputs = self._build_agent_inputs(messages)
-        stream_with_format(inputs, 'agent')
-        _endpoint_format_cache[endpoint_name] = 'agent'
-        logger.info(f'Cached endpoint format for {endpoint_name}: agent')
+        for chunk in response:
+          if not started.is_set():
+            UPSTREAM_FIRST_BYTE_SECONDS.observe(
+              time.perf_counter() - start, endpoint=endpoint_name, transport='mlflow'
+            )
+          started.set()
+          logger.debug(f'Chunk ({fmt}): {chunk}')
+          if not put(('chunk', chunk, fmt)):
+            logger.info(f'Consumer stopped, abandoning stream from {endpoint_name}')
+            return
+      finally:
+        # Closing the generator releases the upstream HTTP response
+        close = getattr(response, 'close', None)
+        if close:
+          close()
+      put(('done', None, fmt))
+
+    def consume_sync_generator(fmt: str):
+      """Stream with the given format, falling back to the other one if rejected."""
+      try:
+        stream_with_format(self._build_inputs(messages, fmt), fmt)
       except Exception as e:
         error_str = str(e)
 
-        # Check if this is a format mismatch error (multiple error formats exist)
-        needs_chat_format = (
-          "Missing required Chat parameter: 'messages'" in error_str
-          or "Model is missing inputs ['messages']" in error_str
-          or ("extra inputs: ['input']" in error_str and 'messages' in error_str)
-        )
-        if needs_chat_format:
-          logger.info(f'Endpoint {endpoint_name} requires chat_completion format, retrying...')
-
-          try:
-            inputs = self._build_chat_completion_inputs(messages)
-            stream_with_format(inputs, 'chat_completion')
-            _endpoint_format_cache[endpoint_name] = 'chat_completion'
-            logger.info(f'Cached endpoint format for {endpoint_name}: chat_completion')
-          except Exception as retry_e:
-            logger.error(f'Retry failed for {endpoint_name}: {retry_e}')
-            loop.call_soon_threadsafe(queue.put_nowait, ('error', str(retry_e), 'chat_completion'))
-        else:
+        # Format errors come back before any chunk; later errors are real failures
+        if started.is_set() or not _format_rejected(error_str, fmt):
           logger.error(f'Error calling {endpoint_name}: {e}')
-          loop.call_soon_threadsafe(queue.put_nowait, ('error', error_str, 'agent'))
+          put(('error', error_str, fmt))
+          return
+
+        fmt = _other_format(fmt)
+        logger.info(f'Endpoint {endpoint_name} requires {fmt} format, retrying...')
+        try:
+          stream_with_format(self._build_inputs(messages, fmt), fmt)
+        except Exception as retry_e:
+          logger.error(f'Retry failed for {endpoint_name}: {retry_e}')
+          put(('error', str(retry_e), fmt))
+
+    known = await self._known_format(endpoint_name)
+    # Format unknown: use the declared one, or try agent format first
+    first_format = known or await self._probe_format_mlflow(client, endpoint_name) or 'agent'
 
     # Start streaming in thread pool
-    loop.run_in_executor(None, consume_sync_generator)
+    loop.run_in_executor(None, consume_sync_generator, first_format)
 
     # Yield formatted chunks
+    decoder = MojibakeDecoder()
     try:
       while True:
         msg_type, data, fmt = await queue.get()
 
         if msg_type == 'chunk':
-          formatted = format_chunk_for_sse(data, fmt)
-          if formatted:
-            yield formatted
+          event = format_chunk_for_sse(data, fmt, decoder)
+          if event is not None:
+            yield event
 
         elif msg_type == 'error':
-          yield f'data: {json.dumps({"type": "error", "error": data})}\n\n'
-          yield 'data: [DONE]\n\n'
+          if known and not self.format_hint and fmt != known:
+            # The cached format was rejected and the other one failed too
+            await endpoint_formats.invalidate(endpoint_name)
+          yield make_error_event(data)
+          yield DONE_EVENT
           break
 
         elif msg_type == 'done':
-          yield 'data: [DONE]\n\n'
+          event = flush_decoder_event(decoder)
+          if event is not None:
+            yield event
+          await self._record_format(endpoint_name, known, fmt)
+          yield DONE_EVENT
           break
 
     except Exception as e:
       logger.error(f'Error in async stream: {e}')
-      yield f'data: {json.dumps({"type": "error", "error": str(e)})}\n\n'
-      yield 'data: [DONE]\n\n'
+      yield make_error_event(str(e))
+      yield DONE_EVENT
+
+    finally:
+      # Release the worker if we stop early (client disconnect, cancellation)
+      stopped.set()
@@ -5,26 +5,46 @@ Genie spaces allow natural language queries over structured data.
 
 Flow:
 1. User sends a message
-2. Handler calls start_conversation_and_wait / create_message_and_wait
-3. SDK handles polling internally until the message is completed
+2. Handler calls start_conversation / create_message
+3. Handler polls get_message on the event loop until the message is completed
+   (cancelling the stream stops polling right away, e.g. when the client disconnects)
 4. Returns the text response and any query results as markdown tables
 """
 
 import asyncio
-import json
 import logging
-from datetime import timedelta
+import time
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
 from databricks.sdk import WorkspaceClient
+from databricks.sdk.errors import OperationFailed
 
-from .base import BaseDeploymentHandler
+from ....metrics import registry
+from ...clients import clients
+from ..events import DONE_EVENT, StreamEvent, make_error_event, make_event
+from .base import UPSTREAM_FIRST_BYTE_SECONDS, BaseDeploymentHandler
 
 logger = logging.getLogger(__name__)
 
 # Store Genie conversation IDs mapped to our chat IDs
 _genie_conversations: Dict[str, str] = {}
 
+# Polling settings for Genie messages (same overall timeout as the SDK _and_wait calls)
+GENIE_TIMEOUT_SECONDS = 180
+GENIE_POLL_INITIAL_SECONDS = 1.0
+GENIE_POLL_MAX_SECONDS = 5.0
+# Statuses the SDK's _and_wait methods treat as failures
+_GENIE_FAILED_STATUSES = {'FAILED', 'CANCELLED'}
+
+GENIE_POLL_SECONDS = registry.histogram(
+  'genie_poll_seconds', 'Duration of each Genie get_message poll', ['space']
+)
+GENIE_MESSAGE_WAIT_SECONDS = registry.histogram(
+  'genie_message_wait_seconds',
+  'Time from sending a Genie message until it completes',
+  ['space', 'outcome'],
+)
+
 
 def _format_query_result_as_markdown(columns: List[str], rows: List[List[Any]]) -> str:
   """Format SQL query results as a markdown table."""
@@ -62,7 +82,7 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
   """Handler for Databricks Genie space interactions.
 
   Uses the Genie API to send natural language queries and retrieve results.
-  The SDK's _and_wait methods handle polling automatically.
+  Messages are polled on the event loop so a cancelled stream stops waiting.
   """
 
   def __init__(self, agent_config: Dict[str, Any]):
@@ -73,39 +93,86 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
     if not self.genie_space_id:
       raise ValueError(f'Agent {agent_config.get("id")} has no genie_space_id configured')
 
-  def _start_conversation_sync(self, client: WorkspaceClient, content: str) -> Dict[str, Any]:
-    """Start a new Genie conversation. SDK handles polling."""
+  async def _wait_for_message(
+    self, client: WorkspaceClient, conversation_id: str, message_id: str
+  ) -> Any:
+    """Poll a Genie message until it is completed.
+
+    Each poll is a short blocking call in a thread; the waits between polls happen
+    on the event loop, so cancelling the caller stops polling immediately.
+    Raises OperationFailed on FAILED/CANCELLED, like the SDK's _and_wait methods.
+    """
+    wait_start = time.monotonic()
+    deadline = wait_start + GENIE_TIMEOUT_SECONDS
+    delay = GENIE_POLL_INITIAL_SECONDS
+
+    while True:
+      poll_start = time.perf_counter()
+      msg = await asyncio.to_thread(
+        client.genie.get_message, self.genie_space_id, conversation_id, message_id
+      )
+      GENIE_POLL_SECONDS.observe(time.perf_counter() - poll_start, space=self.genie_space_id)
+      status_val = _safe_get_attr(msg, 'status', None)
+      status = status_val.value if status_val and hasattr(status_val, 'value') else str(status_val)
+      if status == 'COMPLETED':
+        GENIE_MESSAGE_WAIT_SECONDS.observe(
+          time.monotonic() - wait_start, space=self.genie_space_id, outcome='completed'
+        )
+        return msg
+      if status in _GENIE_FAILED_STATUSES:
+        GENIE_MESSAGE_WAIT_SECONDS.observe(
+          time.monotonic() - wait_start, space=self.genie_space_id, outcome='failed'
+        )
+        error = _safe_get_attr(msg, 'error', None)
+        raise OperationFailed(f'failed to reach COMPLETED, got {status}: {error}')
+
+      if time.monotonic() + delay > deadline:
+        GENIE_MESSAGE_WAIT_SECONDS.observe(
+          time.monotonic() - wait_start, space=self.genie_space_id, outcome='timeout'
+        )
+        raise TimeoutError(
+          f'Genie message {message_id} did not complete within {GENIE_TIMEOUT_SECONDS}s '
+          f'(last status: {status})'
+        )
+      logger.debug(f'Genie message {message_id} status {status}, polling again in {delay:.1f}s')
+      await asyncio.sleep(delay)
+      delay = min(delay * 1.5, GENIE_POLL_MAX_SECONDS)
+
+  async def _start_conversation(self, client: WorkspaceClient, content: str) -> Dict[str, Any]:
+    """Start a new Genie conversation and wait for the answer."""
     logger.info(f'Starting Genie conversation in space {self.genie_space_id}')
 
-    # start_conversation_and_wait handles all polling and returns the final GenieMessage
-    msg = client.genie.start_conversation_and_wait(
-      space_id=self.genie_space_id,
-      content=content,
-      timeout=timedelta(minutes=3),
+    waiter = await asyncio.to_thread(
+      client.genie.start_conversation, space_id=self.genie_space_id, content=content
     )
+    conversation_id = _safe_get_attr(waiter.response, 'conversation_id', '')
+    message_id = _safe_get_attr(waiter.response, 'message_id', '')
 
-    conversation_id = _safe_get_attr(msg, 'conversation_id', '')
-    message_id = _safe_get_attr(msg, 'message_id', '')
+    msg = await self._wait_for_message(client, conversation_id, message_id)
     logger.info(f'Genie conversation completed: conv={conversation_id}, msg={message_id}')
 
-    return self._extract_result(client, msg, conversation_id, message_id)
+    return await asyncio.to_thread(self._extract_result, client, msg, conversation_id, message_id)
 
-  def _send_followup_sync(self, client: WorkspaceClient, conversation_id: str, content: str) -> Dict[str, Any]:
-    """Send a follow-up message in an existing Genie conversation."""
+  async def _send_followup(
+    self, client: WorkspaceClient, conversation_id: str, content: str
+  ) -> Dict[str, Any]:
+    """Send a follow-up message in an existing Genie conversation and wait for the answer."""
     logger.info(f'Sending follow-up in Genie conversation {conversation_id}')
 
-    # create_message_and_wait handles all polling and returns the final GenieMessage
-    msg = client.genie.create_message_and_wait(
+    waiter = await asyncio.to_thread(
+      client.genie.create_message,
       space_id=self.genie_space_id,
       conversation_id=conversation_id,
       content=content,
-      timeout=timedelta(minutes=3),
+    )
+    message_id = _safe_get_attr(waiter.response, 'message_id', '') or _safe_get_attr(
+      waiter.response, 'id', ''
     )
 
-    message_id = _safe_get_attr(msg, 'message_id', '')
+    msg = await self._wait_for_message(client, conversation_id, message_id)
     logger.info(f'Genie follow-up completed: conv={conversation_id}, msg={message_id}')
 
-    return self._extract_result(client, msg, conversation_id, message_id)
+    return await asyncio.to_thread(self._extract_result, client, msg, conversation_id, message_id)
 
   def _extract_result(self, client: WorkspaceClient, msg: Any, conversation_id: str, message_id: str) -> Dict[str, Any]:
     """Extract text, SQL, and table data from a Genie message response."""
@@ -238,7 +305,7 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
 
   async def predict_stream(
     self, messages: List[Dict[str, str]], endpoint_name: str = ''
-  ) -> AsyncGenerator[str, None]:
+  ) -> AsyncGenerator[StreamEvent, None]:
     """Stream response from Genie space.
 
     Since the Genie API is request/response (not streaming), we simulate
@@ -249,7 +316,7 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
       endpoint_name: chat_id passed for conversation tracking
 
     Yields:
-      SSE-formatted strings with JSON data
+      StreamEvent objects, ending with DONE_EVENT
     """
     # Extract the last user message
     user_message = ''
@@ -259,36 +326,34 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
         break
 
     if not user_message:
-      yield f'data: {json.dumps({"type": "error", "error": "No user message found"})}\n\n'
-      yield 'data: [DONE]\n\n'
+      yield make_error_event('No user message found')
+      yield DONE_EVENT
       return
 
     # Send a "thinking" indicator
-    yield f'data: {json.dumps({"type": "response.output_text.delta", "delta": ""})}\n\n'
+    yield make_event({'type': 'response.output_text.delta', 'delta': ''})
 
     try:
-      client = WorkspaceClient()
+      client = clients.workspace_client()
 
       # Check if we have an existing conversation for this chat
       chat_id = endpoint_name  # chat_id is passed through endpoint_name for Genie
       existing_conversation_id = _genie_conversations.get(chat_id) if chat_id else None
 
-      # Run the sync Genie call in a thread pool
+      start = time.perf_counter()
       if existing_conversation_id:
         try:
-          result = await asyncio.to_thread(
-            self._send_followup_sync, client, existing_conversation_id, user_message
-          )
+          result = await self._send_followup(client, existing_conversation_id, user_message)
         except Exception as followup_err:
           # If follow-up fails, try starting a new conversation
           logger.warning(f'Follow-up failed, starting new conversation: {followup_err}')
-          result = await asyncio.to_thread(
-            self._start_conversation_sync, client, user_message
-          )
+          result = await self._start_conversation(client, user_message)
       else:
-        result = await asyncio.to_thread(
-          self._start_conversation_sync, client, user_message
-        )
+        result = await self._start_conversation(client, user_message)
+      # Genie answers in one piece, so its first byte is the whole answer
+      UPSTREAM_FIRST_BYTE_SECONDS.observe(
+        time.perf_counter() - start, endpoint=self.genie_space_id, transport='genie'
+      )
 
       # Store conversation ID for follow-ups
       if chat_id and result.get('conversation_id'):
@@ -321,7 +386,7 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
         full_response = 'I was unable to process your request. Please try a different question.'
 
       # Stream the response as a single delta (since Genie is not truly streaming)
-      yield f'data: {json.dumps({"type": "response.output_text.delta", "delta": full_response})}\n\n'
+      yield make_event({'type': 'response.output_text.delta', 'delta': full_response})
 
       # Send completion event
       done_event = {
@@ -333,12 +398,12 @@ class DatabricksGenieHandler(BaseDeploymentHandler):
           'content': [{'type': 'output_text', 'text': full_response}],
         },
       }
-      yield f'data: {json.dumps(done_event)}\n\n'
-      yield 'data: [DONE]\n\n'
+      yield make_event(done_event)
+      yield DONE_EVENT
 
     except Exception as e:
       logger.error(f'Genie handler error: {e}')
       import traceback
       logger.error(traceback.format_exc())
-      yield f'data: {json.dumps({"type": "error", "error": f"Genie error: {str(e)}"})}\n\n'
-      yield 'data: [DONE]\n\n'
+      yield make_error_event(f'Genie error: {str(e)}')
+      yield DONE_EVENT
@@ -0,0 +1,91 @@
+"""Registry of deployment handlers, one per configured agent.
+
+Handlers are built on the first request for an agent and reused afterwards,
+so per-agent state (format settings, stream pipeline, limits) has one owner
+and request setup is a dict lookup. The registry is cleared whenever
+config_loader reloads app.json. In development mode, where app.json is re-read
+on every access, a handler is also rebuilt when its agent entry changes.
+"""
+
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from ....config_loader import config_loader
+from ...user import _is_local_development
+from .base import BaseDeploymentHandler
+from .databricks_endpoint import DatabricksEndpointHandler
+from .databricks_genie import DatabricksGenieHandler
+
+logger = logging.getLogger(__name__)
+
+
+def create_handler(agent_config: Dict[str, Any]) -> BaseDeploymentHandler:
+  """Build the handler for an agent's deployment type.
+
+  Raises:
+    ValueError: If the agent config is missing its endpoint or Genie space
+  """
+  if agent_config.get('genie_space_id'):
+    return DatabricksGenieHandler(agent_config)
+  return DatabricksEndpointHandler(agent_config)
+
+
+def _agent_key(agent_config: Dict[str, Any]) -> str:
+  """Canonical key of an agent, whichever of its ids a request used."""
+  return agent_config.get('genie_space_id') or agent_config.get('endpoint_name') or ''
+
+
+class HandlerRegistry:
+  """Handlers keyed by agent, with every id a request may use pointing at the same handler."""
+
+  def __init__(self):
+    # agent key -> (agent config the handler was built from, handler)
+    self._handlers: Dict[str, Tuple[Dict[str, Any], BaseDeploymentHandler]] = {}
+    # requested agent id -> agent key
+    self._aliases: Dict[str, str] = {}
+    self._config_version: Optional[int] = None
+
+  def get(self, agent_id: str) -> Optional[BaseDeploymentHandler]:
+    """Get the handler for an agent, building it on first use.
+
+    Returns:
+      The agent's handler, or None if the agent is not configured
+
+    Raises:
+      ValueError: If the agent config is invalid (no endpoint or Genie space)
+    """
+    if self._config_version != config_loader.version:
+      # app.json was reloaded: drop handlers built from the old config
+      self.clear()
+      self._config_version = config_loader.version
+
+    if not _is_local_development():
+      cached = self._handlers.get(self._aliases.get(agent_id, ''))
+      if cached is not None:
+        return cached[1]
+
+    agent = config_loader.get_agent_by_id(agent_id)
+    if agent is None:
+      self._aliases.pop(agent_id, None)
+      return None
+
+    key = _agent_key(agent)
+    self._aliases[agent_id] = key
+    cached = self._handlers.get(key)
+    # Dev mode re-reads app.json on every access: rebuild if the agent entry was edited
+    if cached is not None and (cached[0] == agent or not _is_local_development()):
+      return cached[1]
+
+    handler = create_handler(agent)
+    self._handlers[key] = (agent, handler)
+    logger.info(f'Created {type(handler).__name__} for agent {agent_id}')
+    return handler
+
+  def clear(self):
+    """Drop all handlers (they are rebuilt on next use)."""
+    self._handlers.clear()
+    self._aliases.clear()
+
+
+# Global handler registry
+handler_registry = HandlerRegistry()
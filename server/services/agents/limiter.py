@@ -0,0 +1,200 @@
+"""Per-agent concurrency limits with a fair waiting queue.
+
+Caps how many requests an agent serves at once (overall and per user), so a
+burst from one user cannot starve the others or push the serving endpoint /
+Genie API into 429s. Requests over the limit wait in per-user FIFO queues that
+are served round-robin across users, and are told their queue position.
+
+Enabled per agent in config/app.json:
+    "concurrency": {"max_concurrent": 8, "max_per_user": 2, "max_queue": 100}
+Omitted keys are unlimited (max_queue defaults to DEFAULT_MAX_QUEUE).
+
+Usage:
+    ticket = limiter.enqueue(user_email)
+    try:
+        while not await ticket.wait(timeout=1.0):
+            send(ticket.position)
+        ...  # call the agent
+    finally:
+        limiter.release(ticket)
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_QUEUE = 100
+
+
+class QueueFullError(Exception):
+  """Raised when an agent's waiting queue is full."""
+
+
+class Ticket:
+  """A request's place in an agent's limiter: waiting, then granted."""
+
+  def __init__(self, limiter: 'ConcurrencyLimiter', user: str):
+    self._limiter = limiter
+    self.user = user
+    self._granted = asyncio.get_running_loop().create_future()
+
+  @property
+  def granted(self) -> bool:
+    """Whether the request may run."""
+    return self._granted.done()
+
+  @property
+  def position(self) -> int:
+    """1-based position in the waiting queue (0 once granted)."""
+    return self._limiter.position(self)
+
+  async def wait(self, timeout: Optional[float] = None) -> bool:
+    """Wait until granted or the timeout elapses; returns whether granted."""
+    if not self.granted:
+      await asyncio.wait({self._granted}, timeout=timeout)
+    return self.granted
+
+  def _grant(self):
+    self._granted.set_result(True)
+
+
+class ConcurrencyLimiter:
+  """Concurrency caps for one agent, with round-robin service across users."""
+
+  def __init__(
+    self,
+    max_concurrent: Optional[int] = None,
+    max_per_user: Optional[int] = None,
+    max_queue: int = DEFAULT_MAX_QUEUE,
+  ):
+    self.max_concurrent = max_concurrent
+    self.max_per_user = max_per_user
+    self.max_queue = max_queue
+    self.active = 0
+    self._active_by_user: Dict[str, int] = {}
+    # user -> that user's waiting tickets, oldest first
+    self._waiting: Dict[str, Deque[Ticket]] = {}
+    # Users with waiting tickets, in the order they will be served
+    self._turns: Deque[str] = deque()
+
+  @property
+  def waiting(self) -> int:
+    """Number of queued requests."""
+    return sum(len(q) for q in self._waiting.values())
+
+  def _has_capacity(self, user: str) -> bool:
+    """Check if a request from this user may start now."""
+    if self.max_concurrent is not None and self.active >= self.max_concurrent:
+      return False
+    if self.max_per_user is not None and self._active_by_user.get(user, 0) >= self.max_per_user:
+      return False
+    return True
+
+  def _start(self, ticket: Ticket):
+    self.active += 1
+    self._active_by_user[ticket.user] = self._active_by_user.get(ticket.user, 0) + 1
+    ticket._grant()
+
+  def enqueue(self, user: str) -> Ticket:
+    """Take a slot for a request, or a place in the queue.
+
+    Raises:
+      QueueFullError: If the queue already holds max_queue requests
+    """
+    ticket = Ticket(self, user)
+    # Never jump ahead of a user who is already waiting
+    if user not in self._waiting and self._has_capacity(user):
+      self._start(ticket)
+      return ticket
+
+    if self.waiting >= self.max_queue:
+      raise QueueFullError('Agent is at capacity, please try again in a moment')
+
+    if user not in self._waiting:
+      self._waiting[user] = deque()
+      self._turns.append(user)
+    self._waiting[user].append(ticket)
+    logger.info(f'Request from {user} queued (active: {self.active}, waiting: {self.waiting})')
+    return ticket
+
+  def release(self, ticket: Ticket):
+    """Free a granted slot or leave the queue, then admit waiting requests."""
+    if ticket.granted:
+      self.active -= 1
+      remaining = self._active_by_user.get(ticket.user, 0) - 1
+      if remaining > 0:
+        self._active_by_user[ticket.user] = remaining
+      else:
+        self._active_by_user.pop(ticket.user, None)
+    else:
+      queue = self._waiting.get(ticket.user)
+      if queue is not None and ticket in queue:
+        queue.remove(ticket)
+        if not queue:
+          del self._waiting[ticket.user]
+          self._turns.remove(ticket.user)
+    self._dispatch()
+
+  def _dispatch(self):
+    """Admit waiting requests round-robin across users while capacity allows."""
+    skipped = 0
+    while self._turns and skipped < len(self._turns):
+      if self.max_concurrent is not None and self.active >= self.max_concurrent:
+        return
+      user = self._turns.popleft()
+      if not self._has_capacity(user):
+        # User at their own limit: let the next user go first
+        self._turns.append(user)
+        skipped += 1
+        continue
+      queue = self._waiting[user]
+      self._start(queue.popleft())
+      if queue:
+        self._turns.append(user)
+      else:
+        del self._waiting[user]
+      skipped = 0
+
+  def position(self, ticket: Ticket) -> int:
+    """Estimate how many requests will be admitted before and including this one."""
+    if ticket.granted:
+      return 0
+    queue = self._waiting.get(ticket.user)
+    if queue is None or ticket not in queue:
+      return 0
+    index = queue.index(ticket)
+    turn = self._turns.index(ticket.user)
+    ahead = index
+    for i, user in enumerate(self._turns):
+      if user != ticket.user:
+        # Users earlier in the rotation get one more turn before ours comes round
+        ahead += min(len(self._waiting[user]), index + (1 if i < turn else 0))
+    return ahead + 1
+
+  def stats(self) -> Dict[str, Any]:
+    """Current load, for logging and status endpoints."""
+    return {
+      'active': self.active,
+      'waiting': self.waiting,
+      'max_concurrent': self.max_concurrent,
+      'max_per_user': self.max_per_user,
+    }
+
+
+def create_limiter(agent_config: Dict[str, Any]) -> Optional[ConcurrencyLimiter]:
+  """Build the limiter from an agent config, or None if no limits are set."""
+  settings = agent_config.get('concurrency')
+  if not isinstance(settings, dict):
+    return None
+  max_concurrent = settings.get('max_concurrent')
+  max_per_user = settings.get('max_per_user')
+  if max_concurrent is None and max_per_user is None:
+    return None
+  return ConcurrencyLimiter(
+    max_concurrent=int(max_concurrent) if max_concurrent is not None else None,
+    max_per_user=int(max_per_user) if max_per_user is not None else None,
+    max_queue=int(settings.get('max_queue', DEFAULT_MAX_QUEUE)),
+  )
@@ -0,0 +1,93 @@
+"""Repair of UTF-8 text that was decoded as Latin-1 ("mojibake").
+
+Some endpoints return UTF-8 bytes interpreted as Latin-1 characters.
+Example: "â€”" (3 Latin-1 chars) should be "—" (em dash in UTF-8).
+
+Streamed deltas can split one multi-byte character across two chunks, so
+MojibakeDecoder carries an incomplete trailing sequence over to the next delta.
+"""
+
+import re
+
+# Sequences of chars in the Latin-1 extended range (likely mojibake)
+_LATIN1_RUN = re.compile(r'[\u0080-\u00ff]+')
+
+
+def _fix_segment(match: re.Match) -> str:
+  """Re-decode one run of Latin-1 chars, keeping it as-is if it is not UTF-8."""
+  segment = match.group(0)
+  try:
+    return segment.encode('latin-1').decode('utf-8')
+  except UnicodeDecodeError:
+    return segment
+
+
+def fix_mojibake(text: str) -> str:
+  """Fix UTF-8 content that was incorrectly decoded as Latin-1.
+
+  Handles mixed content (mojibake + emojis) by fixing only the broken parts.
+  """
+  if not text or text.isascii():
+    return text
+
+  # Try the simple approach first (works if no high Unicode chars like emojis)
+  try:
+    return text.encode('latin-1').decode('utf-8')
+  except (UnicodeDecodeError, UnicodeEncodeError):
+    pass
+
+  # Fallback: fix mojibake runs while preserving high Unicode chars (emojis etc)
+  return _LATIN1_RUN.sub(_fix_segment, text)
+
+
+def _incomplete_tail(text: str) -> int:
+  """Count trailing chars that form the start of an unfinished UTF-8 sequence."""
+  for i in range(1, min(4, len(text)) + 1):
+    code = ord(text[-i])
+    if 0x80 <= code <= 0xBF:
+      # Continuation byte: keep looking for the lead byte
+      continue
+    if 0xC2 <= code <= 0xF4:
+      needed = 2 if code < 0xE0 else 3 if code < 0xF0 else 4
+      return i if i < needed else 0
+    return 0
+  return 0
+
+
+class MojibakeDecoder:
+  """Incremental fix_mojibake for a stream of text deltas.
+
+  Usage:
+      decoder = MojibakeDecoder()
+      for delta in deltas:
+          text = decoder.decode(delta)
+      text = decoder.flush()
+  """
+
+  def __init__(self):
+    self._pending = ''
+
+  def decode(self, text: str) -> str:
+    """Fix a delta, holding back a trailing sequence that continues in the next one."""
+    if self._pending:
+      text = self._pending + text
+      self._pending = ''
+    elif not text or text.isascii():
+      return text
+
+    # Whole delta is valid mojibake: nothing can be left unfinished
+    try:
+      return text.encode('latin-1').decode('utf-8')
+    except (UnicodeDecodeError, UnicodeEncodeError):
+      pass
+
+    held = _incomplete_tail(text) if text[-1] >= '\x80' else 0
+    if held:
+      self._pending = text[-held:]
+      text = text[:-held]
+    return fix_mojibake(text)
+
+  def flush(self) -> str:
+    """Return whatever is still held back at the end of the stream."""
+    pending, self._pending = self._pending, ''
+    return fix_mojibake(pending)
@@ -0,0 +1,273 @@
+"""Retries and circuit breaking around handler streams.
+
+Shared by every BaseDeploymentHandler:
+- Transient failures (429, 502/503/504, rate limits, refused connections) that happen
+  before the first token are retried a bounded number of times, with
+  exponential backoff and full jitter so retries from many chats spread out.
+- A circuit breaker per endpoint / Genie space counts requests that end in
+  such failures. After failure_threshold of them in a row it opens and
+  requests fail fast with a clear error. After reset_seconds a single trial
+  request is let through (half-open), and its outcome closes or re-opens it.
+
+Configured per agent in config/app.json (defaults shown):
+    "retry": {"max_attempts": 3, "base_delay_ms": 500, "max_delay_ms": 5000}
+    "circuit_breaker": {"failure_threshold": 5, "reset_seconds": 30}
+
+Breaker states are reported by GET /api/health/endpoints; error and retry
+counts per endpoint are exported at /api/metrics.
+"""
+
+import asyncio
+import logging
+import random
+import re
+import time
+from typing import Any, AsyncGenerator, Callable, Dict, NamedTuple, Optional
+
+from ...metrics import registry
+from .events import DONE_EVENT, StreamEvent, make_error_event
+
+logger = logging.getLogger(__name__)
+
+# kind: transient (retryable), server (500/timeout), other, exception, circuit_open
+UPSTREAM_ERRORS = registry.counter(
+  'upstream_errors_total', 'Errors from agent endpoints / Genie spaces', ['endpoint', 'kind']
+)
+UPSTREAM_RETRIES = registry.counter(
+  'upstream_retries_total', 'Retries after transient errors before the first token', ['endpoint']
+)
+
+# Failures worth retrying: the endpoint is overloaded or briefly unreachable
+_TRANSIENT_ERROR = re.compile(
+  r'\b(429|502|503|504)\b|too many requests|rate limit|resource_exhausted|temporarily unavailable'
+  r'|connection (reset|refused)',
+  re.IGNORECASE,
+)
+# Failures that also count against the endpoint's health but are not retried
+# (a timeout already cost the user minutes of waiting)
+_SERVER_ERROR = re.compile(r'\b500\b|internal server error|timed out|timeout', re.IGNORECASE)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class RetryPolicy(NamedTuple):
+  """Bounded retry settings for failures before the first token."""
+
+  max_attempts: int = 3
+  base_delay_ms: float = 500.0
+  max_delay_ms: float = 5000.0
+
+  def delay(self, attempt: int) -> float:
+    """Backoff before the given retry (1-based), in seconds, with full jitter."""
+    cap = min(self.max_delay_ms, self.base_delay_ms * 2 ** (attempt - 1))
+    return random.uniform(0, cap) / 1000
+
+
+def get_retry_policy(agent_config: Dict[str, Any]) -> RetryPolicy:
+  """Read the retry policy from an agent config."""
+  settings = agent_config.get('retry')
+  if settings is False:
+    return RetryPolicy(max_attempts=1)
+  if not isinstance(settings, dict):
+    return RetryPolicy()
+  defaults = RetryPolicy()
+  return RetryPolicy(
+    max_attempts=max(1, int(settings.get('max_attempts', defaults.max_attempts))),
+    base_delay_ms=float(settings.get('base_delay_ms', defaults.base_delay_ms)),
+    max_delay_ms=float(settings.get('max_delay_ms', defaults.max_delay_ms)),
+  )
+
+
+def is_transient_error(error: str) -> bool:
+  """Check if an error message describes a retryable failure."""
+  return bool(_TRANSIENT_ERROR.search(error))
+
+
+def is_endpoint_failure(error: str) -> bool:
+  """Check if an error message means the endpoint itself is unhealthy."""
+  return is_transient_error(error) or bool(_SERVER_ERROR.search(error))
+
+
+def _error_kind(error: str) -> str:
+  """Classify an error message for the upstream_errors_total metric."""
+  if is_transient_error(error):
+    return 'transient'
+  if _SERVER_ERROR.search(error):
+    return 'server'
+  return 'other'
+
+
+class CircuitBreaker:
+  """Consecutive-failure circuit breaker for one endpoint."""
+
+  def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+    self.name = name
+    self.failure_threshold = failure_threshold
+    self.reset_seconds = reset_seconds
+    self.state = CLOSED
+    self.consecutive_failures = 0
+    self.opened_at = 0.0
+    self._trial_in_flight = False
+
+  @property
+  def retry_in(self) -> float:
+    """Seconds until an open breaker lets a trial request through."""
+    if self.state != OPEN:
+      return 0.0
+    return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+  def allow(self) -> bool:
+    """Check if a request may go to the endpoint (may start a half-open trial)."""
+    if self.state == OPEN and self.retry_in == 0:
+      self.state = HALF_OPEN
+      logger.info(f'Circuit for {self.name} half-open, sending a trial request')
+    if self.state == HALF_OPEN:
+      if self._trial_in_flight:
+        return False
+      self._trial_in_flight = True
+      return True
+    return self.state == CLOSED
+
+  def record_success(self):
+    """The endpoint answered: close the breaker."""
+    if self.state != CLOSED:
+      logger.info(f'Circuit for {self.name} closed')
+    self.state = CLOSED
+    self.consecutive_failures = 0
+    self._trial_in_flight = False
+
+  def record_failure(self):
+    """The endpoint failed: open the breaker once the threshold is reached."""
+    self.consecutive_failures += 1
+    self._trial_in_flight = False
+    if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+      if self.state != OPEN:
+        logger.warning(
+          f'Circuit for {self.name} opened after {self.consecutive_failures} failures, '
+          f'failing fast for {self.reset_seconds:.0f}s'
+        )
+      self.state = OPEN
+      self.opened_at = time.monotonic()
+
+  def abandon(self):
+    """The request ended without an outcome (e.g. cancelled): free the trial slot."""
+    self._trial_in_flight = False
+
+  def status(self) -> Dict[str, Any]:
+    """Current state, for the status endpoint."""
+    return {
+      'state': self.state,
+      'consecutive_failures': self.consecutive_failures,
+      'failure_threshold': self.failure_threshold,
+      'retry_in_seconds': round(self.retry_in, 1),
+    }
+
+
+# Breakers shared by all handlers: endpoint name / Genie space id -> breaker
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str, agent_config: Dict[str, Any]) -> CircuitBreaker:
+  """Get the shared breaker for an endpoint, creating it from the agent config."""
+  breaker = _breakers.get(name)
+  if breaker is None:
+    settings = agent_config.get('circuit_breaker')
+    settings = settings if isinstance(settings, dict) else {}
+    breaker = CircuitBreaker(
+      name,
+      failure_threshold=int(settings.get('failure_threshold', 5)),
+      reset_seconds=float(settings.get('reset_seconds', 30)),
+    )
+    _breakers[name] = breaker
+  return breaker
+
+
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+  """State of every endpoint's circuit breaker."""
+  return {name: breaker.status() for name, breaker in _breakers.items()}
+
+
+def is_output_event(data: Optional[Dict[str, Any]]) -> bool:
+  """Check if an event carries agent output (as opposed to a placeholder or error)."""
+  if data is None or data.get('type') == 'error':
+    return False
+  if data.get('type') == 'response.output_text.delta':
+    return bool(data.get('delta'))
+  return True
+
+
+async def resilient_stream(
+  open_stream: Callable[[], AsyncGenerator[StreamEvent, None]],
+  breaker: CircuitBreaker,
+  policy: RetryPolicy,
+) -> AsyncGenerator[StreamEvent, None]:
+  """Run a handler stream with retries before the first token and a circuit breaker.
+
+  Args:
+    open_stream: Starts a new attempt of the handler stream
+    breaker: Breaker of the endpoint the stream calls
+    policy: Retry settings
+
+  Yields:
+    The handler's events. Errors of attempts that are retried are not forwarded.
+  """
+  if not breaker.allow():
+    UPSTREAM_ERRORS.inc(endpoint=breaker.name, kind='circuit_open')
+    yield make_error_event(
+      f'{breaker.name} is temporarily unavailable after repeated failures. '
+      f'Please try again in {max(1, round(breaker.retry_in))} seconds.'
+    )
+    yield DONE_EVENT
+    return
+
+  recorded = False
+  attempt = 0
+  try:
+    while True:
+      attempt += 1
+      started = False
+      retry_error: Optional[str] = None
+      final_error: Optional[str] = None
+
+      stream = open_stream()
+      try:
+        async for event in stream:
+          data = event.data
+          if data is not None and data.get('type') == 'error':
+            error = str(data.get('error', ''))
+            UPSTREAM_ERRORS.inc(endpoint=breaker.name, kind=_error_kind(error))
+            if not started and attempt < policy.max_attempts and is_transient_error(error):
+              retry_error = error
+              break
+            final_error = error
+          elif not started and is_output_event(data):
+            started = True
+          yield event
+      except Exception:
+        UPSTREAM_ERRORS.inc(endpoint=breaker.name, kind='exception')
+        breaker.record_failure()
+        recorded = True
+        raise
+      finally:
+        await stream.aclose()
+
+      if retry_error is None:
+        if final_error is not None and is_endpoint_failure(final_error):
+          breaker.record_failure()
+        else:
+          breaker.record_success()
+        recorded = True
+        return
+
+      UPSTREAM_RETRIES.inc(endpoint=breaker.name)
+      delay = policy.delay(attempt)
+      logger.warning(
+        f'{breaker.name}: transient error before first token '
+        f'(attempt {attempt}/{policy.max_attempts}), retrying in {delay:.2f}s: {retry_error}'
+      )
+      await asyncio.sleep(delay)
+  finally:
+    if not recorded:
+      breaker.abandon()
@@ -0,0 +1,113 @@
+"""Collects the final answer, tool calls and trace data from a handler stream.
+
+The router feeds every event payload into a StreamCollector while forwarding the
+stream to the client, then persists what was collected once the stream ends.
+"""
+
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_json_field(value: Any) -> Any:
+  """Parse a field that might be a JSON string or already an object."""
+  if isinstance(value, str):
+    trimmed = value.strip()
+    if trimmed.startswith('{') or trimmed.startswith('['):
+      try:
+        return json.loads(value)
+      except json.JSONDecodeError:
+        pass
+  return value
+
+
+class StreamCollector:
+  """Accumulates text, function calls, trace id and errors from stream events.
+
+  Text deltas are appended to a list and joined once, and function calls are
+  indexed by call_id, so long answers and many tool calls stay linear.
+  """
+
+  def __init__(self):
+    self._text_parts: List[str] = []
+    self.function_calls: List[Dict[str, Any]] = []
+    # call_id -> function call entry (first call with a given id wins)
+    self._calls_by_id: Dict[str, Dict[str, Any]] = {}
+    self.trace_id: Optional[str] = None
+    self.databricks_output: Optional[Dict[str, Any]] = None
+    self.error_message: Optional[str] = None
+
+  @property
+  def final_text(self) -> str:
+    """The answer text collected so far."""
+    if len(self._text_parts) > 1:
+      self._text_parts = [''.join(self._text_parts)]
+    return self._text_parts[0] if self._text_parts else ''
+
+  def _capture_trace(self, db_output: Dict[str, Any], source: str):
+    """Record databricks_output and its trace_id (first one wins)."""
+    if not db_output or self.trace_id:
+      return
+    self.databricks_output = db_output
+    trace_info = db_output.get('trace', {}).get('info', {})
+    if trace_info.get('trace_id'):
+      self.trace_id = trace_info['trace_id']
+      logger.info(f'📋 Extracted trace_id from {source}: {self.trace_id}')
+
+  def add(self, event: Dict[str, Any]):
+    """Process one event payload."""
+    event_type = event.get('type', '')
+
+    # Capture error events from handler (e.g., endpoint errors, streaming not supported)
+    if event_type == 'error':
+      self.error_message = event.get('error', 'Unknown error')
+      logger.error(f'❌ Error event received: {self.error_message}')
+
+    # Accumulate text from delta events (used by chat completion format endpoints)
+    elif event_type == 'response.output_text.delta':
+      delta_text = event.get('delta', '')
+      if delta_text:
+        self._text_parts.append(delta_text)
+
+    # Check for databricks_output at event level (for response.done events)
+    if 'databricks_output' in event:
+      logger.debug(f'📦 Event type: {event_type}, has databricks_output: True')
+      self._capture_trace(event['databricks_output'], 'event level')
+
+    # Process response.output_item.done events
+    if event_type == 'response.output_item.done':
+      item = event.get('item', {})
+      item_type = item.get('type', '')
+
+      # Extract final text from message item
+      if item_type == 'message':
+        content_list = item.get('content', [])
+        for content_item in content_list:
+          if content_item.get('type') == 'output_text':
+            self._text_parts = [content_item.get('text', '')]
+            break
+
+      # Collect function calls
+      elif item_type == 'function_call':
+        function_call = {
+          'call_id': item.get('call_id', ''),
+          'name': item.get('name', ''),
+          'arguments': _parse_json_field(item.get('arguments', {})),
+        }
+        self.function_calls.append(function_call)
+        self._calls_by_id.setdefault(function_call['call_id'], function_call)
+
+      elif item_type == 'function_call_output':
+        # Attach output to the matching function call
+        function_call = self._calls_by_id.get(item.get('call_id', ''))
+        if function_call is not None:
+          function_call['output'] = _parse_json_field(item.get('output', {}))
+
+      # Extract trace_id from databricks_output inside item (present in final message)
+      self._capture_trace(item.get('databricks_output', {}), 'item')
+
+    # Also handle response.done events which may contain final trace data
+    elif event_type == 'response.done':
+      self._capture_trace(event.get('response', {}).get('databricks_output', {}), 'response.done')
@@ -0,0 +1,89 @@
+"""Disconnect-aware forwarding of handler streams to the SSE response.
+
+The handler stream is pumped by its own task into a small bounded buffer:
+- A slow client fills the buffer and pauses the pump, which stops pulling from
+  the upstream endpoint (backpressure all the way to the serving endpoint).
+- A disconnected client cancels the pump, so the handler's upstream HTTP stream
+  or worker thread is released instead of running to completion.
+"""
+
+import asyncio
+import logging
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Optional
+
+from .events import StreamEvent
+
+logger = logging.getLogger(__name__)
+
+# Max events buffered between the handler and the SSE response
+STREAM_BUFFER_SIZE = 64
+# How often to check whether the client has closed the connection
+DISCONNECT_POLL_SECONDS = 0.5
+
+_END = object()
+
+
+class DisconnectAwareStream:
+  """Forward a handler stream until it ends or the client disconnects.
+
+  Usage:
+      stream = DisconnectAwareStream(handler.predict_stream(...), request.is_disconnected)
+      async for event in stream:
+          yield event.frame
+      if stream.disconnected:
+          ...
+  """
+
+  def __init__(
+    self,
+    stream: AsyncGenerator[StreamEvent, None],
+    is_disconnected: Callable[[], Awaitable[bool]],
+    maxsize: int = STREAM_BUFFER_SIZE,
+  ):
+    self._stream = stream
+    self._is_disconnected = is_disconnected
+    self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    self._pump: Optional[asyncio.Task] = None
+    self.disconnected = False
+
+  async def _run_pump(self):
+    """Pull chunks from the handler stream into the bounded buffer."""
+    try:
+      async for event in self._stream:
+        await self._queue.put(event)
+    finally:
+      await self._stream.aclose()
+      try:
+        self._queue.put_nowait(_END)
+      except asyncio.QueueFull:
+        # Consumer is not waiting on an empty queue; it notices the pump is done
+        pass
+
+  async def _watch_disconnect(self):
+    """Cancel the pump once the client has gone away."""
+    while not await self._is_disconnected():
+      await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    self.disconnected = True
+    logger.info('Client disconnected, cancelling upstream stream')
+    self._pump.cancel()
+
+  async def __aiter__(self) -> AsyncIterator[StreamEvent]:
+    """Yield events from the handler stream as the consumer is ready for them."""
+    self._pump = asyncio.create_task(self._run_pump())
+    watcher = asyncio.create_task(self._watch_disconnect())
+    try:
+      while True:
+        if self._queue.empty() and self._pump.done():
+          break
+        event = await self._queue.get()
+        if event is _END:
+          break
+        yield event
+
+      # Surface handler errors to the caller like a direct iteration would
+      await asyncio.wait({self._pump})
+      if not self._pump.cancelled() and self._pump.exception():
+        raise self._pump.exception()
+    finally:
+      watcher.cancel()
+      self._pump.cancel()
@@ -2,6 +2,8 @@
 
 This module provides a factory function to create chat storage instances.
 If LAKEBASE_PG_URL is set, uses PostgreSQL; otherwise falls back to in-memory storage.
+PostgreSQL reads can be cached in process (see cache.py): set CHAT_CACHE_MAX_BYTES
+(and optionally CHAT_CACHE_TTL_SECONDS) or pass cache_max_bytes to init_storage().
 
 Usage:
     from server.services.chat import get_storage, init_storage
@@ -17,11 +19,13 @@ Usage:
 """
 
 import logging
+import os
 from typing import Optional
 
 from server.db import create_tables, init_database, is_postgres_configured
 
 from .base import BaseChatStorage, BaseUserScopedChatStorage
+from .cache import DEFAULT_TTL_SECONDS, CachedUserScopedChatStorage, ChatCache
 from .memory import MemoryChatStorage, MemoryUserScopedChatStorage
 
 logger = logging.getLogger(__name__)
@@ -31,20 +35,35 @@ _storage: Optional[BaseUserScopedChatStorage] = None
 _initialized: bool = False
 
 
-async def init_storage(max_chats_per_user: int = 10) -> BaseUserScopedChatStorage:
+async def init_storage(
+  max_chats_per_user: int = 10,
+  cache_max_bytes: Optional[int] = None,
+  cache_ttl_seconds: Optional[float] = None,
+) -> BaseUserScopedChatStorage:
   """Initialize the global chat storage instance asynchronously.
 
   Automatically selects the appropriate backend:
-  - PostgreSQL if LAKEBASE_PG_URL is set
+  - PostgreSQL if LAKEBASE_PG_URL is set, behind a read-through cache when
+    cache_max_bytes > 0 (default: CHAT_CACHE_MAX_BYTES, 0 = no cache)
   - In-memory storage otherwise
 
   This should be called once at app startup (e.g., in FastAPI lifespan).
+
+  Args:
+      max_chats_per_user: Chats kept per user (oldest deleted beyond it)
+      cache_max_bytes: Memory budget of the chat read cache
+      cache_ttl_seconds: How long cached reads are served (default: CHAT_CACHE_TTL_SECONDS)
   """
   global _storage, _initialized
 
   if _initialized and _storage is not None:
     return _storage
 
+  if cache_max_bytes is None:
+    cache_max_bytes = int(os.environ.get('CHAT_CACHE_MAX_BYTES', '0'))
+  if cache_ttl_seconds is None:
+    cache_ttl_seconds = float(os.environ.get('CHAT_CACHE_TTL_SECONDS', DEFAULT_TTL_SECONDS))
+
   if is_postgres_configured():
     logger.info('Initializing PostgreSQL chat storage')
     try:
@@ -55,6 +74,14 @@ async def init_storage(max_chats_per_user: int = 10) -> BaseUserScopedChatStorag
 
       _storage = PostgresUserScopedChatStorage(max_chats_per_user=max_chats_per_user)
       logger.info('PostgreSQL chat storage initialized successfully')
+
+      if cache_max_bytes > 0:
+        cache = ChatCache(cache_max_bytes, cache_ttl_seconds)
+        _storage = CachedUserScopedChatStorage(_storage, cache)
+        logger.info(
+          f'Chat read cache enabled ({cache_max_bytes / (1024 * 1024):.1f} MB, '
+          f'{cache_ttl_seconds:g}s TTL)'
+        )
     except Exception as e:
       logger.error(f'Failed to initialize PostgreSQL storage: {e}')
       logger.warning('Falling back to in-memory storage')
@@ -95,6 +122,8 @@ __all__ = [
   'reset_storage',
   'BaseChatStorage',
   'BaseUserScopedChatStorage',
+  'CachedUserScopedChatStorage',
+  'ChatCache',
   'MemoryChatStorage',
   'MemoryUserScopedChatStorage',
 ]
@@ -4,14 +4,76 @@ This module defines the async interface that all chat storage backends must impl
 Uses SQLAlchemy models directly for both memory and PostgreSQL storage.
 """
 
+import base64
+import functools
+import time
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, List, Optional
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 if TYPE_CHECKING:
   from server.db.models import ChatModel
 
 # Import models - they work both attached (PostgreSQL) and detached (memory)
 from server.db.models import ChatModel, MessageModel
+from server.metrics import registry
+
+STORAGE_OPERATION_SECONDS = registry.histogram(
+  'storage_operation_seconds', 'Chat storage operation latency', ['backend', 'operation']
+)
+
+T = TypeVar('T')
+
+# Keyset pagination position: (updated_at, id) of a chat or (timestamp, id) of a
+# message. Pages continue strictly after it in the listing's (descending) order.
+Cursor = Tuple[datetime, str]
+
+
+def encode_cursor(position: Cursor) -> str:
+  """Encode a cursor as an opaque URL-safe string."""
+  raw = f'{position[0].isoformat()}|{position[1]}'
+  return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(value: str) -> Cursor:
+  """Decode a cursor from encode_cursor.
+
+  Timestamps with a UTC offset (e.g. read back from PostgreSQL) are converted
+  to naive local time, like the datetime.now() values the backends store, so
+  they compare with both naive and aware columns.
+
+  Raises:
+      ValueError: If the value is not a valid cursor
+  """
+  try:
+    raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode()
+    timestamp, item_id = raw.split('|', 1)
+    position = datetime.fromisoformat(timestamp)
+  except Exception as e:
+    raise ValueError(f'Invalid cursor: {value}') from e
+  if position.tzinfo is not None:
+    position = position.astimezone().replace(tzinfo=None)
+  return position, item_id
+
+
+def timed_operation(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+  """Record a storage method's latency in storage_operation_seconds.
+
+  The backend label comes from the storage class's `backend` attribute.
+  """
+  operation = func.__name__
+
+  @functools.wraps(func)
+  async def wrapper(self: Any, *args: Any, **kwargs: Any) -> T:
+    start = time.perf_counter()
+    try:
+      return await func(self, *args, **kwargs)
+    finally:
+      STORAGE_OPERATION_SECONDS.observe(
+        time.perf_counter() - start, backend=self.backend, operation=operation
+      )
+
+  return wrapper
 
 
 class BaseChatStorage(ABC):
@@ -19,8 +81,12 @@ class BaseChatStorage(ABC):
 
   All storage implementations (memory, PostgreSQL, etc.) must implement this interface.
   All methods are async to support non-blocking database operations.
+  Implementations wrap their methods with @timed_operation.
   """
 
+  # Label of the backend in storage metrics
+  backend = ''
+
   @abstractmethod
   async def get_all(self) -> List[ChatModel]:
     """Get all chats sorted by updated_at (newest first).
@@ -31,11 +97,27 @@ class BaseChatStorage(ABC):
     pass
 
   @abstractmethod
-  async def get(self, chat_id: str) -> Optional[ChatModel]:
+  async def list_chats(self, limit: int, before: Optional[Cursor] = None) -> List[ChatModel]:
+    """Get a page of chats ordered by (updated_at, id), newest first.
+
+    Does not load messages.
+
+    Args:
+        limit: Maximum number of chats to return
+        before: Cursor of the last chat of the previous page (None for the first page)
+
+    Returns:
+        List of ChatModel objects
+    """
+    pass
+
+  @abstractmethod
+  async def get(self, chat_id: str, include_messages: bool = True) -> Optional[ChatModel]:
     """Get specific chat by ID.
 
     Args:
         chat_id: Chat ID to retrieve
+        include_messages: Load all messages (False when they are paged with get_messages)
 
     Returns:
         ChatModel if found, None otherwise
@@ -55,6 +137,35 @@ class BaseChatStorage(ABC):
     """
     pass
 
+  @abstractmethod
+  async def get_messages(
+    self, chat_id: str, limit: int, before: Optional[Cursor] = None
+  ) -> Optional[List[MessageModel]]:
+    """Get the latest messages of a chat, going back in (timestamp, id) order.
+
+    Args:
+        chat_id: Chat ID to read
+        limit: Maximum number of messages to return
+        before: Cursor of the oldest message already loaded (None for the latest)
+
+    Returns:
+        Up to limit messages before the cursor, oldest first; None if chat not found
+    """
+    pass
+
+  @abstractmethod
+  async def get_trace(self, chat_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    """Get the full trace_summary of a message (listings only carry a preview).
+
+    Args:
+        chat_id: Chat ID the message belongs to
+        message_id: Message ID
+
+    Returns:
+        The trace summary, or None if the message is not found or has no trace
+    """
+    pass
+
   @abstractmethod
   async def add_message(self, chat_id: str, msg: MessageModel) -> bool:
     """Add message to existing chat.
@@ -68,6 +179,22 @@ class BaseChatStorage(ABC):
     """
     pass
 
+  @abstractmethod
+  async def add_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    """Add several messages to an existing chat at once (e.g. a whole chat turn).
+
+    Same result as calling add_message for each message in order, but backends
+    write them together (one transaction in PostgreSQL).
+
+    Args:
+        chat_id: Chat ID to add messages to
+        msgs: MessageModel objects to add, in order
+
+    Returns:
+        True if successful, False if chat not found
+    """
+    pass
+
   @abstractmethod
   async def update_title(self, chat_id: str, title: str) -> bool:
     """Update chat title.
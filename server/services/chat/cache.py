@@ -0,0 +1,268 @@
+"""Read-through cache in front of a chat storage backend.
+
+Reloading a chat (or the chat list) reads the same rows from PostgreSQL again
+and again. CachedUserScopedChatStorage wraps any BaseUserScopedChatStorage and
+keeps the results of reads in a per-process LRU with a memory budget:
+
+- Reads (get_all, list_chats, get, get_messages, get_trace) are served from the
+  cache when present, otherwise read from the backend and cached.
+- Writes go to the backend and then drop every cached read of that user. A read
+  that started before the write is not cached when it returns.
+- Entries expire after a short TTL: writes handled by other workers cannot
+  invalidate this process's cache, so the TTL bounds how stale it can get.
+
+Sizes are estimated from the JSON form of the cached models; the budget is an
+approximation, not a hard limit on the process's memory.
+
+Enabled by init_storage() when CHAT_CACHE_MAX_BYTES > 0 (PostgreSQL only).
+Lookups are counted in cache_lookups_total{cache="chats"}.
+
+Usage:
+    cache = ChatCache(max_bytes=64 * 1024 * 1024, ttl_seconds=5)
+    storage = CachedUserScopedChatStorage(PostgresUserScopedChatStorage(), cache)
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import inspect
+
+from server.db.models import ChatModel, MessageModel
+from server.metrics import CACHE_LOOKUPS, registry
+from server.serialization import dumps
+
+from .base import BaseChatStorage, BaseUserScopedChatStorage, Cursor
+
+DEFAULT_TTL_SECONDS = 5.0
+# Added to the JSON size of each cached object for Python object overhead
+OBJECT_OVERHEAD_BYTES = 512
+
+CacheKey = Tuple[str, str, Tuple[Hashable, ...]]
+
+# Cache of the current storage (the one created last), reported by chat_cache_bytes
+_cache: Optional['ChatCache'] = None
+
+
+def _cache_bytes() -> Dict[Tuple[str, ...], float]:
+  """Size of the current cache, read when /api/metrics is scraped."""
+  if _cache is None:
+    return {}
+  return {(): _cache.bytes}
+
+
+registry.gauge('chat_cache_bytes', 'Estimated size of cached chat storage reads', [], _cache_bytes)
+
+
+class _Entry(NamedTuple):
+  value: Any
+  size: int
+  expires_at: float
+
+
+def estimate_size(value: Any) -> int:
+  """Approximate memory taken by a cached read result, in bytes."""
+  if isinstance(value, list):
+    return OBJECT_OVERHEAD_BYTES + sum(estimate_size(item) for item in value)
+  if isinstance(value, ChatModel):
+    # Chats read with include_messages=False must not touch their messages
+    loaded = 'messages' not in inspect(value).unloaded
+    data = value.to_dict() if loaded else value.to_dict_summary()
+    return OBJECT_OVERHEAD_BYTES + len(dumps(data))
+  if isinstance(value, MessageModel):
+    return OBJECT_OVERHEAD_BYTES + len(dumps(value.to_dict()))
+  return OBJECT_OVERHEAD_BYTES + len(dumps(value))
+
+
+class ChatCache:
+  """LRU of chat storage reads, keyed by user, bounded by max_bytes."""
+
+  def __init__(self, max_bytes: int, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+    global _cache
+    self.max_bytes = max_bytes
+    self.ttl_seconds = ttl_seconds
+    self.bytes = 0
+    self.hits = 0
+    self.misses = 0
+    self._entries: 'OrderedDict[CacheKey, _Entry]' = OrderedDict()
+    self._user_keys: Dict[str, Set[CacheKey]] = {}
+    # Bumped on each write of a user; reads started under an older value are not cached
+    self._generations: Dict[str, int] = {}
+    _cache = self
+
+  def generation(self, user_email: str) -> int:
+    """Current write generation of a user (pass it back to put())."""
+    return self._generations.get(user_email, 0)
+
+  def get(self, key: CacheKey) -> Tuple[bool, Any]:
+    """Look up a key. Returns (found, value)."""
+    entry = self._entries.get(key)
+    if entry is not None and entry.expires_at <= time.monotonic():
+      self._remove(key)
+      entry = None
+    if entry is None:
+      self.misses += 1
+      CACHE_LOOKUPS.inc(cache='chats', result='miss')
+      return False, None
+    self._entries.move_to_end(key)
+    self.hits += 1
+    CACHE_LOOKUPS.inc(cache='chats', result='hit')
+    return True, entry.value
+
+  def put(self, key: CacheKey, value: Any, generation: int):
+    """Cache a read result unless the user wrote since the read started."""
+    user_email = key[0]
+    if generation != self.generation(user_email):
+      return
+    size = estimate_size(value)
+    if size > self.max_bytes:
+      return
+    if key in self._entries:
+      self._remove(key)
+    self._entries[key] = _Entry(value, size, time.monotonic() + self.ttl_seconds)
+    self._user_keys.setdefault(user_email, set()).add(key)
+    self.bytes += size
+    while self.bytes > self.max_bytes:
+      self._remove(next(iter(self._entries)))
+
+  def invalidate_user(self, user_email: str):
+    """Drop every cached read of a user."""
+    self._generations[user_email] = self.generation(user_email) + 1
+    for key in self._user_keys.pop(user_email, set()):
+      entry = self._entries.pop(key, None)
+      if entry is not None:
+        self.bytes -= entry.size
+
+  def _remove(self, key: CacheKey):
+    entry = self._entries.pop(key)
+    self.bytes -= entry.size
+    keys = self._user_keys.get(key[0])
+    if keys is not None:
+      keys.discard(key)
+      if not keys:
+        del self._user_keys[key[0]]
+
+  def stats(self) -> Dict[str, Any]:
+    """Hit/miss counts and size, for logs and debugging."""
+    return {
+      'hits': self.hits,
+      'misses': self.misses,
+      'entries': len(self._entries),
+      'bytes': self.bytes,
+      'max_bytes': self.max_bytes,
+    }
+
+
+class CachedChatStorage(BaseChatStorage):
+  """Caching decorator around the BaseChatStorage of one user."""
+
+  def __init__(self, storage: BaseChatStorage, cache: ChatCache, user_email: str):
+    """Wrap a user's storage; reads and invalidations go through the shared cache."""
+    self._storage = storage
+    self._cache = cache
+    self.user_email = user_email
+    self.backend = storage.backend
+
+  async def _read(
+    self, operation: str, args: Tuple[Hashable, ...], read: Callable[[], Awaitable[Any]]
+  ) -> Any:
+    key = (self.user_email, operation, args)
+    found, value = self._cache.get(key)
+    if not found:
+      generation = self._cache.generation(self.user_email)
+      value = await read()
+      self._cache.put(key, value, generation)
+    # Callers get their own list, so they cannot reorder or trim the cached one
+    return list(value) if isinstance(value, list) else value
+
+  async def _write(self, write: Awaitable[Any]) -> Any:
+    try:
+      return await write
+    finally:
+      self._cache.invalidate_user(self.user_email)
+
+  async def get_all(self) -> List[ChatModel]:
+    """Get all chats sorted by updated_at (newest first)."""
+    return await self._read('get_all', (), self._storage.get_all)
+
+  async def list_chats(self, limit: int, before: Optional[Cursor] = None) -> List[ChatModel]:
+    """Get a page of chats, newest first."""
+    return await self._read(
+      'list_chats', (limit, before), lambda: self._storage.list_chats(limit, before)
+    )
+
+  async def get(self, chat_id: str, include_messages: bool = True) -> Optional[ChatModel]:
+    """Get specific chat by ID."""
+    return await self._read(
+      'get', (chat_id, include_messages), lambda: self._storage.get(chat_id, include_messages)
+    )
+
+  async def get_messages(
+    self, chat_id: str, limit: int, before: Optional[Cursor] = None
+  ) -> Optional[List[MessageModel]]:
+    """Get the latest messages of a chat, oldest first."""
+    return await self._read(
+      'get_messages',
+      (chat_id, limit, before),
+      lambda: self._storage.get_messages(chat_id, limit, before),
+    )
+
+  async def get_trace(self, chat_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    """Get the full trace_summary of a message."""
+    return await self._read(
+      'get_trace', (chat_id, message_id), lambda: self._storage.get_trace(chat_id, message_id)
+    )
+
+  async def create(self, title: str = 'New Chat', agent_id: Optional[str] = None) -> ChatModel:
+    """Create new chat."""
+    return await self._write(self._storage.create(title, agent_id))
+
+  async def add_message(self, chat_id: str, msg: MessageModel) -> bool:
+    """Add message to existing chat."""
+    return await self._write(self._storage.add_message(chat_id, msg))
+
+  async def add_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    """Add several messages to existing chat, in order."""
+    return await self._write(self._storage.add_messages(chat_id, msgs))
+
+  async def update_title(self, chat_id: str, title: str) -> bool:
+    """Update chat title."""
+    return await self._write(self._storage.update_title(chat_id, title))
+
+  async def delete(self, chat_id: str) -> bool:
+    """Delete chat by ID."""
+    return await self._write(self._storage.delete(chat_id))
+
+  async def clear_all(self) -> int:
+    """Delete all chats."""
+    return await self._write(self._storage.clear_all())
+
+
+class CachedUserScopedChatStorage(BaseUserScopedChatStorage):
+  """User-scoped storage whose per-user storages share one ChatCache."""
+
+  def __init__(self, storage: BaseUserScopedChatStorage, cache: ChatCache):
+    """Wrap a user-scoped storage backend."""
+    self._storage = storage
+    self.cache = cache
+    self._user_storages: Dict[str, CachedChatStorage] = {}
+
+  def get_storage_for_user(self, user_email: str) -> BaseChatStorage:
+    """Get or create the cached storage of a specific user."""
+    if user_email not in self._user_storages:
+      self._user_storages[user_email] = CachedChatStorage(
+        self._storage.get_storage_for_user(user_email), self.cache, user_email
+      )
+    return self._user_storages[user_email]
+
+  async def get_all_users(self) -> List[str]:
+    """Get list of all users with chat storage."""
+    return await self._storage.get_all_users()
+
+  async def clear_user_storage(self, user_email: str) -> bool:
+    """Clear all storage for a specific user."""
+    try:
+      return await self._storage.clear_user_storage(user_email)
+    finally:
+      self.cache.invalidate_user(user_email)
+      self._user_storages.pop(user_email, None)
@@ -3,17 +3,106 @@
 This module provides simple in-memory storage for chat sessions.
 Uses SQLAlchemy models in detached mode (not connected to any database).
 - Max 10 chats per user (oldest deleted when limit reached)
+- Max MEMORY_STORAGE_MAX_MESSAGES_PER_CHAT messages per chat (oldest dropped;
+  message_count still counts every message added)
+- Max MEMORY_STORAGE_MAX_BYTES for all users together: beyond it, the least
+  recently used chats (of any user) are evicted
 - Chat persistence only during app runtime
 - User isolation via email-scoped storage
 """
 
+import bisect
+import itertools
+import os
 import uuid
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from server.db.models import ChatModel, MessageModel
+from server.metrics import registry
+from server.serialization import dumps
 
-from .base import BaseChatStorage, BaseUserScopedChatStorage
+from .base import BaseChatStorage, BaseUserScopedChatStorage, Cursor, timed_operation
+
+DEFAULT_MAX_BYTES = int(os.environ.get('MEMORY_STORAGE_MAX_BYTES', str(256 * 1024 * 1024)))
+DEFAULT_MAX_MESSAGES_PER_CHAT = int(os.environ.get('MEMORY_STORAGE_MAX_MESSAGES_PER_CHAT', '500'))
+# Estimated Python object overhead of a chat and of a message, on top of their text
+CHAT_OVERHEAD_BYTES = 1024
+MESSAGE_OVERHEAD_BYTES = 512
+
+MEMORY_STORAGE_EVICTIONS = registry.counter(
+  'memory_storage_evictions_total', 'Chats evicted from in-memory storage by the byte budget'
+)
+
+# Budget of the current storage (the one created last), reported by memory_storage_bytes
+_budget: Optional['MemoryBudget'] = None
+
+
+def _budget_bytes() -> Dict[Tuple[str, ...], float]:
+  """Size of the current budget's chats, read when /api/metrics is scraped."""
+  if _budget is None:
+    return {}
+  return {(): _budget.bytes}
+
+
+registry.gauge(
+  'memory_storage_bytes', 'Estimated size of the chats in in-memory storage', [], _budget_bytes
+)
+
+
+def _message_size(msg: MessageModel) -> int:
+  """Estimated memory taken by a message, in bytes."""
+  size = MESSAGE_OVERHEAD_BYTES + len(msg.content or '')
+  if msg.trace_summary is not None:
+    size += len(dumps(msg.trace_summary))
+  return size
+
+
+def _message_position(msg: MessageModel) -> Cursor:
+  return (msg.timestamp, msg.id)
+
+
+class MemoryBudget:
+  """Byte budget shared by the in-memory storages of all users.
+
+  Tracks the estimated size of every chat in least recently used order (reads
+  and writes both count as use). When the total goes over max_bytes, the least
+  recently used chats are evicted from their user's storage, except the chat
+  used last.
+  """
+
+  def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+    global _budget
+    self.max_bytes = max_bytes
+    self.bytes = 0
+    self._chats: 'OrderedDict[Tuple[int, str], Tuple[MemoryChatStorage, int]]' = OrderedDict()
+    _budget = self
+
+  def update(self, storage: 'MemoryChatStorage', chat_id: str, size: Optional[int] = None):
+    """Mark a chat as most recently used, setting its size if given, then evict if over budget."""
+    key = (id(storage), chat_id)
+    entry = self._chats.get(key)
+    if entry is None and size is None:
+      return
+    if entry is not None:
+      self._chats.move_to_end(key)
+      if size is None:
+        return
+      self.bytes -= entry[1]
+    self._chats[key] = (storage, size)
+    self.bytes += size
+    while self.bytes > self.max_bytes and len(self._chats) > 1:
+      (_, evicted_id), (owner, evicted_size) = self._chats.popitem(last=False)
+      self.bytes -= evicted_size
+      owner._evict(evicted_id)
+      MEMORY_STORAGE_EVICTIONS.inc()
+
+  def discard(self, storage: 'MemoryChatStorage', chat_id: str):
+    """Stop tracking a deleted chat."""
+    entry = self._chats.pop((id(storage), chat_id), None)
+    if entry is not None:
+      self.bytes -= entry[1]
 
 
 class MemoryChatStorage(BaseChatStorage):
@@ -22,33 +111,114 @@ class MemoryChatStorage(BaseChatStorage):
   Features:
   - Stores up to max_chats (default 10)
   - Automatically deletes oldest chat when limit reached
-  - Simple dictionary-based storage
+  - Keeps the latest max_messages_per_chat messages of each chat
+  - Chats kept in an OrderedDict in updated_at order, so the oldest chat and
+    listings need no sorting
   - Uses SQLAlchemy models in detached mode
   """
 
-  def __init__(self, user_email: str, max_chats: int = 10):
-    """Initialize storage with user email and max chat limit."""
+  backend = 'memory'
+
+  def __init__(
+    self,
+    user_email: str,
+    max_chats: int = 10,
+    max_messages_per_chat: int = DEFAULT_MAX_MESSAGES_PER_CHAT,
+    budget: Optional[MemoryBudget] = None,
+    on_empty: Optional[Callable[['MemoryChatStorage'], None]] = None,
+    on_create: Optional[Callable[['MemoryChatStorage'], None]] = None,
+  ):
+    """Initialize storage with user email and limits.
+
+    Args:
+        user_email: Owner of the chats
+        max_chats: Chats kept (the least recently updated is deleted beyond it)
+        max_messages_per_chat: Messages kept per chat (the oldest are dropped beyond it)
+        budget: Byte budget shared with other users (None: no byte limit)
+        on_empty: Called when the budget evicted the last chat of this storage
+        on_create: Called when a chat is created
+    """
     self.user_email = user_email
-    self.chats: Dict[str, ChatModel] = {}
+    # Least recently updated first
+    self.chats: 'OrderedDict[str, ChatModel]' = OrderedDict()
     self.max_chats = max_chats
+    self.max_messages_per_chat = max_messages_per_chat
+    self._sizes: Dict[str, int] = {}
+    self._budget = budget
+    self._on_empty = on_empty
+    self._on_create = on_create
+
+  def _use(self, chat_id: str):
+    """Mark a chat as used for the budget's LRU."""
+    if self._budget is not None:
+      self._budget.update(self, chat_id)
+
+  def _resize(self, chat_id: str, size: int):
+    self._sizes[chat_id] = size
+    if self._budget is not None:
+      self._budget.update(self, chat_id, size)
 
+  def _remove(self, chat_id: str):
+    del self.chats[chat_id]
+    self._sizes.pop(chat_id, None)
+    if self._budget is not None:
+      self._budget.discard(self, chat_id)
+
+  def _evict(self, chat_id: str):
+    """Drop a chat the budget evicted (it is no longer tracked by the budget)."""
+    self.chats.pop(chat_id, None)
+    self._sizes.pop(chat_id, None)
+    if not self.chats and self._on_empty is not None:
+      self._on_empty(self)
+
+  @timed_operation
   async def get_all(self) -> List[ChatModel]:
     """Get all chats sorted by updated_at (newest first)."""
-    return sorted(self.chats.values(), key=lambda c: c.updated_at, reverse=True)
+    return list(reversed(self.chats.values()))
+
+  @timed_operation
+  async def list_chats(self, limit: int, before: Optional[Cursor] = None) -> List[ChatModel]:
+    """Get a page of chats, newest first."""
+    chats = reversed(self.chats.values())
+    if before is not None:
+      chats = (c for c in chats if (c.updated_at, c.id) < before)
+    return list(itertools.islice(chats, limit))
 
-  async def get(self, chat_id: str) -> Optional[ChatModel]:
-    """Get specific chat by ID."""
-    return self.chats.get(chat_id)
+  @timed_operation
+  async def get(self, chat_id: str, include_messages: bool = True) -> Optional[ChatModel]:
+    """Get specific chat by ID (messages are always in memory)."""
+    chat = self.chats.get(chat_id)
+    if chat is not None:
+      self._use(chat_id)
+    return chat
+
+  @timed_operation
+  async def get_messages(
+    self, chat_id: str, limit: int, before: Optional[Cursor] = None
+  ) -> Optional[List[MessageModel]]:
+    """Get the latest messages of a chat, oldest first.
 
+    Messages are appended in timestamp order, so the cursor is found by bisection.
+    """
+    chat = self.chats.get(chat_id)
+    if not chat:
+      return None
+    self._use(chat_id)
+    messages = chat.messages
+    end = len(messages)
+    if before is not None:
+      end = bisect.bisect_left(messages, before, key=_message_position)
+    return messages[max(0, end - limit):end] if limit > 0 else []
+
+  @timed_operation
   async def create(self, title: str = 'New Chat', agent_id: Optional[str] = None) -> ChatModel:
     """Create new chat.
 
-    If max_chats limit reached, deletes the oldest chat.
+    If max_chats limit reached, deletes the least recently updated chat.
     """
     # Enforce max limit - delete oldest chat if needed
     if len(self.chats) >= self.max_chats:
-      oldest = min(self.chats.values(), key=lambda c: c.updated_at)
-      del self.chats[oldest.id]
+      self._remove(next(iter(self.chats)))
 
     # Create new chat using SQLAlchemy model (detached)
     chat_id = f'chat_{uuid.uuid4().hex[:12]}'
@@ -60,30 +230,76 @@ class MemoryChatStorage(BaseChatStorage):
       agent_id=agent_id,
       created_at=now,
       updated_at=now,
+      message_count=0,
     )
     # Initialize messages list for detached model
     new_chat.messages = []
 
     self.chats[chat_id] = new_chat
+    if self._on_create is not None:
+      self._on_create(self)
+    self._resize(chat_id, CHAT_OVERHEAD_BYTES + len(title))
     return new_chat
 
+  def _append_messages(self, chat: ChatModel, msgs: List[MessageModel]):
+    """Append messages and update the chat's counters, timestamp, title and size."""
+    is_first = not chat.message_count
+    for msg in msgs:
+      msg.chat_id = chat.id
+    chat.messages.extend(msgs)
+    size = self._sizes.get(chat.id, CHAT_OVERHEAD_BYTES) + sum(_message_size(m) for m in msgs)
+
+    # Keep the latest max_messages_per_chat messages
+    excess = len(chat.messages) - self.max_messages_per_chat
+    if excess > 0:
+      size -= sum(_message_size(m) for m in chat.messages[:excess])
+      del chat.messages[:excess]
+
+    now = datetime.now()
+    chat.updated_at = now
+    # Total ever added, like PostgreSQL: not reduced when old messages are dropped
+    chat.message_count = (chat.message_count or 0) + len(msgs)
+    chat.last_message_at = msgs[-1].timestamp or now
+
+    # Auto-generate title from first user message
+    if is_first and msgs[0].role == 'user':
+      chat.title = msgs[0].content[:50] + ('...' if len(msgs[0].content) > 50 else '')
+
+    self.chats.move_to_end(chat.id)
+    self._resize(chat.id, size)
+
+  @timed_operation
+  async def get_trace(self, chat_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    """Get the full trace_summary of a message."""
+    chat = self.chats.get(chat_id)
+    if not chat:
+      return None
+    self._use(chat_id)
+    for msg in chat.messages:
+      if msg.id == message_id:
+        return msg.trace_summary
+    return None
+
+  @timed_operation
   async def add_message(self, chat_id: str, msg: MessageModel) -> bool:
     """Add message to existing chat."""
     chat = self.chats.get(chat_id)
     if not chat:
       return False
+    self._append_messages(chat, [msg])
+    return True
 
-    # Set the chat_id on the message
-    msg.chat_id = chat_id
-    chat.messages.append(msg)
-    chat.updated_at = datetime.now()
-
-    # Auto-generate title from first user message
-    if len(chat.messages) == 1 and msg.role == 'user':
-      chat.title = msg.content[:50] + ('...' if len(msg.content) > 50 else '')
-
+  @timed_operation
+  async def add_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    """Add several messages to existing chat, in order."""
+    chat = self.chats.get(chat_id)
+    if not chat:
+      return False
+    if msgs:
+      self._append_messages(chat, msgs)
     return True
 
+  @timed_operation
   async def update_title(self, chat_id: str, title: str) -> bool:
     """Update chat title."""
     chat = self.chats.get(chat_id)
@@ -91,19 +307,24 @@ class MemoryChatStorage(BaseChatStorage):
       return False
     chat.title = title
     chat.updated_at = datetime.now()
+    self.chats.move_to_end(chat_id)
+    self._use(chat_id)
     return True
 
+  @timed_operation
   async def delete(self, chat_id: str) -> bool:
     """Delete chat by ID."""
     if chat_id in self.chats:
-      del self.chats[chat_id]
+      self._remove(chat_id)
       return True
     return False
 
+  @timed_operation
   async def clear_all(self) -> int:
     """Delete all chats."""
     count = len(self.chats)
-    self.chats.clear()
+    for chat_id in list(self.chats):
+      self._remove(chat_id)
     return count
 
 
@@ -111,13 +332,29 @@ class MemoryUserScopedChatStorage(BaseUserScopedChatStorage):
   """User-scoped in-memory chat storage manager.
 
   Maintains separate MemoryChatStorage instances per user (by email).
-  Each user has their own isolated chat history.
+  Each user has their own isolated chat history. All users share one
+  MemoryBudget; a user whose chats were all evicted is forgotten.
   """
 
-  def __init__(self, max_chats_per_user: int = 10):
+  def __init__(
+    self,
+    max_chats_per_user: int = 10,
+    max_messages_per_chat: int = DEFAULT_MAX_MESSAGES_PER_CHAT,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+  ):
     """Initialize user-scoped storage."""
     self._user_storages: Dict[str, MemoryChatStorage] = {}
     self._max_chats_per_user = max_chats_per_user
+    self._max_messages_per_chat = max_messages_per_chat
+    self.budget = MemoryBudget(max_bytes)
+
+  def _forget(self, storage: MemoryChatStorage):
+    if self._user_storages.get(storage.user_email) is storage:
+      del self._user_storages[storage.user_email]
+
+  def _adopt(self, storage: MemoryChatStorage):
+    # A storage forgotten while a request still held it becomes the user's again
+    self._user_storages.setdefault(storage.user_email, storage)
 
   def get_storage_for_user(self, user_email: str) -> BaseChatStorage:
     """Get or create MemoryChatStorage for a specific user."""
@@ -125,6 +362,10 @@ class MemoryUserScopedChatStorage(BaseUserScopedChatStorage):
       self._user_storages[user_email] = MemoryChatStorage(
         user_email=user_email,
         max_chats=self._max_chats_per_user,
+        max_messages_per_chat=self._max_messages_per_chat,
+        budget=self.budget,
+        on_empty=self._forget,
+        on_create=self._adopt,
       )
     return self._user_storages[user_email]
 
@@ -135,6 +376,8 @@ class MemoryUserScopedChatStorage(BaseUserScopedChatStorage):
   async def clear_user_storage(self, user_email: str) -> bool:
     """Clear all storage for a specific user."""
     if user_email in self._user_storages:
-      del self._user_storages[user_email]
+      storage = self._user_storages.pop(user_email)
+      for chat_id in list(storage.chats):
+        self.budget.discard(storage, chat_id)
       return True
     return False
@@ -0,0 +1,224 @@
+"""Write-behind persistence of chat turns.
+
+/api/invoke_endpoint hands the user and assistant messages of a finished turn
+to this queue and sends stream.completed right away, instead of waiting for the
+database. A background worker hands queued turns to one writer task per chat:
+turns of different chats are written concurrently, turns of one chat in order.
+A failed write is retried with backoff inside its chat's writer, so it delays
+that chat only. The queue is drained on shutdown from the FastAPI lifespan.
+
+Reads stay consistent: the chat endpoints call wait_for() before reading, which
+returns as soon as the user's (or the chat's) queued turns are written.
+
+Usage:
+    from server.services.chat.persistence import persistence
+
+    await persistence.enqueue(user_email, chat_id, [user_message, assistant_message])
+    await persistence.wait_for(user_email, chat_id)  # before reading the chat
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from server.db.models import MessageModel
+from server.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Chats written at the same time (leaves pool connections for requests)
+FLUSH_CONCURRENCY = 4
+# Attempts per turn before it is dropped (logged as an error)
+MAX_WRITE_ATTEMPTS = 5
+WRITE_RETRY_BASE_SECONDS = 0.5
+WRITE_RETRY_MAX_SECONDS = 10.0
+# Turns that may wait in the queue, and turns that may be in chat writers, before
+# enqueue() applies back-pressure
+MAX_PENDING_TURNS = 10000
+# How long reads wait for queued writes before reading anyway
+READ_WAIT_TIMEOUT_SECONDS = 5.0
+SHUTDOWN_DRAIN_TIMEOUT_SECONDS = 20.0
+
+PERSISTENCE_FLUSH_SECONDS = registry.histogram(
+  'persistence_flush_seconds', "Duration of each flush of a chat's queued turns"
+)
+PERSISTENCE_FAILURES = registry.counter(
+  'persistence_failures_total', 'Write-behind turn writes by failure result', ['result']
+)
+
+
+class PendingTurn(NamedTuple):
+  """Messages of one chat turn waiting to be written."""
+
+  user_email: str
+  chat_id: str
+  messages: List[MessageModel]
+
+
+class WriteBehindQueue:
+  """Queue of chat turns written to storage by a background worker."""
+
+  def __init__(self, max_pending: int = MAX_PENDING_TURNS):
+    self._queue: Optional[asyncio.Queue] = None
+    self._max_pending = max_pending
+    self._worker: Optional[asyncio.Task] = None
+    # Turns taken from the queue and not yet written (at most max_pending)
+    self._slots: Optional[asyncio.Semaphore] = None
+    # Writes in progress (at most FLUSH_CONCURRENCY)
+    self._write_slots: Optional[asyncio.Semaphore] = None
+    # (user, chat) -> turns of the chat's writer task, in order
+    self._chat_turns: Dict[Tuple[str, str], Deque[PendingTurn]] = {}
+    self._writers: Dict[Tuple[str, str], asyncio.Task] = {}
+    # (user, chat) -> queued or in-flight turns, and an event set once it drops to 0
+    self._pending: Dict[Tuple[str, str], int] = {}
+    self._idle: Dict[Tuple[str, str], asyncio.Event] = {}
+    registry.gauge(
+      'persistence_queue_depth', 'Chat turns waiting to be written', [],
+      lambda: {(): self._queue.qsize() if self._queue is not None else 0},
+    )
+
+  def start(self):
+    """Start the background worker (idempotent; also started by the first enqueue)."""
+    if self._queue is None:
+      self._queue = asyncio.Queue(maxsize=self._max_pending)
+      self._slots = asyncio.Semaphore(self._max_pending)
+      self._write_slots = asyncio.Semaphore(FLUSH_CONCURRENCY)
+    if self._worker is None or self._worker.done():
+      self._worker = asyncio.create_task(self._run(), name='chat-write-behind')
+
+  async def enqueue(self, user_email: str, chat_id: str, messages: List[MessageModel]):
+    """Queue a turn's messages for writing (in order). Returns without waiting for the database."""
+    if not messages:
+      return
+    self.start()
+    key = (user_email, chat_id)
+    self._pending[key] = self._pending.get(key, 0) + 1
+    self._idle.setdefault(key, asyncio.Event()).clear()
+    await self._queue.put(PendingTurn(user_email, chat_id, messages))
+
+  async def wait_for(
+    self, user_email: str, chat_id: Optional[str] = None, timeout: float = READ_WAIT_TIMEOUT_SECONDS
+  ):
+    """Wait until the queued turns of a chat (or of all the user's chats) are written."""
+    events = [
+      event
+      for (user, chat), event in self._idle.items()
+      if user == user_email and (chat_id is None or chat == chat_id)
+    ]
+    if not events:
+      return
+    try:
+      await asyncio.wait_for(asyncio.gather(*(event.wait() for event in events)), timeout)
+    except asyncio.TimeoutError:
+      logger.warning(f'Reading chats of {user_email} before queued messages were written')
+
+  def _done(self, turn: PendingTurn):
+    key = (turn.user_email, turn.chat_id)
+    remaining = self._pending.get(key, 0) - 1
+    if remaining > 0:
+      self._pending[key] = remaining
+      return
+    self._pending.pop(key, None)
+    event = self._idle.pop(key, None)
+    if event is not None:
+      event.set()
+
+  async def _run(self):
+    """Worker: hand each queued turn to the writer task of its chat."""
+    while True:
+      await self._slots.acquire()
+      turn = await self._queue.get()
+      key = (turn.user_email, turn.chat_id)
+      turns = self._chat_turns.get(key)
+      if turns is not None:
+        # The chat's writer is running and takes the turn after the ones before it
+        turns.append(turn)
+        continue
+      self._chat_turns[key] = deque([turn])
+      self._writers[key] = asyncio.create_task(
+        self._write_chat(key), name=f'chat-write-behind-{turn.chat_id}'
+      )
+
+  async def _write_chat(self, key: Tuple[str, str]):
+    """Writer of one chat: write its turns in queue order until none are left."""
+    start = time.perf_counter()
+    turns = self._chat_turns[key]
+    try:
+      while turns:
+        turn = turns[0]
+        try:
+          await self._write_turn(turn)
+        finally:
+          turns.popleft()
+          # Readers of this chat can go ahead without waiting for other chats
+          self._done(turn)
+          self._slots.release()
+          self._queue.task_done()
+    finally:
+      # Turns left after a cancellation (shutdown) are not saved
+      for turn in turns:
+        self._done(turn)
+        self._slots.release()
+        self._queue.task_done()
+      del self._chat_turns[key]
+      del self._writers[key]
+      PERSISTENCE_FLUSH_SECONDS.observe(time.perf_counter() - start)
+
+  async def _write_turn(self, turn: PendingTurn):
+    """Write one turn's messages in a single add_messages call, retrying with backoff.
+
+    Only the write holds one of the FLUSH_CONCURRENCY slots, not the backoff.
+    """
+    # Imported here: the storage backend is chosen at startup
+    from . import get_storage
+
+    user_storage = get_storage().get_storage_for_user(turn.user_email)
+    for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+      try:
+        async with self._write_slots:
+          saved = await user_storage.add_messages(turn.chat_id, turn.messages)
+        if not saved:
+          # The chat was deleted meanwhile: nothing left to write to
+          PERSISTENCE_FAILURES.inc(result='chat_missing')
+          logger.warning(f'Chat {turn.chat_id} no longer exists, dropping its queued messages')
+        return
+      except Exception as e:
+        if attempt == MAX_WRITE_ATTEMPTS:
+          PERSISTENCE_FAILURES.inc(result='dropped')
+          logger.error(
+            f'Failed to save {len(turn.messages)} messages to chat {turn.chat_id} '
+            f'after {attempt} attempts: {e}'
+          )
+          return
+        PERSISTENCE_FAILURES.inc(result='retried')
+        delay = min(WRITE_RETRY_MAX_SECONDS, WRITE_RETRY_BASE_SECONDS * 2 ** (attempt - 1))
+        logger.warning(
+          f'Saving messages to chat {turn.chat_id} failed ({e}), retrying in {delay:.1f}s'
+        )
+        await asyncio.sleep(delay)
+
+  async def close(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT_SECONDS):
+    """Drain queued turns (up to timeout), then stop the worker."""
+    if self._queue is None:
+      return
+    if self._worker is not None and not self._worker.done():
+      try:
+        await asyncio.wait_for(self._queue.join(), timeout)
+        logger.info('Write-behind queue drained')
+      except asyncio.TimeoutError:
+        logger.error(f'Shutting down with {sum(self._pending.values())} chat turns not yet saved')
+      self._worker.cancel()
+      writers = list(self._writers.values())
+      for writer in writers:
+        writer.cancel()
+      await asyncio.gather(self._worker, *writers, return_exceptions=True)
+    self._worker = None
+    self._queue = None
+    self._slots = None
+    self._write_slots = None
+
+
+# Global write-behind queue
+persistence = WriteBehindQueue()
@@ -1,19 +1,21 @@
 """PostgreSQL chat storage implementation (async).
 
 This module provides persistent chat storage using PostgreSQL with async SQLAlchemy.
-All database operations are non-blocking.
+All database operations are non-blocking. Large traces are stored compressed in
+message_traces (see traces.py).
 """
 
 import uuid
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
-from sqlalchemy import delete, func, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import case, delete, func, literal, select, tuple_, update
+from sqlalchemy.orm import selectinload, with_expression
 
-from server.db import ChatModel, MessageModel, session_scope
+from server.db import TRACE_PREVIEW, ChatModel, MessageModel, MessageTraceModel, session_scope
 
-from .base import BaseChatStorage, BaseUserScopedChatStorage
+from .base import BaseChatStorage, BaseUserScopedChatStorage, Cursor, timed_operation
+from .traces import pack_trace, unpack_trace
 
 
 class PostgresChatStorage(BaseChatStorage):
@@ -26,11 +28,14 @@ class PostgresChatStorage(BaseChatStorage):
   - Automatically deletes oldest chat when limit reached
   """
 
+  backend = 'postgres'
+
   def __init__(self, user_email: str, max_chats: int = 10):
     """Initialize storage with user email and max chat limit."""
     self.user_email = user_email
     self.max_chats = max_chats
 
+  @timed_operation
   async def get_all(self) -> List[ChatModel]:
     """Get all chats sorted by updated_at (newest first).
 
@@ -47,20 +52,66 @@ class PostgresChatStorage(BaseChatStorage):
       # Return detached copies (without messages loaded)
       return list(chats)
 
-  async def get(self, chat_id: str) -> Optional[ChatModel]:
-    """Get specific chat by ID."""
+  @timed_operation
+  async def list_chats(self, limit: int, before: Optional[Cursor] = None) -> List[ChatModel]:
+    """Get a page of chats, newest first (served by ix_chats_user_updated)."""
     async with session_scope() as session:
-      stmt = (
-        select(ChatModel)
-        .options(selectinload(ChatModel.messages))
-        .where(
-          ChatModel.id == chat_id,
-          ChatModel.user_email == self.user_email,
-        )
+      stmt = select(ChatModel).where(ChatModel.user_email == self.user_email)
+      if before is not None:
+        stmt = stmt.where(tuple_(ChatModel.updated_at, ChatModel.id) < tuple_(*before))
+      stmt = stmt.order_by(ChatModel.updated_at.desc(), ChatModel.id.desc()).limit(limit)
+      result = await session.execute(stmt)
+      return list(result.scalars().all())
+
+  @timed_operation
+  async def get(self, chat_id: str, include_messages: bool = True) -> Optional[ChatModel]:
+    """Get specific chat by ID.
+
+    With include_messages=False the messages relationship is not loaded and
+    must not be accessed on the returned (detached) chat.
+    """
+    async with session_scope() as session:
+      stmt = select(ChatModel).where(
+        ChatModel.id == chat_id,
+        ChatModel.user_email == self.user_email,
       )
+      if include_messages:
+        # trace_summary stays deferred: only its preview is selected
+        stmt = stmt.options(
+          selectinload(ChatModel.messages).options(
+            with_expression(MessageModel.trace_preview, TRACE_PREVIEW)
+          )
+        )
       result = await session.execute(stmt)
       return result.scalar_one_or_none()
 
+  @timed_operation
+  async def get_messages(
+    self, chat_id: str, limit: int, before: Optional[Cursor] = None
+  ) -> Optional[List[MessageModel]]:
+    """Get the latest messages of a chat (served by ix_messages_chat_timestamp)."""
+    async with session_scope() as session:
+      owner_stmt = select(ChatModel.id).where(
+        ChatModel.id == chat_id,
+        ChatModel.user_email == self.user_email,
+      )
+      if (await session.execute(owner_stmt)).scalar_one_or_none() is None:
+        return None
+
+      stmt = (
+        select(MessageModel)
+        .options(with_expression(MessageModel.trace_preview, TRACE_PREVIEW))
+        .where(MessageModel.chat_id == chat_id)
+      )
+      if before is not None:
+        stmt = stmt.where(tuple_(MessageModel.timestamp, MessageModel.id) < tuple_(*before))
+      stmt = stmt.order_by(MessageModel.timestamp.desc(), MessageModel.id.desc()).limit(limit)
+      result = await session.execute(stmt)
+      messages = list(result.scalars().all())
+      messages.reverse()
+      return messages
+
+  @timed_operation
   async def create(self, title: str = 'New Chat', agent_id: Optional[str] = None) -> ChatModel:
     """Create new chat.
 
@@ -112,39 +163,111 @@ class PostgresChatStorage(BaseChatStorage):
       result = await session.execute(stmt)
       return result.scalar_one()
 
-  async def add_message(self, chat_id: str, msg: MessageModel) -> bool:
-    """Add message to existing chat."""
+  @timed_operation
+  async def get_trace(self, chat_id: str, message_id: str) -> Optional[Dict[str, Any]]:
+    """Get the full trace_summary of a message.
+
+    Loads the deferred JSONB column, or decompresses the message_traces row
+    when the trace was stored compressed.
+    """
     async with session_scope() as session:
-      # Find the chat
-      stmt = select(ChatModel).where(
-        ChatModel.id == chat_id,
-        ChatModel.user_email == self.user_email,
+      stmt = (
+        select(MessageModel.trace_summary, MessageTraceModel.codec, MessageTraceModel.payload)
+        .join(ChatModel, ChatModel.id == MessageModel.chat_id)
+        .outerjoin(MessageTraceModel, MessageTraceModel.message_id == MessageModel.id)
+        .where(
+          MessageModel.id == message_id,
+          MessageModel.chat_id == chat_id,
+          ChatModel.user_email == self.user_email,
+        )
+      )
+      row = (await session.execute(stmt)).one_or_none()
+      if row is None:
+        return None
+      if row.payload is not None:
+        return unpack_trace(row.codec, row.payload)
+      return row.trace_summary
+
+  async def _insert_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    """Add messages to a chat with two statements in one transaction.
+
+    An UPDATE ... RETURNING checks ownership and updates the chat's counters,
+    updated_at and title in SQL. The title is derived from the first message
+    when the chat had no messages (message_count = 0) and that message is from
+    the user. One bulk INSERT then writes the messages, and another one the
+    compressed traces of those above the size threshold.
+
+    New rows are built from msgs rather than adding msgs themselves, so a
+    failed attempt leaves them untouched for the write-behind retry.
+    """
+    now = datetime.now()
+    values = {
+      'updated_at': now,
+      'message_count': ChatModel.message_count + len(msgs),
+      'last_message_at': msgs[-1].timestamp or now,
+    }
+    first = msgs[0]
+    if first.role == 'user':
+      content = literal(first.content)
+      derived_title = func.left(content, 50) + case(
+        (func.length(content) > 50, '...'), else_=''
+      )
+      values['title'] = case((ChatModel.message_count == 0, derived_title), else_=ChatModel.title)
+
+    async with session_scope() as session:
+      stmt = (
+        update(ChatModel)
+        .where(
+          ChatModel.id == chat_id,
+          ChatModel.user_email == self.user_email,
+        )
+        .values(**values)
+        .returning(ChatModel.id)
+        .execution_options(synchronize_session=False)
       )
       result = await session.execute(stmt)
-      chat = result.scalar_one_or_none()
-      if not chat:
+      if result.scalar_one_or_none() is None:
         return False
 
-      # Set chat_id on message and add
-      msg.chat_id = chat_id
-      session.add(msg)
-
-      # Update chat timestamp
-      chat.updated_at = datetime.now()
+      rows: List[MessageModel] = []
+      traces: List[MessageTraceModel] = []
+      for msg in msgs:
+        trace_summary, packed = pack_trace(msg.trace_summary)
+        rows.append(MessageModel(
+          id=msg.id,
+          chat_id=chat_id,
+          role=msg.role,
+          content=msg.content,
+          timestamp=msg.timestamp or now,
+          trace_id=msg.trace_id,
+          trace_summary=trace_summary,
+          is_error=bool(msg.is_error),
+          is_interrupted=bool(msg.is_interrupted),
+        ))
+        if packed is not None:
+          traces.append(MessageTraceModel(message_id=msg.id, **packed._asdict()))
+
+      # Flushed as a single (multi-row) INSERT
+      session.add_all(rows)
+      if traces:
+        # message_traces references the messages: insert them first
+        await session.flush()
+        session.add_all(traces)
+      return True
 
-      # Auto-generate title from first user message
-      msg_count_stmt = (
-        select(func.count())
-        .select_from(MessageModel)
-        .where(MessageModel.chat_id == chat_id)
-      )
-      count_result = await session.execute(msg_count_stmt)
-      msg_count = count_result.scalar()
-      if msg_count == 0 and msg.role == 'user':
-        chat.title = msg.content[:50] + ('...' if len(msg.content) > 50 else '')
+  @timed_operation
+  async def add_message(self, chat_id: str, msg: MessageModel) -> bool:
+    """Add message to existing chat."""
+    return await self._insert_messages(chat_id, [msg])
 
-      return True
+  @timed_operation
+  async def add_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    """Add several messages to existing chat in one transaction (see _insert_messages)."""
+    if not msgs:
+      return await self.get(chat_id, include_messages=False) is not None
+    return await self._insert_messages(chat_id, msgs)
 
+  @timed_operation
   async def update_title(self, chat_id: str, title: str) -> bool:
     """Update chat title."""
     async with session_scope() as session:
@@ -160,6 +283,7 @@ class PostgresChatStorage(BaseChatStorage):
       chat.updated_at = datetime.now()
       return True
 
+  @timed_operation
   async def delete(self, chat_id: str) -> bool:
     """Delete chat by ID."""
     async with session_scope() as session:
@@ -170,6 +294,7 @@ class PostgresChatStorage(BaseChatStorage):
       result = await session.execute(stmt)
       return result.rowcount > 0
 
+  @timed_operation
   async def clear_all(self) -> int:
     """Delete all chats."""
     async with session_scope() as session:
@@ -0,0 +1,123 @@
+"""Compression of large message traces.
+
+trace_summary can hold the whole agent trace (databricks_output), often tens of
+kilobytes of repetitive JSON. Traces whose JSON is larger than
+TRACE_COMPRESS_THRESHOLD_BYTES are stored compressed in the message_traces
+table; messages.trace_summary then only keeps the preview (trace_summary
+without TRACE_DETAIL_KEYS), which is all message listings read. The full
+summary is decompressed only when the trace endpoint asks for it.
+
+Codecs, in order of preference:
+1. zstd (optional dependency: zstandard)
+2. zlib (stdlib, always available)
+
+Set TRACE_COMPRESSION=zstd|zlib to force a codec. Each row records the codec it
+was written with, so rows stay readable when the preference changes.
+
+Usage:
+    from server.services.chat.traces import pack_trace, unpack_trace
+
+    inline, packed = pack_trace(trace_summary)
+    if packed is not None:
+        summary = unpack_trace(packed.codec, packed.payload)
+"""
+
+import logging
+import os
+import zlib
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from server.db.models import trace_preview
+from server.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Traces whose JSON is at most this size stay inline in messages.trace_summary
+TRACE_COMPRESS_THRESHOLD_BYTES = int(os.environ.get('TRACE_COMPRESS_THRESHOLD_BYTES', '16384'))
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+
+Compressor = Callable[[bytes], bytes]
+Decompressor = Callable[[bytes], bytes]
+
+
+class PackedTrace(NamedTuple):
+  """A compressed trace_summary, as stored in message_traces."""
+
+  codec: str
+  payload: bytes
+  raw_size: int
+  stored_size: int
+
+
+def _load_codecs() -> Dict[str, Tuple[Compressor, Decompressor]]:
+  """Discover installed codecs, preferred first."""
+  codecs: Dict[str, Tuple[Compressor, Decompressor]] = {}
+
+  try:
+    import zstandard
+
+    codecs['zstd'] = (
+      zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress,
+      zstandard.ZstdDecompressor().decompress,
+    )
+  except ImportError:
+    pass
+
+  codecs['zlib'] = (lambda data: zlib.compress(data, ZLIB_LEVEL), zlib.decompress)
+  return codecs
+
+
+_CODECS = _load_codecs()
+
+
+def _select_codec() -> str:
+  """Pick the codec from TRACE_COMPRESSION or the preferred installed one."""
+  requested = os.environ.get('TRACE_COMPRESSION', '').strip().lower()
+  if requested:
+    if requested in _CODECS:
+      return requested
+    logger.warning(f'TRACE_COMPRESSION={requested} is not installed, using the preferred available')
+  return next(iter(_CODECS))
+
+
+CODEC = _select_codec()
+
+
+def available_codecs() -> Dict[str, Compressor]:
+  """Get the compressor of every installed codec (used by benchmarks)."""
+  return {name: compressor for name, (compressor, _) in _CODECS.items()}
+
+
+def compress_trace(raw: bytes, codec: str = CODEC) -> PackedTrace:
+  """Compress a serialized trace_summary."""
+  payload = _CODECS[codec][0](raw)
+  return PackedTrace(codec, payload, len(raw), len(payload))
+
+
+def unpack_trace(codec: str, payload: bytes) -> Dict[str, Any]:
+  """Decompress and parse a trace_summary stored by compress_trace.
+
+  Raises:
+      RuntimeError: If the row was written with a codec that is not installed
+  """
+  if codec not in _CODECS:
+    raise RuntimeError(f'Trace was stored with {codec}, which is not installed')
+  return loads(_CODECS[codec][1](payload))
+
+
+def pack_trace(
+  trace_summary: Optional[Dict[str, Any]], threshold: int = TRACE_COMPRESS_THRESHOLD_BYTES
+) -> Tuple[Optional[Dict[str, Any]], Optional[PackedTrace]]:
+  """Split a trace_summary into what is stored inline and what is compressed.
+
+  Returns:
+      (trace_summary, None) for small traces, otherwise the preview to store
+      inline and the compressed full summary
+  """
+  if trace_summary is None:
+    return None, None
+  raw = dumps(trace_summary)
+  if len(raw) <= threshold:
+    return trace_summary, None
+  return trace_preview(trace_summary), compress_trace(raw)
@@ -0,0 +1,123 @@
+"""Process-wide registry of Databricks and HTTP clients.
+
+Building a WorkspaceClient re-reads configuration, authenticates and opens new
+TLS connections, which used to happen on every Genie message, endpoint call and
+agent validation. The registry builds each client once (at startup from the
+FastAPI lifespan, or lazily on first use) and hands out the shared instance:
+- WorkspaceClient: thread-safe, pooled HTTP session; its Config refreshes OAuth
+  tokens on each authenticate() call
+- MLflow deployments client (fallback transport for serving endpoints)
+- httpx.AsyncClient used for native endpoint streaming
+
+How long each client took to build is kept in stats(), i.e. the latency that
+used to be paid on the request path for every call.
+
+Usage:
+    from server.services.clients import clients
+
+    w = clients.workspace_client()
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+from databricks.sdk import WorkspaceClient
+from databricks.sdk.core import Config
+from mlflow.deployments import get_deploy_client
+
+logger = logging.getLogger(__name__)
+
+# Connection pool sizing for the shared streaming client. Each open chat stream
+# holds one connection for its whole duration, so this bounds concurrent streams.
+MAX_STREAM_CONNECTIONS = 200
+MAX_KEEPALIVE_CONNECTIONS = 50
+# Agents can think for a long time between chunks (tool calls, retrieval)
+STREAM_READ_TIMEOUT_SECONDS = 300.0
+
+
+class ClientRegistry:
+  """Lazily built, shared clients for the whole process."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._clients: Dict[str, Any] = {}
+    self._http_client: Optional[httpx.AsyncClient] = None
+    # client name -> seconds it took to build
+    self._construction_seconds: Dict[str, float] = {}
+
+  def _get(self, name: str, factory: Callable[[], Any]) -> Any:
+    """Get a client, building it once under the lock if needed."""
+    client = self._clients.get(name)
+    if client is not None:
+      return client
+    with self._lock:
+      client = self._clients.get(name)
+      if client is None:
+        start = time.perf_counter()
+        client = factory()
+        elapsed = time.perf_counter() - start
+        self._construction_seconds[name] = elapsed
+        self._clients[name] = client
+        logger.info(f'Created {name} in {elapsed * 1000:.0f} ms')
+      return client
+
+  def workspace_client(self) -> WorkspaceClient:
+    """Get the shared Databricks WorkspaceClient."""
+    return self._get('workspace_client', WorkspaceClient)
+
+  def workspace_config(self) -> Config:
+    """Get the Databricks SDK config (host + credentials) of the shared client."""
+    return self.workspace_client().config
+
+  def deploy_client(self) -> Any:
+    """Get the shared MLflow deployments client for Databricks."""
+    return self._get('deploy_client', lambda: get_deploy_client('databricks'))
+
+  def http_client(self) -> httpx.AsyncClient:
+    """Get the shared async HTTP client used for endpoint streaming."""
+    if self._http_client is None or self._http_client.is_closed:
+      self._http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+          max_connections=MAX_STREAM_CONNECTIONS,
+          max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(10.0, read=STREAM_READ_TIMEOUT_SECONDS),
+      )
+    return self._http_client
+
+  def _warm_up(self):
+    """Build the Databricks clients (blocking)."""
+    getters = (('workspace_client', self.workspace_client), ('deploy_client', self.deploy_client))
+    for name, getter in getters:
+      try:
+        getter()
+      except Exception as e:
+        # Missing credentials should not stop the app; requests will report the error
+        logger.warning(f'Could not create {name} at startup: {e}')
+
+  async def start(self):
+    """Build all clients up front so requests never pay for it."""
+    await asyncio.to_thread(self._warm_up)
+    self.http_client()
+
+  async def close(self):
+    """Release pooled connections."""
+    if self._http_client is not None and not self._http_client.is_closed:
+      await self._http_client.aclose()
+    self._http_client = None
+
+  def stats(self) -> Dict[str, Any]:
+    """Construction time of each client, in milliseconds."""
+    return {
+      'construction_ms': {
+        name: round(seconds * 1000, 1) for name, seconds in self._construction_seconds.items()
+      },
+    }
+
+
+# Global client registry
+clients = ClientRegistry()
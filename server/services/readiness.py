@@ -0,0 +1,122 @@
+"""Readiness checks (database, Databricks auth, agents), cached for a few seconds.
+
+/api/ready and /api/me both read from here, so however many probes and page
+loads arrive, the live checks run at most once per READY_CACHE_SECONDS, and
+concurrent callers share the check that is already running.
+
+Checks:
+- database: SELECT 1 through the connection pool (skipped if Lakebase is not configured)
+- databricks_auth: current_user.me() with the shared WorkspaceClient
+- agents: no network calls; agents whose config failed to resolve and endpoints
+  whose circuit breaker is open. Reported, but they do not make the app unready.
+
+Usage:
+    from server.services.readiness import readiness
+
+    status = await readiness.status()
+    status['ready'], status['checks']['database']['error']
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from ..config_loader import config_loader
+from ..db import is_postgres_configured, test_database_connection
+from .agents.resilience import breaker_status
+from .clients import clients
+
+logger = logging.getLogger(__name__)
+
+# How long a readiness result is reused
+READY_CACHE_SECONDS = 5.0
+# Upper bound for each live check, so a hung dependency cannot stall probes
+CHECK_TIMEOUT_SECONDS = 3.0
+
+
+async def _check_database() -> Dict[str, Any]:
+  """Run SELECT 1 on a pooled connection."""
+  if not is_postgres_configured():
+    return {'ok': True, 'configured': False, 'error': None}
+  try:
+    error = await asyncio.wait_for(test_database_connection(), CHECK_TIMEOUT_SECONDS)
+  except asyncio.TimeoutError:
+    error = f'No database connection within {CHECK_TIMEOUT_SECONDS:.0f}s'
+  return {'ok': error is None, 'configured': True, 'error': error}
+
+
+async def _check_databricks_auth() -> Dict[str, Any]:
+  """Authenticate against the workspace with the shared client."""
+  try:
+    await asyncio.wait_for(
+      asyncio.to_thread(lambda: clients.workspace_client().current_user.me()),
+      CHECK_TIMEOUT_SECONDS,
+    )
+    return {'ok': True, 'error': None}
+  except asyncio.TimeoutError:
+    error = f'No response from the workspace within {CHECK_TIMEOUT_SECONDS:.0f}s'
+    return {'ok': False, 'error': error}
+  except Exception as e:
+    return {'ok': False, 'error': str(e)}
+
+
+def _check_agents() -> Dict[str, Any]:
+  """Agent status from what is already known in process (config and circuit breakers)."""
+  agents = config_loader.agents_config.get('agents', [])
+  errors = {
+    (
+      agent.get('mas_id') or agent.get('endpoint_name') or agent.get('genie_space_id') or str(i)
+    ): agent['_error']
+    for i, agent in enumerate(agents)
+    if isinstance(agent, dict) and agent.get('_error')
+  }
+  open_circuits = [name for name, status in breaker_status().items() if status['state'] != 'closed']
+  return {
+    'ok': not errors and not open_circuits,
+    'configured': len(agents),
+    'errors': errors,
+    'open_circuits': open_circuits,
+  }
+
+
+class ReadinessChecker:
+  """Runs the readiness checks at most once per READY_CACHE_SECONDS."""
+
+  def __init__(self, cache_seconds: float = READY_CACHE_SECONDS):
+    self.cache_seconds = cache_seconds
+    self._result: Optional[Dict[str, Any]] = None
+    self._checked_at = 0.0
+    self._running: Optional[asyncio.Task] = None
+
+  async def _run_checks(self) -> Dict[str, Any]:
+    database, auth = await asyncio.gather(_check_database(), _check_databricks_auth())
+    agents = _check_agents()
+    ready = database['ok'] and auth['ok']
+    if not ready:
+      logger.warning(f'Not ready - database: {database["error"]}, databricks_auth: {auth["error"]}')
+    return {
+      'ready': ready,
+      'timestamp': int(time.time() * 1000),
+      'checks': {'database': database, 'databricks_auth': auth, 'agents': agents},
+    }
+
+  async def status(self) -> Dict[str, Any]:
+    """Latest readiness result, re-running the checks if it is older than cache_seconds."""
+    if self._result is not None and time.monotonic() - self._checked_at < self.cache_seconds:
+      return self._result
+
+    if self._running is None or self._running.done():
+      self._running = asyncio.create_task(self._run_checks())
+    task = self._running
+    # Shielded: a caller that goes away does not cancel the check others are waiting on
+    result = await asyncio.shield(task)
+    if task is self._running:
+      self._result = result
+      self._checked_at = time.monotonic()
+      self._running = None
+    return result
+
+
+# Global readiness checker
+readiness = ReadinessChecker()
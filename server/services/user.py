@@ -10,9 +10,10 @@ import logging
 import os
 from typing import Optional
 
-from databricks.sdk import WorkspaceClient
 from fastapi import Request
 
+from .clients import clients
+
 logger = logging.getLogger(__name__)
 
 # Cache for dev user to avoid repeated API calls
@@ -79,8 +80,8 @@ async def _get_dev_user() -> str:
 def _fetch_user_from_workspace() -> str:
   """Synchronous helper to fetch user from WorkspaceClient."""
   try:
-    # WorkspaceClient will use DATABRICKS_HOST and DATABRICKS_TOKEN from env
-    client = WorkspaceClient()
+    # WorkspaceClient uses DATABRICKS_HOST and DATABRICKS_TOKEN from env
+    client = clients.workspace_client()
     me = client.current_user.me()
 
     if not me.user_name:
@@ -112,8 +113,7 @@ def get_workspace_url() -> str:
   if not host:
     # Fall back to WorkspaceClient config (just reads from config, not a network call)
     try:
-      client = WorkspaceClient()
-      host = client.config.host
+      host = clients.workspace_config().host
     except Exception as e:
       logger.error(f'Failed to get workspace URL: {e}')
       return ''
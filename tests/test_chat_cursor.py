@@ -0,0 +1,78 @@
+"""Paging cursors work with either backend's timestamps, and bad ones are a 400."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from server.db.models import MessageModel
+from server.routers import chat
+from server.services.chat import get_storage, reset_storage
+from server.services.chat.base import decode_cursor, encode_cursor
+
+USER = 'cursor@example.com'
+HEADERS = {'x-forwarded-user': USER}
+
+
+@pytest.fixture
+def client():
+  """Chat router over fresh in-memory storage holding three chats."""
+  reset_storage()
+  user_storage = get_storage().get_storage_for_user(USER)
+  for title in ('first', 'second', 'third'):
+    asyncio.run(user_storage.create(title))
+  app = FastAPI()
+  app.include_router(chat.router, prefix='/api')
+  yield TestClient(app)
+  reset_storage()
+
+
+def test_aware_cursor_is_converted_to_naive_local_time():
+  """A cursor with a UTC offset decodes to the same instant in naive local time."""
+  aware = datetime(2026, 10, 16, 12, 0, tzinfo=timezone.utc)
+
+  position, item_id = decode_cursor(encode_cursor((aware, 'chat_1')))
+
+  assert position.tzinfo is None
+  assert position == aware.astimezone().replace(tzinfo=None)
+  assert item_id == 'chat_1'
+
+
+def test_aware_cursor_pages_memory_chats(client):
+  """A timezone-aware cursor (as PostgreSQL returns) pages the in-memory backend."""
+  later = datetime.now(timezone(timedelta(hours=5))) + timedelta(minutes=1)
+
+  response = client.get(
+    '/api/chats', params={'limit': 2, 'before': encode_cursor((later, 'chat_z'))}, headers=HEADERS
+  )
+
+  assert response.status_code == 200
+  assert [c['title'] for c in response.json()] == ['third', 'second']
+
+
+def test_aware_cursor_pages_memory_messages(client):
+  """Message paging accepts a timezone-aware cursor too."""
+  user_storage = get_storage().get_storage_for_user(USER)
+  chat_id = client.get('/api/chats', headers=HEADERS).json()[0]['id']
+  message = MessageModel(id='msg_1', role='user', content='Hi', timestamp=datetime.now())
+  asyncio.run(user_storage.add_message(chat_id, message))
+  later = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+  response = client.get(
+    f'/api/chats/{chat_id}/messages',
+    params={'before': encode_cursor((later, 'msg_z'))},
+    headers=HEADERS,
+  )
+
+  assert response.status_code == 200
+  assert [m['id'] for m in response.json()['messages']] == ['msg_1']
+
+
+# Not base64, and base64 of 'yesterday|chat_1' (no valid timestamp)
+@pytest.mark.parametrize('before', ['not-a-cursor', 'eWVzdGVyZGF5fGNoYXRfMQ'])
+def test_invalid_cursor_is_a_bad_request(client, before):
+  """Cursors that do not decode get a 400, not a 500."""
+  response = client.get('/api/chats', params={'limit': 2, 'before': before}, headers=HEADERS)
+
+  assert response.status_code == 400
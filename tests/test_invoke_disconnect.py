@@ -0,0 +1,104 @@
+"""A client that hangs up mid-answer still gets its partial answer saved.
+
+Runs /api/invoke_endpoint under a real uvicorn server: Starlette cancels the
+response as soon as http.disconnect arrives, so the turn has to be queued from
+the cancelled stream, not after it.
+"""
+
+import asyncio
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+import uvicorn
+from fastapi import FastAPI
+from server.routers import agent
+from server.services.agents.events import make_event
+from server.services.chat import get_storage, reset_storage
+from server.services.chat.persistence import persistence
+
+USER = 'disconnect@example.com'
+
+
+class _HangingHandler:
+  """Handler that sends a few deltas, then never finishes."""
+
+  limiter = None
+  agent_config: Dict[str, Any] = {'endpoint_name': 'test-endpoint'}
+
+  def __init__(self):
+    self.cancelled = asyncio.Event()
+
+  async def stream(self, messages: List[Dict[str, str]], endpoint_name: str):
+    try:
+      for word in ('partial ', 'answer '):
+        yield make_event({'type': 'response.output_text.delta', 'delta': word})
+      await asyncio.sleep(3600)
+    finally:
+      self.cancelled.set()
+
+
+async def _serve(app: FastAPI) -> tuple[uvicorn.Server, asyncio.Task, int]:
+  server = uvicorn.Server(
+    uvicorn.Config(app, host='127.0.0.1', port=0, lifespan='off', log_level='warning')
+  )
+  task = asyncio.create_task(server.serve())
+  while not server.started:
+    await asyncio.sleep(0.01)
+  port = server.servers[0].sockets[0].getsockname()[1]
+  return server, task, port
+
+
+async def _disconnect_mid_stream(handler: _HangingHandler):
+  app = FastAPI()
+  app.include_router(agent.router, prefix='/api')
+  server, task, port = await _serve(app)
+  try:
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', timeout=10) as client:
+      body = {'agent_id': 'test-agent', 'messages': [{'role': 'user', 'content': 'Hello?'}]}
+      async with client.stream(
+        'POST', '/api/invoke_endpoint', json=body, headers={'x-forwarded-user': USER}
+      ) as response:
+        received = ''
+        async for chunk in response.aiter_text():
+          received += chunk
+          if 'answer' in received:
+            break
+      # Leaving the block closes the connection before the stream has ended
+
+    await asyncio.wait_for(handler.cancelled.wait(), 5)
+
+    user_storage = get_storage().get_storage_for_user(USER)
+    for _ in range(100):
+      await persistence.wait_for(USER)
+      chats = await user_storage.get_all()
+      if chats and chats[0].messages:
+        return chats[0]
+      await asyncio.sleep(0.05)
+    return chats[0] if chats else None
+  finally:
+    await persistence.close()
+    server.should_exit = True
+    await task
+
+
+@pytest.fixture
+def handler(monkeypatch):
+  """Route every agent id to a hanging handler, with fresh in-memory storage."""
+  reset_storage()
+  hanging = _HangingHandler()
+  monkeypatch.setattr(agent.handler_registry, 'get', lambda agent_id: hanging)
+  yield hanging
+  reset_storage()
+
+
+def test_partial_answer_is_saved_when_client_disconnects(handler):
+  """The user message and the partial, interrupted answer are both stored."""
+  chat = asyncio.run(_disconnect_mid_stream(handler))
+
+  assert chat is not None
+  roles = [(msg.role, msg.content, bool(msg.is_interrupted)) for msg in chat.messages]
+  assert roles == [
+    ('user', 'Hello?', False),
+    ('assistant', 'partial answer ', True),
+  ]
@@ -0,0 +1,33 @@
+"""In-memory chat storage keeps the same counters as PostgreSQL."""
+
+import asyncio
+from datetime import datetime
+from typing import List
+
+from server.db.models import MessageModel
+from server.services.chat.memory import MemoryChatStorage
+
+
+def _messages(start: int, count: int) -> List[MessageModel]:
+  return [
+    MessageModel(id=f'msg_{i}', role='user', content=f'Message {i}', timestamp=datetime.now())
+    for i in range(start, start + count)
+  ]
+
+
+async def _trim_chat():
+  storage = MemoryChatStorage('trim@example.com', max_messages_per_chat=3)
+  chat = await storage.create('Trimmed')
+  await storage.add_messages(chat.id, _messages(0, 2))
+  await storage.add_message(chat.id, _messages(2, 1)[0])
+  await storage.add_messages(chat.id, _messages(3, 2))
+  return await storage.get(chat.id)
+
+
+def test_message_count_is_not_reduced_by_trimming():
+  """Dropping old messages keeps message_count at the total ever added."""
+  chat = asyncio.run(_trim_chat())
+
+  assert [msg.id for msg in chat.messages] == ['msg_2', 'msg_3', 'msg_4']
+  assert chat.message_count == 5
+  assert chat.to_dict_summary()['message_count'] == 5
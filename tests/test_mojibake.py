@@ -0,0 +1,78 @@
+"""Tests for fix_mojibake and the streaming MojibakeDecoder."""
+
+import pytest
+from server.services.agents.mojibake import MojibakeDecoder, fix_mojibake
+
+
+def _mojibake(text: str) -> str:
+  """UTF-8 text as an endpoint that decoded it as Latin-1 would send it."""
+  return text.encode('utf-8').decode('latin-1')
+
+
+def _decode_all(deltas):
+  decoder = MojibakeDecoder()
+  outputs = [decoder.decode(delta) for delta in deltas]
+  return outputs, decoder.flush()
+
+
+def test_fix_mojibake_leaves_ascii_and_valid_text_alone():
+  """ASCII, correct Unicode and empty strings come back unchanged."""
+  assert fix_mojibake('') == ''
+  assert fix_mojibake('plain ascii') == 'plain ascii'
+  assert fix_mojibake('déjà vu — 👋') == 'déjà vu — 👋'
+
+
+def test_fix_mojibake_repairs_mojibake():
+  """A delta that is entirely mojibake is re-decoded as UTF-8."""
+  assert fix_mojibake(_mojibake('naïve — café')) == 'naïve — café'
+
+
+def test_fix_mojibake_repairs_mojibake_mixed_with_emoji():
+  """Runs of mojibake are repaired while real emoji next to them are kept."""
+  text = 'Hello 👋 ' + _mojibake('— ça va?') + ' 🎉'
+  assert fix_mojibake(text) == 'Hello 👋 — ça va? 🎉'
+
+
+@pytest.mark.parametrize('char', ['é', '—', '😀'])
+@pytest.mark.parametrize('pieces', [2, 3, 4])
+def test_decoder_joins_a_character_split_across_deltas(char, pieces):
+  """A 2-4 byte sequence split over several deltas is emitted once it is complete."""
+  broken = _mojibake(f'a{char}b')
+  # Cut after the first byte of the character, then after each following one
+  cuts = sorted({min(2 + i, len(broken) - 1) for i in range(pieces - 1)})
+  deltas = [broken[start:end] for start, end in zip([0, *cuts], [*cuts, len(broken)])]
+
+  outputs, tail = _decode_all(deltas)
+
+  assert ''.join(outputs) + tail == f'a{char}b'
+  assert tail == ''
+  # Nothing broken is ever emitted: every output is valid on its own
+  assert all(fix_mojibake(output) == output for output in outputs)
+
+
+def test_decoder_passes_ascii_deltas_through():
+  """ASCII deltas are returned as they are."""
+  outputs, tail = _decode_all(['Hello', ', ', 'world'])
+  assert outputs == ['Hello', ', ', 'world']
+  assert tail == ''
+
+
+def test_decoder_releases_a_legitimate_trailing_latin1_char():
+  """A real Latin-1 char that looks like a lead byte is held, then released unchanged."""
+  decoder = MojibakeDecoder()
+
+  # 'Â' (0xC2) could start a 2-byte sequence, so it waits for the next delta
+  assert decoder.decode('Prix: 5Â') == 'Prix: 5'
+  # The next delta does not continue it: released as-is
+  assert decoder.decode(' net') == 'Â net'
+  assert decoder.flush() == ''
+
+
+def test_flush_returns_the_held_back_tail():
+  """A lead byte left at the end of the stream is returned by flush()."""
+  decoder = MojibakeDecoder()
+
+  assert decoder.decode('voilà') == 'voil'
+  assert decoder.flush() == 'à'
+  # Flushing again has nothing left to return
+  assert decoder.flush() == ''
@@ -0,0 +1,74 @@
+"""A chat whose writes keep failing does not hold up the other chats' turns."""
+
+import asyncio
+from typing import Dict, List
+
+import pytest
+import server.services.chat as chat_module
+from server.db.models import MessageModel
+from server.services.chat import persistence as persistence_module
+from server.services.chat.persistence import WriteBehindQueue
+
+USER = 'writer@example.com'
+
+
+class _FlakyStorage:
+  """Per-user storage whose writes to one chat fail a few times first."""
+
+  def __init__(self, failing_chat: str, failures: int):
+    self.failing_chat = failing_chat
+    self.failures = failures
+    self.saved: Dict[str, List[str]] = {}
+
+  async def add_messages(self, chat_id: str, msgs: List[MessageModel]) -> bool:
+    if chat_id == self.failing_chat and self.failures > 0:
+      self.failures -= 1
+      raise ConnectionError('database unavailable')
+    self.saved.setdefault(chat_id, []).extend(msg.content for msg in msgs)
+    return True
+
+
+class _Storages:
+  def __init__(self, storage: _FlakyStorage):
+    self.storage = storage
+
+  def get_storage_for_user(self, user_email: str) -> _FlakyStorage:
+    return self.storage
+
+
+def _turn(content: str) -> List[MessageModel]:
+  return [MessageModel(role='user', content=content)]
+
+
+@pytest.fixture
+def storage(monkeypatch):
+  """Storage failing the first 3 writes to chat_a, with a 0.5s backoff."""
+  flaky = _FlakyStorage('chat_a', failures=3)
+  monkeypatch.setattr(chat_module, 'get_storage', lambda: _Storages(flaky))
+  monkeypatch.setattr(persistence_module, 'WRITE_RETRY_BASE_SECONDS', 0.5)
+  return flaky
+
+
+async def _write_both(storage: _FlakyStorage) -> Dict[str, List[str]]:
+  queue = WriteBehindQueue()
+  try:
+    await queue.enqueue(USER, 'chat_a', _turn('a1'))
+    await queue.enqueue(USER, 'chat_a', _turn('a2'))
+    # Queued once chat_a's first write has failed and it is backing off
+    await asyncio.sleep(0.1)
+    await queue.enqueue(USER, 'chat_b', _turn('b1'))
+    # chat_a needs 0.5 + 1 + 2 seconds of backoff; chat_b must not wait for it
+    await queue.wait_for(USER, 'chat_b', timeout=1.0)
+    during_retries = {chat_id: list(saved) for chat_id, saved in storage.saved.items()}
+    await queue.wait_for(USER, 'chat_a', timeout=10.0)
+    return during_retries
+  finally:
+    await queue.close()
+
+
+def test_failing_chat_does_not_block_other_chats(storage):
+  """chat_b is saved while chat_a backs off, and chat_a keeps its turn order."""
+  during_retries = asyncio.run(_write_both(storage))
+
+  assert during_retries == {'chat_b': ['b1']}
+  assert storage.saved == {'chat_b': ['b1'], 'chat_a': ['a1', 'a2']}
@@ -0,0 +1,31 @@
+"""Size gauges of chat storage report the instance in use, not the first one created."""
+
+import asyncio
+
+from server.metrics import registry
+from server.services.chat.cache import ChatCache
+from server.services.chat.memory import MemoryUserScopedChatStorage
+
+
+def _gauge(name: str) -> str:
+  """Sample line of an unlabelled gauge from the scrape output."""
+  return next(line for line in registry.render().splitlines() if line.startswith(f'{name} '))
+
+
+def test_chat_cache_bytes_reports_current_cache():
+  """A cache created after another one is the one chat_cache_bytes reports."""
+  ChatCache(max_bytes=1024 * 1024).put(('old@example.com', 'get_all', ()), ['old'], 0)
+  cache = ChatCache(max_bytes=1024 * 1024)
+  cache.put(('new@example.com', 'get_all', ()), ['new', 'chats'], 0)
+
+  assert _gauge('chat_cache_bytes') == f'chat_cache_bytes {cache.bytes}'
+
+
+def test_memory_storage_bytes_reports_current_budget():
+  """The budget of the storage created last is the one memory_storage_bytes reports."""
+  MemoryUserScopedChatStorage()
+  storage = MemoryUserScopedChatStorage()
+  asyncio.run(storage.get_storage_for_user('new@example.com').create('New chat'))
+
+  assert storage.budget.bytes > 0
+  assert _gauge('memory_storage_bytes') == f'memory_storage_bytes {storage.budget.bytes}'